@@ -0,0 +1,195 @@
+"""
+Sample hand-off between the acquisition thread and its consumers. The acquisition thread (the thread that owns the
+serial stream) is the only producer, the GUI and the logger each read through their own Subscription.
+"""
+import numpy as np
+
+
+class SampleChannel:
+    """
+    Fixed capacity broadcast ring of sample rows with sequence numbers. The producer publishes in two phases: it first
+    reserves the sequence numbers of the new rows by advancing self.reserveSeq, then writes the rows into the ring and
+    commits them by advancing self.writeSeq (the total number of rows ever published). Consumers never modify the
+    channel, each keeps its own read position in a Subscription, so there is no locking between threads and a slow
+    consumer never blocks the producer or other consumers.
+
+    A consumer that falls more than the capacity behind loses the oldest rows. This is detected from the sequence
+    numbers and counted as overrun samples in the Subscription. As the slots of the reserved rows may already be
+    overwritten, a consumer checks its copy against self.reserveSeq rather than self.writeSeq.
+    """
+
+    def __init__(self, capacity=65536, columns=4):
+        """
+        Initialise an empty channel.
+
+        Args:
+            capacity (int, optional): Number of rows kept in the ring. Defaults to 65536 (over 5 minutes at 200Hz).
+            columns (int, optional): Number of columns per row. Defaults to 4 (timestamp, ax, ay, az).
+        """
+        self.capacity = capacity
+        self.columns = columns
+        self.data = np.zeros((capacity, columns))
+        self.writeSeq = 0  # Sequence number of the next row, i.e. the number of rows published.
+        self.reserveSeq = 0  # Sequence number after the rows being written, writeSeq when no write is in progress.
+
+    def publish(self, row):
+        """
+        Write and publish a single row. Must only be called from the producer thread.
+
+        Args:
+            row (sequence[float]): Row of length self.columns.
+        """
+        seq = self.writeSeq
+        self.reserveSeq = seq + 1
+        self.data[seq % self.capacity] = row
+        self.writeSeq = seq + 1
+
+    def publishBlock(self, rows):
+        """
+        Write and publish a block of rows. Must only be called from the producer thread.
+
+        Args:
+            rows (np.ndarray): Array of shape (n, self.columns).
+        """
+        n = len(rows)
+        if n == 0:
+            return
+        end = self.writeSeq + n
+        self.reserveSeq = end
+        if n > self.capacity:
+            # Rows that would be overwritten within this block are published without being stored.
+            rows = rows[-self.capacity:]
+            n = self.capacity
+        start = (end - n) % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = rows[:first]
+        self.data[:n - first] = rows[first:]
+        self.writeSeq = end
+
+    def subscribe(self):
+        """
+        Create a new consumer of this channel. The subscription starts at the next published row.
+
+        Returns:
+            subscription (Subscription): New subscription.
+        """
+        return Subscription(self)
+
+
+class Subscription:
+    """
+    A single consumer's read position in a SampleChannel. Must only be read from one thread.
+    """
+
+    def __init__(self, channel):
+        """
+        Args:
+            channel (SampleChannel): Channel to read from.
+        """
+        self.channel = channel
+        self.cursor = channel.writeSeq  # Sequence number of the next row to read.
+        self.dropped = 0  # Rows lost because this consumer fell more than the channel capacity behind.
+
+    def available(self) -> int:
+        """
+        Returns:
+            count (int): Number of published rows not yet read (may include rows that have been overrun).
+        """
+        return self.channel.writeSeq - self.cursor
+
+    def read(self, maxRows=None) -> np.ndarray:
+        """
+        Read all rows published since the last read, as a copy. Rows that were overwritten before (or while) they
+        were copied are skipped and counted in self.dropped.
+
+        Args:
+            maxRows (int, optional): Maximum number of rows to read. Defaults to None (no limit).
+
+        Returns:
+            rows (np.ndarray): Array of shape (n, channel.columns), oldest row first.
+        """
+        channel = self.channel
+        capacity = channel.capacity
+        end = channel.writeSeq
+        start = max(self.cursor, end - capacity)
+        if maxRows is not None:
+            end = min(end, start + maxRows)
+
+        first = start % capacity
+        count = end - start
+        if first + count <= capacity:
+            rows = channel.data[first:first + count].copy()
+        else:
+            rows = np.concatenate((channel.data[first:], channel.data[:first + count - capacity]))
+
+        # The producer may have overwritten the oldest rows before or during the copy, also with rows it has reserved
+        # but not yet committed.
+        valid = min(channel.reserveSeq - capacity, end)
+        if valid > start:
+            rows = rows[valid - start:]
+            start = valid
+
+        self.dropped += start - self.cursor
+        self.cursor = end
+        return rows
+
+
+class ChannelStore:
+    """
+    The channels of an IMU besides the acceleration (angular velocity, angle, magnetic field, quaternion), stored
+    channel by channel: each message type has its own SampleChannel of rows [timestamp, values..., hostTime], with the
+    timestamps of its own messages, rather than one wide record per message with every field. Channels are filled at
+    the rate their messages arrive and read through Subscriptions like the acceleration, so plotting or logging a
+    channel costs the acquisition thread nothing beyond the publish.
+    """
+
+    def __init__(self, channels, capacity=65536):
+        """
+        Args:
+            channels (dict[str, int]): Channel name -> number of values of its messages.
+            capacity (int, optional): Number of rows kept per channel. Defaults to 65536.
+        """
+        self.channels = {name: SampleChannel(capacity, columns=values + 2) for name, values in channels.items()}
+
+    def __getitem__(self, name) -> SampleChannel:
+        return self.channels[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self.channels
+
+    def publish(self, name, timestamp, values, hostTime):
+        """
+        Publish a single message of a channel. Must only be called from the producer thread.
+
+        Args:
+            name (str): Channel name.
+            timestamp (float): IMU timestamp of the message in seconds.
+            values (sequence[float]): Values of the message.
+            hostTime (float): Host time.monotonic() at arrival.
+        """
+        self.channels[name].publish((timestamp, *values, hostTime))
+
+    def publishBlocks(self, decoded, hostTime):
+        """
+        Publish the decoded blocks of every channel of the store. Must only be called from the producer thread.
+
+        Args:
+            decoded (dict[str, np.ndarray]): Channel name -> rows of [timestamp, values...], other names are ignored.
+            hostTime (float): Host time.monotonic() at arrival of the block.
+        """
+        for name, rows in decoded.items():
+            channel = self.channels.get(name)
+            if channel is not None and len(rows):
+                channel.publishBlock(np.column_stack((rows[:, :channel.columns - 1], np.full(len(rows), hostTime))))
+
+    def latest(self, name) -> tuple:
+        """
+        Returns:
+            values (tuple[float]): Values of the last published message of a channel, empty if there is none. May be
+                read from any thread.
+        """
+        channel = self.channels[name]
+        seq = channel.writeSeq
+        if seq == 0:
+            return ()
+        return tuple(channel.data[(seq - 1) % channel.capacity, 1:-1].tolist())
@@ -0,0 +1,292 @@
+"""
+Batch post-processing of the recorded logs, without the GUI. Every log in the logging directory is processed in a pool
+of worker processes, one log per task, using every core by default:
+
+    python BatchProcess.py [logging] [--filter "Gravity removal (0.5Hz high-pass)"] [--workers 4] [--force]
+
+Each log is streamed in blocks (see LogFormat.iterLogBlocks()), so memory use does not depend on its length. The
+accelerations are re-derived from the raw values: their norm, the accelerations filtered with the chosen filter, the
+heartbeats and heart rate, and the signal statistics of each. The results are written to a summary next to the log
+(see LogFormat.summaryPath()), and a report of all logs to 'batch report.json' and 'batch report.csv' in the directory.
+
+A summary records the size and modification time of its log and the filter used, logs whose summary is up to date are
+not processed again unless --force is given. Segmented logs are processed from their segments if they have not been
+stitched (see SegmentedLog.py).
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import constants as c
+import Filters
+import LogFormat
+import SegmentedLog
+from BeatDetector import BeatDetector
+from SignalStats import SignalStats
+
+SUMMARY_VERSION = 1  # Increased when the processing changes, so older summaries are out of date.
+REPORT_NAME = 'batch report'  # Name of the report files in the logging directory, .json and .csv.
+SEGMENT_PATTERN = re.compile(re.escape(LogFormat.SEGMENT_SUFFIX) + r'\d{4}$')  # Stem of a segment file.
+CHANNEL_PATTERN = re.compile(r'\.(' + '|'.join(c.IMU_CHANNELS) + r')$')  # Stem of the log of another IMU channel.
+
+
+def findLogs(directory) -> dict:
+    """
+    Find the logs of a directory. Beats files, segments and the logs of the other channels of an IMU (see
+    LogFormat.channelPath()) are not processed, the segments of a segmented log are found from its manifest and only
+    used if the log has not been stitched.
+
+    Args:
+        directory (Path): Directory with the logs.
+
+    Returns:
+        logs (dict[Path, list[Path]]): Files of every log, the log itself or its segments in recording order.
+    """
+    logs = {}
+    paths = sorted(Path(directory).iterdir())
+    for path in paths:
+        if path.suffix in (LogFormat.TEXT_EXTENSION, LogFormat.BINARY_EXTENSION) and \
+                not path.name.endswith(LogFormat.BEATS_SUFFIX + LogFormat.TEXT_EXTENSION) and \
+                not SEGMENT_PATTERN.search(path.stem) and not CHANNEL_PATTERN.search(path.stem):
+            logs[path] = [path]
+    for path in paths:
+        if path.name.endswith(LogFormat.MANIFEST_SUFFIX):
+            try:
+                logPath, segmentPaths = SegmentedLog.findSegments(path)
+            except FileNotFoundError as e:
+                print(e)
+                continue
+            if CHANNEL_PATTERN.search(logPath.stem):
+                continue
+            logs.setdefault(logPath, [segment for segment in segmentPaths if segment.exists()])
+    return logs
+
+
+def describeSources(sourcePaths) -> list:
+    """
+    Returns:
+        sources (list[dict]): Name, size and modification time of each file of a log, to tell if a summary is up to
+            date.
+    """
+    sources = []
+    for path in sourcePaths:
+        stat = Path(path).stat()
+        sources.append({'file': Path(path).name, 'bytes': stat.st_size, 'modifiedNs': stat.st_mtime_ns})
+    return sources
+
+
+def isUpToDate(logPath, sourcePaths, filterOption) -> bool:
+    """
+    Returns:
+        upToDate (bool): True if the log has a summary of the current version, made with the given filter from the
+            log's files as they are now.
+    """
+    try:
+        with open(LogFormat.summaryPath(logPath), 'r') as file:
+            summary = json.load(file)
+    except (OSError, ValueError):
+        return False
+    return summary.get('version') == SUMMARY_VERSION and summary.get('filter') == filterOption and \
+        summary.get('sources') == describeSources(sourcePaths)
+
+
+def processLog(logPath, sourcePaths, filterOption=c.FILTER_SCG, blockRows=10000) -> dict:
+    """
+    Process a log and write its summary. Runs in a worker process.
+
+    Args:
+        logPath (Path): Path of the log, the summary is written next to it.
+        sourcePaths (list[Path]): Files of the log, the log itself or its segments.
+        filterOption (str, optional): One of constants.FILTER_OPTIONS, applied to the raw accelerations. Defaults to
+            constants.FILTER_SCG.
+        blockRows (int, optional): Samples processed at a time. Defaults to 10000.
+
+    Returns:
+        summary (dict): Summary of the log, see the module docstring.
+    """
+    start = time.perf_counter()
+    header = {}
+    if logPath.suffix == LogFormat.BINARY_EXTENSION:
+        with open(sourcePaths[0], 'rb') as file:
+            header = LogFormat.readHeader(file)
+
+    imus = None
+    firstTime = lastTime = None
+    bpms = []
+    for sourcePath in sourcePaths:
+        for timestamps, values in LogFormat.iterLogBlocks(sourcePath, blockRows):
+            if len(timestamps) == 0:
+                continue
+            if imus is None:
+                # Every sample is processed, the raw accelerations are all that is needed from the log.
+                imus = LogFormat.countImus(logPath, header, values.shape[1])
+                rawStats = SignalStats(channels=3 * imus, window=None)
+                normStats = SignalStats(channels=imus, window=None)
+                filterStage = Filters.createFilterStage(filterOption, channels=3 * imus)
+                filteredStats = SignalStats(channels=3 * imus, window=None) if filterStage else None
+                beatDetector = BeatDetector()
+                firstTime = float(timestamps[0])
+            lastTime = float(timestamps[-1])
+
+            raw = np.asarray(values[:, :3 * imus], dtype=np.float64)
+            rows = np.column_stack((timestamps, raw))
+            rawStats.update(rows)
+            grouped = raw.reshape(len(raw), imus, 3)
+            norms = np.sqrt(np.einsum('ijk,ijk->ij', grouped, grouped))
+            normStats.update(np.column_stack((timestamps, norms)))
+            if filterStage:
+                filtered = filterStage.process(rows)
+                filteredStats.update(np.column_stack((filtered[:, 0], filtered[:, 1 + 3 * imus:])))
+            # Heartbeats are detected from the first IMU, as while logging.
+            beats = beatDetector.process(rows)
+            bpms.extend(beats[:, 1][np.isfinite(beats[:, 1])].tolist())
+
+    summary = {
+        'log': logPath.name,
+        'version': SUMMARY_VERSION,
+        'filter': filterOption,
+        'sources': describeSources(sourcePaths),
+        'imus': imus or 0,
+        'start': datetime.fromtimestamp(firstTime).isoformat(timespec='seconds') if imus else None,
+        'duration': round(lastTime - firstTime, 3) if imus else 0.0,
+        'stats': rawStats.summary() if imus else {},
+        'normStats': normStats.summary() if imus else {},
+        'filteredStats': filteredStats.summary() if imus and filteredStats else {},
+        'heartRate': {
+            'beats': beatDetector.beatCount if imus else 0,
+            'medianBpm': round(float(np.median(bpms)), 1) if bpms else None,
+            'minBpm': round(float(np.min(bpms)), 1) if bpms else None,
+            'maxBpm': round(float(np.max(bpms)), 1) if bpms else None
+        },
+        'processingSeconds': round(time.perf_counter() - start, 3)
+    }
+    with open(LogFormat.summaryPath(logPath), 'w') as file:
+        json.dump(summary, file, indent=2)
+    return summary
+
+
+def writeReport(directory, summaries, filterOption):
+    """
+    Write the report of all logs of a directory: the totals and one entry per log as JSON, and one row per log as CSV
+    for spreadsheets.
+
+    Args:
+        directory (Path): Directory with the logs.
+        summaries (dict[Path, dict]): Summary of every log, the error message of logs that failed.
+        filterOption (str): Filter used.
+    """
+    rows = []
+    for logPath, summary in sorted(summaries.items()):
+        if isinstance(summary, str):
+            rows.append({'log': logPath.name, 'error': summary})
+            continue
+        stats = summary['stats']
+        rows.append({
+            'log': logPath.name,
+            'imus': summary['imus'],
+            'start': summary['start'],
+            'duration': summary['duration'],
+            'samples': stats.get('samples', 0),
+            'rate': stats.get('rate'),
+            'beats': summary['heartRate']['beats'],
+            'medianBpm': summary['heartRate']['medianBpm'],
+            'flags': ' '.join(stats.get('flags', [])),
+            'error': ''
+        })
+    valid = [row for row in rows if not row['error']]
+    report = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'filter': filterOption,
+        'totals': {
+            'logs': len(rows),
+            'failed': len(rows) - len(valid),
+            'flagged': sum(1 for row in valid if row['flags']),
+            'samples': sum(row['samples'] for row in valid),
+            'hours': round(sum(row['duration'] for row in valid) / 3600, 3),
+            'beats': sum(row['beats'] for row in valid)
+        },
+        'logs': rows
+    }
+    with open(Path(directory, REPORT_NAME + '.json'), 'w') as file:
+        json.dump(report, file, indent=2)
+    with open(Path(directory, REPORT_NAME + '.csv'), 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=['log', 'imus', 'start', 'duration', 'samples', 'rate', 'beats',
+                                                  'medianBpm', 'flags', 'error'], restval='')
+        writer.writeheader()
+        writer.writerows(rows)
+    totals = report['totals']
+    print(f'Report of {totals["logs"]} logs ({totals["hours"]} hours, {totals["failed"]} failed, '
+          f'{totals["flagged"]} flagged) written to {Path(directory, REPORT_NAME + ".json")}.')
+
+
+def processDirectory(directory, filterOption=c.FILTER_SCG, workers=None, force=False, blockRows=10000) -> dict:
+    """
+    Process every log of a directory whose summary is not up to date, in a pool of worker processes, and write the
+    report of all logs.
+
+    Args:
+        directory (Path): Directory with the logs.
+        filterOption (str, optional): One of constants.FILTER_OPTIONS. Defaults to constants.FILTER_SCG.
+        workers (int, optional): Number of worker processes. Defaults to None (one per core).
+        force (bool, optional): Process every log, also if its summary is up to date. Defaults to False.
+        blockRows (int, optional): Samples processed at a time. Defaults to 10000.
+
+    Returns:
+        summaries (dict[Path, dict]): Summary of every log, the error message of logs that failed.
+    """
+    logs = findLogs(directory)
+    summaries = {}
+    pending = []
+    for logPath, sourcePaths in logs.items():
+        if not sourcePaths:
+            continue
+        if not force and isUpToDate(logPath, sourcePaths, filterOption):
+            with open(LogFormat.summaryPath(logPath), 'r') as file:
+                summaries[logPath] = json.load(file)
+        else:
+            pending.append(logPath)
+    print(f'{len(logs)} logs found in {directory}, {len(pending)} to process.')
+
+    # Largest logs first, so a large log started last does not keep the other workers waiting.
+    pending.sort(key=lambda path: sum(source.stat().st_size for source in logs[path]), reverse=True)
+    start = time.perf_counter()
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = {executor.submit(processLog, logPath, logs[logPath], filterOption, blockRows): logPath
+                       for logPath in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                logPath = futures[future]
+                try:
+                    summaries[logPath] = future.result()
+                    print(f'[{done}/{len(pending)}] {logPath.name}: {summaries[logPath]["duration"]:.0f}s, '
+                          f'{summaries[logPath]["heartRate"]["beats"]} beats.')
+                except Exception as e:
+                    summaries[logPath] = f'{type(e).__name__}: {e}'
+                    print(f'[{done}/{len(pending)}] {logPath.name} failed: {summaries[logPath]}')
+        print(f'Processing completed in {time.perf_counter() - start:.1f}s.')
+    writeReport(directory, summaries, filterOption)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', nargs='?', default=Path(Path.cwd(), 'logging'), type=Path,
+                        help='Directory with the logs. Defaults to the logging directory.')
+    parser.add_argument('--filter', default=c.FILTER_SCG, choices=c.FILTER_OPTIONS, help='Filter applied.')
+    parser.add_argument('--workers', type=int, help='Number of worker processes. Defaults to one per core.')
+    parser.add_argument('--force', action='store_true', help='Process logs whose summary is up to date.')
+    parser.add_argument('--block-rows', type=int, default=10000, help='Samples processed at a time.')
+    args = parser.parse_args()
+    processDirectory(args.directory, args.filter, args.workers, args.force, args.block_rows)
+
+
+if __name__ == '__main__':
+    main()
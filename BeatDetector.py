@@ -0,0 +1,178 @@
+"""
+Online heartbeat detection from the SCG acceleration. Each heartbeat produces a short burst of vibration (aortic valve
+opening), which is found as a peak of the signal energy envelope.
+"""
+from collections import deque
+
+import numpy as np
+
+import Filters
+
+
+class BeatDetector:
+    """
+    Incremental beat detector. Every block of samples is processed once, the filter, envelope and peak search state is
+    carried over to the next block, so the cost of a block only depends on its length:
+
+        1. The three acceleration axes are band-pass filtered (5-40Hz by default), which removes gravity, respiration
+           and movement, and the energy (sum of squares) is computed, so the result does not depend on the orientation
+           of the IMU.
+        2. The envelope is the moving average of the energy over a short window (100ms), which merges the oscillations
+           of one valve event into a single peak.
+        3. A beat is the maximum of each section of the envelope above an adaptive threshold. The threshold is a
+           fraction of a running peak level, learned from the first seconds of data and updated with every beat. The
+           learning time is then searched for beats too, so the beats found do not depend on how the samples were
+           split into blocks. Peaks within the refractory period of the last beat (e.g. aortic closing) are ignored.
+           The refractory period grows to 40% of the current beat interval at low heart rates.
+
+    The heart rate is the median of the recent beat intervals that are within a plausible range.
+    """
+
+    def __init__(self, lowCut=5.0, highCut=40.0, window=0.1, refractory=0.3, thresholdRatio=0.4, learningTime=2.0,
+                 rate=None):
+        """
+        Args:
+            lowCut (float, optional): Low cutoff of the band-pass in Hz. Defaults to 5.
+            highCut (float, optional): High cutoff of the band-pass in Hz. Defaults to 40.
+            window (float, optional): Length of the envelope moving average in seconds. Defaults to 0.1.
+            refractory (float, optional): Minimum time between beats in seconds. Defaults to 0.3 (200BPM).
+            thresholdRatio (float, optional): Threshold as a fraction of the peak level. Defaults to 0.4.
+            learningTime (float, optional): Time used to learn the initial peak level in seconds. Defaults to 2.
+            rate (float, optional): Sample rate in Hz. Defaults to None (estimated from the samples).
+        """
+        self.filterStage = Filters.FilterStage(highPass=lowCut, lowPass=highCut, channels=3, rate=rate)
+        self.window = window
+        self.refractory = refractory
+        self.thresholdRatio = thresholdRatio
+        self.learningTime = learningTime
+
+        self.energyTail = np.empty(0)  # Energy of the last samples of the previous block, for the moving average.
+        self.level = None  # Running peak level of the envelope, None while learning.
+        self.learningStart = None  # Time of the first sample used for learning.
+        self.learningMax = 0.0  # Largest envelope value of the learning time.
+        self.learningBlocks = []  # (times, envelope) of the blocks received while learning, searched once learned.
+        self.candidate = None  # (time, envelope) of the largest peak of the section above the threshold so far.
+        self.lastBeat = None  # Time of the last beat.
+        self.lastLevelUpdate = None  # Time of the last beat or decay of the peak level.
+        self.beatTimes = deque(maxlen=9)  # Times of the recent beats.
+        self.beatCount = 0  # Beats detected.
+        self.bpm = None  # Current heart rate in beats per minute, None if unknown.
+
+    def process(self, rows) -> np.ndarray:
+        """
+        Process a block of samples, continuing from the previous block.
+
+        Args:
+            rows (np.ndarray): Rows of [timestamp, ax, ay, az, ...], further columns are ignored.
+
+        Returns:
+            beats (np.ndarray): Rows of [beat time, heart rate (NaN if unknown)] of the beats detected in this block,
+                shape (m, 2). A beat is only reported once the envelope falls below the threshold again.
+        """
+        beats = []
+        filtered = self.filterStage.process(rows)
+        rate = self.filterStage.rate
+        if rate is None or len(filtered) == 0:
+            return np.empty((0, 2))
+        t = filtered[:, 0]
+        envelope = self.__envelope(np.nan_to_num(np.einsum('ij,ij->i', filtered[:, 4:7], filtered[:, 4:7])), rate)
+
+        if self.level is None:
+            self.__learn(t, envelope)
+            if self.level is None:
+                return np.empty((0, 2))
+            t = np.concatenate([times for times, _ in self.learningBlocks])
+            envelope = np.concatenate([values for _, values in self.learningBlocks])
+            self.learningBlocks = []
+
+        above = envelope > self.thresholdRatio * self.level
+        if self.candidate is not None and not above[0]:
+            # The section above the threshold ended with the previous block.
+            beats += self.__acceptBeat(*self.candidate)
+            self.candidate = None
+        boundaries = np.concatenate(([0], np.flatnonzero(above[1:] != above[:-1]) + 1, [len(above)]))
+        for start, end in zip(boundaries[:-1], boundaries[1:]):
+            if not above[start]:
+                continue
+            peak = start + int(np.argmax(envelope[start:end]))
+            if self.candidate is None or envelope[peak] > self.candidate[1]:
+                self.candidate = (float(t[peak]), float(envelope[peak]))
+            if end < len(above):
+                beats += self.__acceptBeat(*self.candidate)
+                self.candidate = None
+
+        self.__decay(float(t[-1]))
+        return np.array(beats).reshape(-1, 2)
+
+    def __envelope(self, energy, rate) -> np.ndarray:
+        """
+        Moving average of the energy, continuing from the energy of the previous block.
+
+        Args:
+            energy (np.ndarray): Energy of the new samples.
+            rate (float): Sample rate in Hz.
+
+        Returns:
+            envelope (np.ndarray): Envelope of the new samples.
+        """
+        length = max(int(self.window * rate), 1)
+        extended = np.concatenate((self.energyTail, energy))
+        sums = np.concatenate(([0.0], np.cumsum(extended)))
+        end = np.arange(len(self.energyTail), len(extended)) + 1
+        start = np.maximum(end - length, 0)
+        self.energyTail = extended[len(extended) - (length - 1):] if length > 1 else np.empty(0)
+        return (sums[end] - sums[start]) / (end - start)
+
+    def __learn(self, t, envelope):
+        """
+        Learn the initial peak level from the largest envelope value of the learning time. The blocks are kept until
+        the level is known.
+        """
+        if self.learningStart is None:
+            self.learningStart = float(t[0])
+        self.learningBlocks.append((t, envelope))
+        learningEnd = self.learningStart + self.learningTime
+        learning = t < learningEnd
+        if learning.any():
+            self.learningMax = max(self.learningMax, float(envelope[learning].max()))
+        if t[-1] >= learningEnd:
+            if self.learningMax > 0:
+                self.level = self.learningMax
+                self.lastLevelUpdate = learningEnd
+            else:
+                # No signal at all (e.g. a flat replay), learn again from the next block.
+                self.learningStart = None
+                self.learningBlocks = []
+
+    def __acceptBeat(self, beatTime, value) -> list:
+        """
+        Accept a peak as a beat unless it is within the refractory period of the last beat, and update the peak level
+        and heart rate.
+
+        Returns:
+            beats (list): [[beat time, heart rate]] if accepted, else [].
+        """
+        refractory = max(self.refractory, 0.4 * 60 / self.bpm) if self.bpm else self.refractory
+        if self.lastBeat is not None and beatTime - self.lastBeat < refractory:
+            return []
+        self.lastBeat = beatTime
+        self.lastLevelUpdate = beatTime
+        self.level = 0.875 * self.level + 0.125 * value
+        self.beatTimes.append(beatTime)
+        self.beatCount += 1
+
+        intervals = np.diff(self.beatTimes)
+        intervals = intervals[(intervals >= self.refractory) & (intervals <= 2.0)]
+        self.bpm = 60 / float(np.median(intervals)) if len(intervals) else None
+        return [[beatTime, self.bpm if self.bpm is not None else np.nan]]
+
+    def __decay(self, now):
+        """
+        Halve the peak level every 2 seconds without a beat, e.g. after the IMU was moved to a position with a weaker
+        signal. The heart rate is unknown after 3 seconds without a beat.
+        """
+        if now - self.lastLevelUpdate > 2.0:
+            self.level *= 0.5
+            self.lastLevelUpdate = now
+        if self.lastBeat is None or now - self.lastBeat > 3.0:
+            self.bpm = None
@@ -0,0 +1,283 @@
+"""
+Benchmark of the acquisition -> buffer -> plot -> log pipeline with synthetic data, no IMU or GUI window is needed.
+Results are printed and stored as JSON in the benchmarks directory, so runs of different versions can be compared:
+
+    python Benchmark.py --rates 200 1000 --plot-points 1000 12000
+    python Benchmark.py --compare benchmarks/<earlier result>.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import constants as c
+import Filters
+import IMU
+import LogFormat
+import Plotter
+import Simulation
+import WitmotionParser
+from Acquisition import SampleChannel
+from BeatDetector import BeatDetector
+from LogWriter import LogWriter
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is not reported.
+    resource = None
+
+
+def peakRssMb():
+    """
+    Returns:
+        peakRss (float): Peak resident set size of this process in MB, or None if it can not be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kB on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+def percentiles(values) -> dict:
+    """
+    Returns:
+        percentiles (dict): p50, p95, p99 and max of the values in milliseconds.
+    """
+    values = np.asarray(values) * 1000
+    return {f'p{p}': round(float(np.percentile(values, p)), 3) for p in (50, 95, 99)} | {
+        'max': round(float(values.max()), 3)}
+
+
+def synthesiseRows(count, rate) -> np.ndarray:
+    """
+    Returns:
+        rows (np.ndarray): count rows of [timestamp, ax, ay, az] of the synthetic SCG signal at the given rate.
+    """
+    t = np.arange(count) / rate
+    return np.column_stack((time.time() + t, Simulation.syntheticAcceleration(t)))
+
+
+def benchmarkParser(seconds, rate) -> dict:
+    """
+    Throughput of the built-in parser: decode chunks of serial data and publish the acceleration to a sample channel.
+    """
+    count = int(seconds * rate)
+    rows = synthesiseRows(count, rate)
+    raw = np.zeros((count, 4))
+    raw[:, :3] = np.round(rows[:, 1:] * 32768 / (16 * WitmotionParser.G))
+    # Time, acceleration, angle and quaternion frames for every sample, interleaved as sent by the IMU.
+    encoded = [WitmotionParser.encodeTimeFrames(rows[:, 0])] + [
+        WitmotionParser.encodeFrames(frameType, raw)
+        for frameType in (WitmotionParser.ACCELERATION, WitmotionParser.ANGLE, WitmotionParser.QUATERNION)]
+    frames = np.hstack([np.frombuffer(block, dtype=np.uint8).reshape(count, -1) for block in encoded]).tobytes()
+
+    parser = WitmotionParser.WitmotionParser()
+    channel = SampleChannel()
+    start = time.perf_counter()
+    for i in range(0, len(frames), 4096):
+        decoded = parser.feed(frames[i:i + 4096])
+        if 'acceleration' in decoded:
+            channel.publishBlock(decoded['acceleration'])
+    elapsed = time.perf_counter() - start
+    return {'samples': channel.writeSeq, 'samplesPerSecond': round(channel.writeSeq / elapsed),
+            'realTimeFactor': round(channel.writeSeq / elapsed / rate, 1)}
+
+
+def benchmarkAcquisition(seconds, rate) -> dict:
+    """
+    Throughput of the IMU block callback path, driven by the synthetic backend running as fast as possible.
+    """
+    imu = IMU.IMU(backend=c.BACKEND_SYNTHETIC)
+    imu.returnRate = rate
+    imu.simulationSpeed = 0
+    imu.connect()
+    target = int(seconds * rate)
+    start = time.perf_counter()
+    while imu.samples.writeSeq < target:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    imu.disconnect()
+    return {'samples': imu.samples.writeSeq, 'samplesPerSecond': round(imu.samples.writeSeq / elapsed),
+            'realTimeFactor': round(imu.samples.writeSeq / elapsed / rate, 1)}
+
+
+def benchmarkFilter(seconds, rate, blockSize=10) -> dict:
+    """
+    Throughput of the SCG band-pass filter stage on blocks of samples, as filtered by the plot and the log writer.
+    """
+    count = int(seconds * rate)
+    rows = synthesiseRows(count, rate)
+    filterStage = Filters.createFilterStage(c.FILTER_SCG, rate=rate)
+    start = time.perf_counter()
+    for i in range(0, count, blockSize):
+        filterStage.process(rows[i:i + blockSize])
+    elapsed = time.perf_counter() - start
+    return {'samples': count, 'samplesPerSecond': round(count / elapsed),
+            'realTimeFactor': round(count / elapsed / rate, 1)}
+
+
+def benchmarkBeats(seconds, rate, blockSize=10) -> dict:
+    """
+    Throughput of the beat detector on blocks of samples, as run by the plot and the log writer.
+    """
+    count = int(seconds * rate)
+    rows = synthesiseRows(count, rate)
+    detector = BeatDetector(rate=rate)
+    start = time.perf_counter()
+    for i in range(0, count, blockSize):
+        detector.process(rows[i:i + blockSize])
+    elapsed = time.perf_counter() - start
+    return {'samples': count, 'beats': detector.beatCount, 'samplesPerSecond': round(count / elapsed),
+            'realTimeFactor': round(count / elapsed / rate, 1)}
+
+
+def benchmarkRender(seconds, rate, plotPoints, frameInterval=0.05, filterOption=c.FILTER_NONE) -> dict:
+    """
+    Per-frame cost of the plot path (IMU.updatePlotData() and Plotter.update()) on a non-interactive Agg canvas. Each
+    frame publishes the samples that arrive in one frame interval at the given rate.
+    """
+    figure = Figure(figsize=(10, 5), dpi=100)
+    plotter = Plotter.Plotter(figure)
+    plotter.setCanvas(FigureCanvasAgg(figure))
+    imu = IMU.IMU()
+    imu.returnRate = rate
+    imu.setFilter(filterOption)
+    imu.setPlotSize(plotPoints)
+
+    perFrame = max(int(rate * frameInterval), 1)
+    frames = max(int(seconds / frameInterval), 1)
+    rows = synthesiseRows(plotPoints + perFrame * frames, rate)
+    rows = np.column_stack((rows, rows[:, 0]))  # Host arrival time column of IMU.samples.
+
+    # Fill the plot buffer first so every frame draws a full plot.
+    imu.samples.publishBlock(rows[:plotPoints])
+    imu.updatePlotData()
+    blocks = rows[plotPoints:].reshape(frames, perFrame, 5)
+    latencies = []
+    for block in blocks:
+        start = time.perf_counter()
+        imu.samples.publishBlock(block)
+        imu.updatePlotData()
+        data = imu.plotData.getView()
+        plotter.update([(data[:, 0] - data[0, 0], data[:, 1:8])], (True,) * len(Plotter.TRACES))
+        latencies.append(time.perf_counter() - start)
+    return {'frames': frames, 'frameLatencyMs': percentiles(latencies),
+            'maxFps': round(1 / float(np.mean(latencies)), 1)}
+
+
+def benchmarkLogging(seconds, rate, binary) -> dict:
+    """
+    Write throughput of the log writer. All samples are published first, then the writer drains the channel.
+    """
+    count = int(seconds * rate)
+    channel = SampleChannel(capacity=max(count, 1))
+    rows = synthesiseRows(count, rate)
+    extension = LogFormat.BINARY_EXTENSION if binary else LogFormat.TEXT_EXTENSION
+    with tempfile.TemporaryDirectory() as directory:
+        filePath = Path(directory, 'benchmark' + extension)
+        writer = LogWriter(channel.subscribe(), filePath, time.time(), binary=binary, pollInterval=0.001)
+        channel.publishBlock(rows)
+        start = time.perf_counter()
+        writer.start()
+        writer.stop()
+        writer.join()
+        elapsed = time.perf_counter() - start
+        size = filePath.stat().st_size
+    return {'lines': writer.linesWritten, 'linesPerSecond': round(writer.linesWritten / elapsed),
+            'megabytesPerSecond': round(size / elapsed / 1e6, 2), 'bytesPerLine': round(size / max(count, 1), 1)}
+
+
+def gitRevision():
+    """
+    Returns:
+        revision (str): Short hash of the current git commit, or None outside of a git repository.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previousPath):
+    """
+    Print the change of every numeric result relative to a previous result file.
+    """
+    with open(previousPath) as file:
+        previous = json.load(file)
+
+    def flatten(results, prefix=''):
+        for key, value in results.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f'{prefix}{key}.')
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f'{prefix}{key}', value
+
+    old = dict(flatten(previous['results']))
+    print(f'\nCompared with {previousPath} ({previous.get("revision")}):')
+    for key, value in flatten(current['results']):
+        if key in old and old[key]:
+            print(f'  {key}: {old[key]} -> {value} ({(value - old[key]) / old[key] * 100:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', type=float, nargs='+', default=[200, 1000], help='Sample rates in Hz.')
+    parser.add_argument('--plot-points', type=int, nargs='+', default=[1000, c.PLOT_POINTS_MAX],
+                        help='Plot buffer sizes.')
+    parser.add_argument('--seconds', type=float, default=10, help='Seconds of data per benchmark.')
+    parser.add_argument('--output', default='benchmarks', help='Directory the JSON results are written to.')
+    parser.add_argument('--compare', help='Earlier JSON result to compare with.')
+    args = parser.parse_args()
+
+    results = {}
+    for rate in args.rates:
+        print(f'Benchmarking at {rate}Hz...')
+        results[f'parser@{rate:g}Hz'] = benchmarkParser(args.seconds, rate)
+        results[f'acquisition@{rate:g}Hz'] = benchmarkAcquisition(args.seconds, rate)
+        results[f'filter@{rate:g}Hz'] = benchmarkFilter(args.seconds, rate)
+        results[f'beats@{rate:g}Hz'] = benchmarkBeats(args.seconds, rate)
+        for plotPoints in args.plot_points:
+            results[f'render@{rate:g}Hz/{plotPoints}pts'] = benchmarkRender(args.seconds, rate, plotPoints)
+        results[f'renderFiltered@{rate:g}Hz/{args.plot_points[-1]}pts'] = benchmarkRender(
+            args.seconds, rate, args.plot_points[-1], filterOption=c.FILTER_SCG)
+        results[f'logText@{rate:g}Hz'] = benchmarkLogging(args.seconds, rate, False)
+        results[f'logBinary@{rate:g}Hz'] = benchmarkLogging(args.seconds, rate, True)
+    results['peakRssMb'] = peakRssMb()
+
+    output = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'revision': gitRevision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'platform': platform.platform(),
+        'seconds': args.seconds,
+        'results': results
+    }
+    print(json.dumps(results, indent=2))
+
+    outputDirectory = Path(args.output)
+    outputDirectory.mkdir(parents=True, exist_ok=True)
+    outputPath = Path(outputDirectory, f'benchmark_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    with open(outputPath, 'w') as file:
+        json.dump(output, file, indent=2)
+    print(f'Results written to {outputPath}.')
+
+    if args.compare:
+        compare(output, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Synchronisation of the IMU clock with the host clock. The IMU timestamps come from the IMU's own clock, which has an
+unknown offset from the host and drifts relative to it, so converting them to wall clock time with a fixed offset is
+increasingly wrong over a long recording.
+"""
+import time
+from collections import deque
+
+import numpy as np
+
+NS_PER_SECOND = 1_000_000_000
+
+
+class ClockSync:
+    """
+    Online fit of the host time at which each IMU timestamp was taken. Every sample is paired with the host's monotonic
+    clock at arrival (see IMU.samples). Arrival is later than the sample by a varying transmission delay, so for each
+    window (1 second of IMU time by default) only the pair with the smallest difference, arrival time - IMU time, is
+    kept: that sample was delayed the least. A straight line through the minima of the recent windows gives the offset
+    (intercept) and drift (slope) of the IMU clock. A drift fitted over a few seconds is mostly noise, so until
+    minWindows windows are complete the smallest difference seen so far is used as a fixed offset.
+
+    The fit is updated once per window and the per-block work is vectorised, so the cost per sample is constant.
+    Corrected times are returned as integer nanoseconds of the wall clock (time.time_ns()), converted from the
+    monotonic clock with an offset captured once, so changes of the wall clock during a recording have no effect.
+
+    A jump of the IMU clock (backwards, or forwards by more than maxJump, e.g. a reconnected or reset IMU) restarts
+    the fit.
+    """
+
+    def __init__(self, window=1.0, windows=120, minWindows=10, maxJump=5.0):
+        """
+        Args:
+            window (float, optional): Length of a window of IMU time in seconds. Defaults to 1.
+            windows (int, optional): Number of recent windows fitted. Defaults to 120 (2 minutes).
+            minWindows (int, optional): Number of complete windows needed to fit the drift. Defaults to 10.
+            maxJump (float, optional): Largest forward step of the IMU clock in seconds that is not a jump. Defaults to
+                5.
+        """
+        self.window = window
+        self.minWindows = max(minWindows, 2)
+        self.maxJump = maxJump
+        self.minima = deque(maxlen=windows)  # (IMU time - reference, smallest arrival - IMU time) of each window.
+        self.wallOffsetNs = time.time_ns() - time.monotonic_ns()  # Converts monotonic times to wall clock times.
+        self.resets = 0  # Times the fit was restarted after a jump of the IMU clock.
+        self.reset()
+
+    def reset(self):
+        """
+        Restart the fit.
+        """
+        self.minima.clear()
+        self.reference = None  # IMU time the fit is relative to, keeps the fitted values small.
+        self.lastDeviceTime = None  # Last IMU time seen.
+        self.windowIndex = None  # Index of the current window.
+        self.windowMinimum = None  # (IMU time - reference, arrival - IMU time) of the current window's least delay.
+        self.offset = None  # Fitted arrival - IMU time at the reference, in seconds.
+        self.drift = 0.0  # Fitted change of the offset per second of IMU time.
+
+    def update(self, deviceTimes, hostTimes):
+        """
+        Add samples to the fit.
+
+        Args:
+            deviceTimes (np.ndarray): IMU timestamps of the samples in seconds.
+            hostTimes (np.ndarray): Host monotonic clock at arrival of the samples in seconds (time.monotonic()).
+        """
+        deviceTimes = np.asarray(deviceTimes, dtype=np.float64)
+        hostTimes = np.asarray(hostTimes, dtype=np.float64)
+        if len(deviceTimes) == 0:
+            return
+        steps = np.diff(np.concatenate(([self.lastDeviceTime], deviceTimes))) if self.lastDeviceTime is not None \
+            else np.zeros(len(deviceTimes))
+        jumps = np.flatnonzero((steps < 0) | (steps > self.maxJump))
+        if len(jumps):
+            # Only the samples after the last jump belong to the new clock.
+            self.resets += 1
+            self.reset()
+            deviceTimes = deviceTimes[jumps[-1]:]
+            hostTimes = hostTimes[jumps[-1]:]
+        self.lastDeviceTime = float(deviceTimes[-1])
+        if self.reference is None:
+            self.reference = float(deviceTimes[0])
+
+        relative = deviceTimes - self.reference
+        delays = hostTimes - deviceTimes
+        indices = np.floor(relative / self.window).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(indices[1:] != indices[:-1]) + 1))
+        ends = np.concatenate((starts[1:], [len(indices)]))
+        for start, end in zip(starts, ends):
+            best = start + int(np.argmin(delays[start:end]))
+            candidate = (float(relative[best]), float(delays[best]))
+            if indices[start] != self.windowIndex:
+                self.__closeWindow()
+                self.windowIndex = int(indices[start])
+                self.windowMinimum = candidate
+            elif candidate[1] < self.windowMinimum[1]:
+                self.windowMinimum = candidate
+        if len(self.minima) < self.minWindows:
+            smallest = min(self.windowMinimum[1], min(minimum[1] for minimum in self.minima)) if self.minima else \
+                self.windowMinimum[1]
+            self.offset, self.drift = smallest, 0.0
+
+    def __closeWindow(self):
+        """
+        Store the least delayed sample of the finished window and refit the offset and drift.
+        """
+        if self.windowMinimum is None:
+            return
+        self.minima.append(self.windowMinimum)
+        if len(self.minima) >= self.minWindows:
+            points = np.array(self.minima)
+            self.drift, self.offset = (float(value) for value in np.polyfit(points[:, 0], points[:, 1], 1))
+
+    def hostTimes(self, deviceTimes) -> np.ndarray:
+        """
+        Returns:
+            hostTimes (np.ndarray): Host monotonic times in seconds at which the given IMU timestamps were taken.
+        """
+        deviceTimes = np.asarray(deviceTimes, dtype=np.float64)
+        if self.offset is None:
+            return deviceTimes.copy()
+        return deviceTimes + self.offset + self.drift * (deviceTimes - self.reference)
+
+    def wallTimesNs(self, deviceTimes) -> np.ndarray:
+        """
+        Returns:
+            wallTimes (np.ndarray): int64 wall clock times in nanoseconds since the epoch at which the given IMU
+                timestamps were taken. IMU timestamps are returned unchanged (in nanoseconds) before any samples are
+                added.
+        """
+        if self.offset is None:
+            return toNs(deviceTimes)
+        return toNs(self.hostTimes(deviceTimes)) + self.wallOffsetNs
+
+    def describe(self) -> dict:
+        """
+        Returns:
+            sync (dict): JSON serialisable offset (s), drift (parts per million), windows fitted and restarts of the
+                fit, stored with the log statistics.
+        """
+        return {'offset': self.offset, 'driftPpm': round(self.drift * 1e6, 3), 'windows': len(self.minima),
+                'resets': self.resets}
+
+
+def toNs(times) -> np.ndarray:
+    """
+    Returns:
+        times (np.ndarray): The given times in seconds as int64 nanoseconds.
+    """
+    return np.round(np.asarray(times, dtype=np.float64) * NS_PER_SECOND).astype(np.int64)
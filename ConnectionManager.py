@@ -0,0 +1,212 @@
+"""
+Connection manager of an IMU: connects without blocking the GUI and reconnects after a lost connection, e.g. a
+Bluetooth link that dropped out.
+"""
+import threading
+import time
+
+import constants as c
+import PortDiscovery
+
+
+class ConnectionManager:
+    """
+    Connects an IMU from a supervisor thread and keeps it connected. The GUI (or Headless.py) only starts and stops the
+    manager and reads its state, opening a port never blocks the calling thread.
+
+    While connected the supervisor checks every poll interval that samples still arrive, from the sequence number of
+    the IMU's sample channel, so a stall is found whatever the cause: a dropped Bluetooth link, a removed adapter or a
+    receive thread that ended with a serial error. When no samples have arrived for the stall timeout the IMU is
+    disconnected, the gap is marked in its channels with IMU.markGap() (a NaN row, which breaks the plotted traces and
+    is written to the log) and the IMU is reconnected. A reconnection only counts once samples arrive again, a port that
+    opens but stays silent (e.g. a Bluetooth port whose device is out of range) is a failed attempt. Failed attempts
+    are retried after a delay that doubles up to the maximum backoff, until the manager is stopped. The plot data,
+    statistics, subscriptions and log continue across the reconnection.
+
+    Once the first samples arrive from a COM port backend, its port and baud rate are stored as the last port (see
+    PortDiscovery.saveLastPort()), so the next session starts with them.
+
+    Only the supervisor thread connects and disconnects the IMU once the manager is started.
+    """
+
+    def __init__(self, imu, stallTimeout=c.STALL_TIMEOUT, minBackoff=c.RECONNECT_BACKOFF_MIN,
+                 maxBackoff=c.RECONNECT_BACKOFF_MAX, pollInterval=0.1):
+        """
+        Initialise a ConnectionManager. Nothing is connected until connect() is called.
+
+        Args:
+            imu (IMU.IMU): IMU to connect, with its COM port, baud rate and backend set.
+            stallTimeout (float, optional): Time without samples after which the connection is taken to be lost, in
+                seconds, at least 5 sample intervals. Defaults to constants.STALL_TIMEOUT.
+            minBackoff (float, optional): Delay before the first reconnection attempt in seconds. Defaults to
+                constants.RECONNECT_BACKOFF_MIN.
+            maxBackoff (float, optional): Longest delay between reconnection attempts in seconds. Defaults to
+                constants.RECONNECT_BACKOFF_MAX.
+            pollInterval (float, optional): Time between checks of the connection in seconds. Defaults to 0.1.
+        """
+        self.imu = imu
+        self.stallTimeout = stallTimeout
+        self.minBackoff = minBackoff
+        self.maxBackoff = maxBackoff
+        self.pollInterval = pollInterval
+        self.state = c.CONNECTION_DISCONNECTED  # One of the constants.CONNECTION_ states.
+        self.stopEvent = threading.Event()  # Set to stop the supervisor thread.
+        self.settled = threading.Event()  # Set once the first connection attempt has finished.
+        self.thread = None  # Supervisor thread.
+        self.reconnects = 0  # Successful reconnections after a lost connection.
+        self.gaps = 0  # Lost connections, each marked as a gap.
+        self.downtime = 0.0  # Total time without a connection after it was lost, in seconds.
+        # Monotonic time the last sample arrived before the connection was lost, None while samples arrive.
+        self.lostTime = None
+        self.retryTime = None  # Monotonic time of the next reconnection attempt.
+
+    @property
+    def active(self) -> bool:
+        """
+        Returns:
+            active (bool): True while the manager is connecting, connected or reconnecting.
+        """
+        return self.state in (c.CONNECTION_CONNECTING, c.CONNECTION_CONNECTED, c.CONNECTION_RECONNECTING)
+
+    def connect(self):
+        """
+        Start connecting the IMU in the background. A manager that is still stopping is waited for first.
+        """
+        if self.thread and self.thread.is_alive():
+            self.stopEvent.set()
+            self.thread.join()
+        self.stopEvent.clear()
+        self.settled.clear()
+        self.state = c.CONNECTION_CONNECTING
+        self.thread = threading.Thread(target=self.__run, name='ConnectionManager', daemon=True)
+        self.thread.start()
+
+    def waitForConnection(self, timeout=None) -> bool:
+        """
+        Wait until the first connection attempt has finished.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to None (wait indefinitely).
+
+        Returns:
+            connected (bool): True if the IMU was connected.
+        """
+        self.settled.wait(timeout)
+        return self.state == c.CONNECTION_CONNECTED
+
+    def disconnect(self, wait=False):
+        """
+        Stop the manager. The supervisor thread disconnects the IMU, after a connection attempt in progress has
+        finished.
+
+        Args:
+            wait (bool, optional): Wait until the IMU is disconnected. Defaults to False (returns immediately).
+        """
+        self.stopEvent.set()
+        if wait:
+            self.join()
+
+    def join(self, timeout=None):
+        """
+        Wait for the supervisor thread to finish.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to None (wait indefinitely).
+        """
+        if self.thread:
+            self.thread.join(timeout)
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            summary (dict): State, lost connections (gaps), reconnections, total downtime in seconds and the time until
+                the next reconnection attempt (None unless reconnecting).
+        """
+        retryIn = None
+        if self.state == c.CONNECTION_RECONNECTING and self.retryTime is not None:
+            retryIn = max(self.retryTime - time.monotonic(), 0.0)
+        return {'state': self.state, 'gaps': self.gaps, 'reconnects': self.reconnects,
+                'downtime': round(self.downtime, 1), 'retryIn': retryIn}
+
+    def describe(self) -> str:
+        """
+        Returns:
+            description (str): Short description of the state for a status element, e.g. 'Reconnecting in 4s'.
+        """
+        summary = self.summary()
+        if self.state == c.CONNECTION_CONNECTED and self.lostTime is not None:
+            return f'{c.CONNECTION_RECONNECTING}, waiting for data'
+        if summary['retryIn'] is not None:
+            return f'{self.state} in {summary["retryIn"]:.0f}s'
+        if self.state == c.CONNECTION_CONNECTED and self.gaps:
+            return f'{self.state}, {self.gaps} drop-out{"s" if self.gaps > 1 else ""}'
+        return self.state
+
+    def __stallLimit(self) -> float:
+        """
+        Returns:
+            limit (float): Time without samples after which the connection is lost, at least 5 sample intervals.
+        """
+        interval = self.imu.rateMonitor.meanInterval or 1 / (self.imu.returnRate or 200)
+        return max(self.stallTimeout, 5 * interval)
+
+    def __run(self):
+        """
+        Supervisor thread. Connects the IMU, then watches the samples and reconnects until stopped. If the first
+        connection attempt fails the manager stops, as the port or backend is most likely wrong.
+        """
+        connected = self.imu.connect()
+        self.state = c.CONNECTION_CONNECTED if connected else c.CONNECTION_FAILED
+        self.settled.set()
+        if not connected:
+            return
+
+        backoff = self.minBackoff
+        lastSeq = self.imu.samples.writeSeq
+        portSaved = self.imu.backend not in (c.BACKEND_WITMOTION, c.BACKEND_PARSER)
+        lastProgress = time.monotonic()
+        while not self.stopEvent.wait(self.pollInterval):
+            now = time.monotonic()
+            if self.state == c.CONNECTION_CONNECTED:
+                seq = self.imu.samples.writeSeq
+                if seq != lastSeq:
+                    lastSeq = seq
+                    lastProgress = now
+                    if not portSaved:
+                        PortDiscovery.saveLastPort(self.imu.comPort, self.imu.baudRate)
+                        portSaved = True
+                    if self.lostTime is not None:
+                        self.downtime += now - self.lostTime
+                        self.reconnects += 1
+                        print(f'Reconnected to {self.imu.comPort} after {now - self.lostTime:.1f}s.')
+                        self.lostTime = None
+                elif now - lastProgress > self.__stallLimit():
+                    self.imu.disconnect()
+                    if self.lostTime is None:
+                        print(f'No data from {self.imu.comPort} for {now - lastProgress:.1f}s, reconnecting.')
+                        self.imu.markGap()
+                        self.gaps += 1
+                        self.lostTime = lastProgress
+                        backoff = self.minBackoff
+                    else:
+                        backoff = min(2 * backoff, self.maxBackoff)
+                        print(f'No data from {self.imu.comPort} after reconnecting, retrying in {backoff:.1f}s.')
+                    self.retryTime = now + backoff
+                    self.state = c.CONNECTION_RECONNECTING
+            elif now >= self.retryTime:
+                if self.imu.connect(reset=False):
+                    lastSeq = self.imu.samples.writeSeq
+                    lastProgress = time.monotonic()
+                    self.retryTime = None
+                    self.state = c.CONNECTION_CONNECTED
+                else:
+                    backoff = min(2 * backoff, self.maxBackoff)
+                    self.retryTime = time.monotonic() + backoff
+                    print(f'Reconnection to {self.imu.comPort} failed, retrying in {backoff:.1f}s.')
+
+        if self.imu.isConnected:
+            self.imu.disconnect()
+        if self.lostTime is not None:
+            self.downtime += time.monotonic() - self.lostTime
+            self.lostTime = None
+        self.state = c.CONNECTION_DISCONNECTED
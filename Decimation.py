@@ -0,0 +1,48 @@
+"""
+Min/max decimation for plotting. A plot can not show more than one vertical line of pixels per column, so drawing more
+than two points per pixel column only costs time. Keeping the minimum and maximum of each column keeps the visual
+envelope of the signal, so short peaks (e.g. SCG peaks) are not lost the way they are with plain down-sampling.
+"""
+import numpy as np
+
+
+def minMaxDecimate(t, values, buckets):
+    """
+    Decimate traces to at most two points (minimum and maximum) per bucket, with the points of a bucket kept in time
+    order. The selection is done separately for each trace, so each trace has its own time values.
+
+    If there are not more than 2 * buckets samples the data is returned as is.
+
+    Args:
+        t (np.ndarray): Sample times, shape (n,).
+        values (np.ndarray): Trace values, shape (n, traces).
+        buckets (int): Number of buckets, typically the width of the plot in pixels.
+
+    Returns:
+        tOut (np.ndarray): Times of the kept points, shape (m, traces) or (n,) if nothing was decimated.
+        valuesOut (np.ndarray): Values of the kept points, shape (m, traces).
+    """
+    n = len(t)
+    buckets = max(int(buckets), 1)
+    if n <= 2 * buckets:
+        return t, values
+
+    size = -(-n // buckets)  # Samples per bucket, rounded up.
+    fullBuckets = n // size
+    end = fullBuckets * size
+
+    blocks = values[:end].reshape(fullBuckets, size, values.shape[1])
+    base = np.arange(0, end, size)[:, None]
+    indices = [np.argmin(blocks, axis=1) + base, np.argmax(blocks, axis=1) + base]
+
+    if end < n:
+        # Partial bucket at the end of the data.
+        tail = values[end:]
+        indices[0] = np.vstack((indices[0], np.argmin(tail, axis=0) + end))
+        indices[1] = np.vstack((indices[1], np.argmax(tail, axis=0) + end))
+
+    first = np.minimum(indices[0], indices[1])
+    second = np.maximum(indices[0], indices[1])
+    keep = np.stack((first, second), axis=1).reshape(-1, values.shape[1])
+
+    return t[keep], np.take_along_axis(values, keep, axis=0)
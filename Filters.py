@@ -0,0 +1,253 @@
+"""
+Streaming filters for the acceleration stream. Filters are cascades of second order sections (biquads) designed with
+the bilinear transform, so no signal processing library is needed. The filter state is carried from one block of
+samples to the next, so only new samples are filtered, and a block filtered in pieces gives the same result as
+filtering it at once.
+"""
+import numpy as np
+
+import constants as c
+
+
+def butterworthSections(kind, order, cutoff, rate) -> np.ndarray:
+    """
+    Design a Butterworth low-pass or high-pass filter as second order sections.
+
+    Args:
+        kind (str): 'lowpass' or 'highpass'.
+        order (int): Filter order, must be even.
+        cutoff (float): -3dB frequency in Hz, below the Nyquist frequency.
+        rate (float): Sample rate in Hz.
+
+    Returns:
+        sections (np.ndarray): Array of shape (order / 2, 6), each row is [b0, b1, b2, 1, a1, a2].
+    """
+    if order < 2 or order % 2:
+        raise ValueError(f'Filter order must be even, not {order}.')
+    if not 0 < cutoff < rate / 2:
+        raise ValueError(f'Cutoff of {cutoff}Hz is not between 0 and the Nyquist frequency ({rate / 2}Hz).')
+    omega = 2 * np.pi * cutoff / rate
+    cos = np.cos(omega)
+    sections = []
+    for k in range(order // 2):
+        # Quality factor of each pole pair of the Butterworth filter.
+        q = 1 / (2 * np.sin(np.pi * (2 * k + 1) / (2 * order)))
+        alpha = np.sin(omega) / (2 * q)
+        a0 = 1 + alpha
+        if kind == 'lowpass':
+            b = np.array([(1 - cos) / 2, 1 - cos, (1 - cos) / 2])
+        elif kind == 'highpass':
+            b = np.array([(1 + cos) / 2, -(1 + cos), (1 + cos) / 2])
+        else:
+            raise ValueError(f'Unknown filter type: {kind}.')
+        sections.append(np.concatenate((b / a0, [1, -2 * cos / a0, (1 - alpha) / a0])))
+    return np.array(sections)
+
+
+class SosFilter:
+    """
+    Cascade of second order sections applied to several channels at once. Each section is evaluated in direct form II.
+    Without scipy there is no compiled sosfilt, and a recursion evaluated sample by sample in Python costs several
+    NumPy calls per sample, so the recursive part is solved a chunk of up to chunkSize samples at a time: within a
+    chunk its output is the input convolved with the section's impulse response plus the response to the state left
+    by the previous chunk, one matrix product for all the channels. The feed-forward part is vectorised over the whole
+    block.
+
+    The state of each channel is initialised from its first finite sample as if the input had always had that value,
+    so a constant offset such as gravity does not cause a start-up transient. Missing (NaN) samples, e.g. of a stale
+    stream of a StreamMerger, are filtered as a repeat of the last finite sample and returned as NaN, so a gap does not
+    leave the filter state NaN.
+    """
+
+    def __init__(self, sections, channels, chunkSize=64):
+        """
+        Args:
+            sections (np.ndarray): Array of shape (sections, 6), see butterworthSections().
+            channels (int): Number of channels filtered.
+            chunkSize (int, optional): Samples of the recursive part solved at once. Defaults to 64.
+        """
+        self.sections = np.asarray(sections, dtype=np.float64)
+        self.channels = channels
+        self.chunkSize = chunkSize
+        # Last two internal values [w[n-2], w[n-1]] of each section, shape (sections, 2, channels).
+        self.state = np.zeros((len(self.sections), 2, channels))
+        self.lastInput = np.full(channels, np.nan)  # Last finite sample of each channel, NaN until initialised.
+        # Recursive part of each section over a chunk: w = responses @ [w[-2], w[-1], x[0], ..., x[chunkSize - 1]].
+        self.responses = [self.__chunkResponse(a1, a2) for _, _, _, _, a1, a2 in self.sections]
+
+    def __chunkResponse(self, a1, a2) -> np.ndarray:
+        """
+        Solve w[k] = x[k] - a1 * w[k - 1] - a2 * w[k - 2] for a chunk, in terms of the two values before the chunk and
+        the inputs of the chunk.
+
+        Returns:
+            response (np.ndarray): Array of shape (chunkSize, chunkSize + 2), row k gives w[k] as weights of
+                [w[-2], w[-1], x[0], ..., x[chunkSize - 1]].
+        """
+        # The first two rows are the values before the chunk, which weigh only themselves.
+        w = np.zeros((self.chunkSize + 2, self.chunkSize + 2))
+        w[0, 0] = w[1, 1] = 1
+        for k in range(self.chunkSize):
+            w[k + 2] = -a1 * w[k + 1] - a2 * w[k]
+            w[k + 2, k + 2] += 1
+        return w[2:]
+
+    def __initialState(self, channels, first):
+        """
+        Set the steady state of the given channels for a constant input equal to their first sample.
+
+        Args:
+            channels (np.ndarray): Indices of the channels.
+            first (np.ndarray): First finite sample of each of the channels.
+        """
+        x = first
+        for i, (b0, b1, b2, _, a1, a2) in enumerate(self.sections):
+            w = x / (1 + a1 + a2)
+            self.state[i, :, channels] = w[:, None]
+            x = (b0 + b1 + b2) * w
+        self.lastInput[channels] = first
+
+    def process(self, block) -> np.ndarray:
+        """
+        Filter a block of samples, continuing from the previous block.
+
+        Args:
+            block (np.ndarray): Array of shape (n, channels).
+
+        Returns:
+            filtered (np.ndarray): Array of shape (n, channels).
+        """
+        x = np.asarray(block, dtype=np.float64)
+        if len(x) == 0:
+            return x.copy()
+        finite = np.isfinite(x)
+        new = np.flatnonzero(np.isnan(self.lastInput) & finite.any(axis=0))
+        if len(new):
+            firstIndex = np.argmax(finite[:, new], axis=0)
+            self.__initialState(new, x[firstIndex, new])
+        if not finite.all():
+            # Forward fill the gaps from the last finite sample of each channel.
+            latest = np.maximum.accumulate(np.where(finite, np.arange(len(x))[:, None], -1), axis=0)
+            x = np.where(latest >= 0, x[np.maximum(latest, 0), np.arange(self.channels)], self.lastInput)
+        self.lastInput = x[-1].copy()
+
+        for i, (b0, b1, b2, _, a1, a2) in enumerate(self.sections):
+            w = np.empty((len(x) + 2, self.channels))
+            w[:2] = self.state[i]
+            for k in range(0, len(x), self.chunkSize):
+                n = min(self.chunkSize, len(x) - k)
+                response = self.responses[i]
+                w[k + 2:k + n + 2] = response[:n, :2] @ w[k:k + 2] + response[:n, 2:n + 2] @ x[k:k + n]
+            self.state[i] = w[-2:]
+            x = b0 * w[2:] + b1 * w[1:-1] + b2 * w[:-2]
+        x[~finite] = np.nan
+        return x
+
+
+class FilterStage:
+    """
+    Filter stage for blocks of sample rows [timestamp, values...]. The value columns are filtered with an optional
+    high-pass (gravity and drift removal) and an optional low-pass, together a band-pass, and the filtered values are
+    appended to the raw ones: [timestamp, values..., filtered values...]. With decimation only every n-th row is
+    returned, the low-pass then also acts as the anti-aliasing filter.
+
+    The sample rate is estimated from the timestamps of the first block if it is not given. Rows that arrive before
+    it can be estimated (a first block of a single row) are returned with NaN filtered values.
+    """
+
+    def __init__(self, highPass=None, lowPass=None, order=4, decimation=1, channels=3, rate=None):
+        """
+        Args:
+            highPass (float, optional): High-pass cutoff in Hz. Defaults to None (no high-pass).
+            lowPass (float, optional): Low-pass cutoff in Hz. Defaults to None (no low-pass unless decimating).
+            order (int, optional): Order of each filter, must be even. Defaults to 4.
+            decimation (int, optional): Keep every n-th row. Defaults to 1.
+            channels (int, optional): Number of value columns filtered. Defaults to 3 (ax, ay, az).
+            rate (float, optional): Sample rate in Hz. Defaults to None (estimated).
+        """
+        self.highPass = highPass
+        self.lowPass = lowPass
+        self.order = order
+        self.decimation = max(int(decimation), 1)
+        self.channels = channels
+        self.rate = None
+        self.filter = None
+        self.phase = 0  # Rows to skip before the next kept row when decimating.
+        if rate:
+            self.__design(rate)
+
+    def __design(self, rate):
+        """
+        Design the filter for the given sample rate. Cutoffs at or above the Nyquist frequency are left out.
+
+        Args:
+            rate (float): Sample rate in Hz.
+        """
+        self.rate = rate
+        lowPass = self.lowPass
+        if self.decimation > 1:
+            antiAliasing = 0.4 * rate / self.decimation
+            lowPass = min(lowPass, antiAliasing) if lowPass else antiAliasing
+        sections = []
+        if self.highPass and self.highPass < rate / 2:
+            sections.append(butterworthSections('highpass', self.order, self.highPass, rate))
+        if lowPass and lowPass < rate / 2:
+            sections.append(butterworthSections('lowpass', self.order, lowPass, rate))
+        self.filter = SosFilter(np.vstack(sections) if sections else np.empty((0, 6)), self.channels)
+
+    def process(self, rows) -> np.ndarray:
+        """
+        Filter a block of rows, continuing from the previous block.
+
+        Args:
+            rows (np.ndarray): Rows of [timestamp, values...], shape (n, 1 + channels) or wider (extra columns are
+                ignored).
+
+        Returns:
+            rows (np.ndarray): Rows of [timestamp, values..., filtered values...], shape (m, 1 + 2 * channels), where m
+                is n divided by the decimation.
+        """
+        rows = np.asarray(rows)[:, :1 + self.channels]
+        if self.filter is None and len(rows) > 1:
+            interval = np.median(np.diff(rows[:, 0]))
+            if interval <= 0:
+                interval = (rows[-1, 0] - rows[0, 0]) / (len(rows) - 1)
+            if interval > 0:
+                self.__design(1 / interval)
+        if self.filter is None:
+            filtered = np.full((len(rows), self.channels), np.nan)
+        else:
+            filtered = self.filter.process(rows[:, 1:])
+        output = np.column_stack((rows, filtered))
+
+        if self.decimation > 1:
+            keep = np.arange(self.phase, len(output), self.decimation)
+            self.phase = (self.phase - len(output)) % self.decimation
+            output = output[keep]
+        return output
+
+    def describe(self) -> dict:
+        """
+        Returns:
+            settings (dict): Filter settings, stored in the binary log header.
+        """
+        return {'highPass': self.highPass, 'lowPass': self.lowPass, 'order': self.order,
+                'decimation': self.decimation, 'rate': self.rate}
+
+
+def createFilterStage(option, channels=3, rate=None):
+    """
+    Create a filter stage for one of the filter options of the GUI.
+
+    Args:
+        option (str): One of constants.FILTER_OPTIONS.
+        channels (int, optional): Number of value columns filtered. Defaults to 3.
+        rate (float, optional): Sample rate in Hz. Defaults to None (estimated from the samples).
+
+    Returns:
+        filterStage (FilterStage): New filter stage, or None for constants.FILTER_NONE.
+    """
+    settings = c.FILTER_SETTINGS.get(option)
+    if settings is None:
+        return None
+    return FilterStage(channels=channels, rate=rate, **settings)
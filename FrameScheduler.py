@@ -0,0 +1,104 @@
+"""
+Refresh scheduling of the main window: when the GUI loop wakes up and when the plot is redrawn.
+"""
+import math
+import time
+
+import constants as c
+from Instrumentation import profiler
+
+
+class FrameScheduler:
+    """
+    Decides when the main loop redraws the plot and how long it waits for events in between. A frame is drawn only
+    when new samples arrived or the plot state changed (invalidate()), and no sooner than the frame interval after the
+    last frame. The frame interval follows the measured cost of drawing: the target frame rate is kept while a frame
+    costs less than the render budget of it, e.g. with a 50% budget a 25ms frame limits the plot to 20 frames per
+    second, leaving the GUI thread time for events. The interval never exceeds the maximum frame interval.
+
+    The loop waits until the next frame is due. Polls without new samples back off, doubling the wait up to the idle
+    interval, so the loop runs about as often as data arrives. When nothing is live (no IMU connected or connecting
+    and no log open) it only wakes every idle interval, for the connection state.
+    """
+
+    def __init__(self, targetFps=c.GUI_TARGET_FPS, renderBudget=c.GUI_RENDER_BUDGET,
+                 maxInterval=c.GUI_MAX_FRAME_INTERVAL, idleInterval=c.GUI_IDLE_INTERVAL, alpha=0.2):
+        """
+        Args:
+            targetFps (float, optional): Frame rate while drawing is cheap. Defaults to constants.GUI_TARGET_FPS.
+            renderBudget (float, optional): Largest fraction of the frame interval spent drawing. Defaults to
+                constants.GUI_RENDER_BUDGET.
+            maxInterval (float, optional): Longest frame interval in seconds. Defaults to
+                constants.GUI_MAX_FRAME_INTERVAL.
+            idleInterval (float, optional): Wait between polls when idle, in seconds. Defaults to
+                constants.GUI_IDLE_INTERVAL.
+            alpha (float, optional): Weight of the newest frame in the moving average of the frame cost. Defaults
+                to 0.2.
+        """
+        self.targetInterval = 1 / targetFps
+        self.renderBudget = renderBudget
+        self.maxInterval = maxInterval
+        self.idleInterval = idleInterval
+        self.alpha = alpha
+        self.interval = self.targetInterval  # Current frame interval in seconds.
+        self.frameCost = None  # Moving average of the time to draw a frame in seconds.
+        self.lastFrame = 0.0  # time.monotonic() of the last frame.
+        self.pendingSamples = 0  # Samples that arrived since the last frame.
+        self.dirty = True  # The plot state changed since the last frame.
+        self.emptyPolls = 0  # Consecutive polls without new samples.
+        self.intervalCounter = profiler.counter('gui.frameInterval')  # Frame interval in ms, see Instrumentation.py.
+        self.intervalCounter.set(round(1e3 * self.interval, 1))
+
+    def invalidate(self):
+        """
+        Request a frame for a change of the plot state (e.g. a trace shown or hidden), even without new samples.
+        """
+        self.dirty = True
+
+    def addSamples(self, count):
+        """
+        Args:
+            count (int): Number of samples that arrived since the last call.
+        """
+        self.pendingSamples += count
+        self.emptyPolls = 0 if count else self.emptyPolls + 1
+
+    def isDue(self) -> bool:
+        """
+        Returns:
+            due (bool): True if a frame should be drawn now.
+        """
+        return (self.dirty or self.pendingSamples > 0) and time.monotonic() - self.lastFrame >= self.interval
+
+    def frameDrawn(self, cost):
+        """
+        Record a drawn frame and adapt the frame interval to its cost.
+
+        Args:
+            cost (float): Time taken to draw the frame in seconds.
+        """
+        self.lastFrame = time.monotonic()
+        self.pendingSamples = 0
+        self.dirty = False
+        self.frameCost = cost if self.frameCost is None else self.alpha * cost + (1 - self.alpha) * self.frameCost
+        interval = min(max(self.targetInterval, self.frameCost / self.renderBudget), self.maxInterval)
+        if interval != self.interval:
+            self.interval = interval
+            self.intervalCounter.set(round(1e3 * interval, 1))
+
+    def timeout(self, live) -> int:
+        """
+        Args:
+            live (bool): True if data may arrive or the plot may change, e.g. while an IMU is connected.
+
+        Returns:
+            timeout (int): Time to wait for events before the next pass of the main loop, in milliseconds.
+        """
+        if not live:
+            return int(1e3 * self.idleInterval)
+        if self.dirty or self.pendingSamples:
+            wait = self.lastFrame + self.interval - time.monotonic()
+        else:
+            wait = min(self.interval * 2 ** min(self.emptyPolls, 8), self.idleInterval)
+        # Rounded up, so the loop does not wake just before the frame is due.
+        return max(math.ceil(1e3 * wait), 1)
@@ -0,0 +1,246 @@
+"""
+Headless acquisition: connects an IMU and logs it straight to disk without the GUI, e.g. on a machine without a
+display or as a service. No plot is drawn, the log is written by the same LogWriter and in the same format as from the
+GUI:
+
+    python Headless.py "logging/night.scglog" --port COM7 --baud 115200 --rate 200 --bandwidth 256 --algorithm 6
+    python Headless.py "logging/test.txt" --backend "Synthetic signal" --duration 60
+
+A binary log is written if the log path ends in .scglog, a text log otherwise. The throughput, measured rate and the
+samples dropped by the log writer are printed every report interval. With --channels the other channels of the IMU
+(angular velocity, angle, magnetic field, quaternion, or those named) are logged next to the log, each to its own file
+(see LogFormat.channelPath()). With --live the samples are also published to other processes (see LiveStream.py).
+With --port auto the ports are searched for the IMU and its baud rate first (see PortDiscovery.py). With --trace the
+instrumentation events of the last seconds (see Instrumentation.py) are written to a Chrome trace when stopping.
+If the data stops arriving (e.g. a Bluetooth drop-out) the IMU is reconnected and the gap is marked in the log, see
+ConnectionManager.py. Ctrl+C or SIGTERM (e.g. from a service manager) stops acquisition, writes the remaining samples
+and closes the log before exiting.
+"""
+import argparse
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+import constants as c
+import IMU
+import LogFormat
+import PortDiscovery
+from ConnectionManager import ConnectionManager
+from Instrumentation import profiler
+from LiveStream import LiveServer
+
+
+class HeadlessLogger:
+    """
+    Runs the acquisition of one IMU and its LogWriter from the main thread, without a window. The main thread only
+    waits for a stop signal and prints a status line every report interval, the samples are handled by the IMU's
+    acquisition thread and the writer thread as in the GUI. The IMU is kept connected by a ConnectionManager.
+    """
+
+    def __init__(self, imu, logPath, segmentSeconds=None, reportInterval=10.0, duration=None, livePort=None,
+                 channels=None, stallTimeout=c.STALL_TIMEOUT, tracePath=None):
+        """
+        Args:
+            imu (IMU.IMU): IMU to log, configured but not connected.
+            logPath (Path): Path of the log, binary if it has the binary log extension.
+            segmentSeconds (float, optional): Split the log into segments of this length. Defaults to None.
+            reportInterval (float, optional): Time between status lines in seconds. Defaults to 10.
+            duration (float, optional): Stop after this many seconds. Defaults to None (until stopped).
+            livePort (int, optional): Publish the samples on this port with a LiveServer. Defaults to None.
+            channels (list[str], optional): Channels of constants.IMU_CHANNELS that are also logged. Defaults to None.
+            stallTimeout (float, optional): Time without samples after which the IMU is reconnected, in seconds.
+                Defaults to constants.STALL_TIMEOUT.
+            tracePath (Path, optional): Write the instrumentation events to this Chrome trace when stopping. Defaults
+                to None.
+        """
+        self.imu = imu
+        self.logPath = Path(logPath)
+        self.segmentSeconds = segmentSeconds
+        self.reportInterval = reportInterval
+        self.duration = duration
+        self.stopEvent = threading.Event()  # Set by a signal handler or once the duration has passed.
+        self.lastReport = None  # (time, samples received) at the last status line.
+        self.livePort = livePort
+        self.liveServer = None
+        self.channels = channels
+        self.connection = ConnectionManager(imu, stallTimeout=stallTimeout)
+        self.tracePath = tracePath
+
+    def stop(self, signum=None, frame=None):
+        """
+        Request a clean stop. Used as the signal handler, it only sets an event, the log is closed by run().
+        """
+        if signum is not None:
+            print(f'Received {signal.Signals(signum).name}, stopping.')
+        self.stopEvent.set()
+
+    def installSignalHandlers(self):
+        """
+        Stop on SIGINT (Ctrl+C), SIGTERM and, on Windows, SIGBREAK (Ctrl+Break). Must be called from the main thread.
+        """
+        for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), self.stop)
+
+    def run(self, returnRate=None, bandwidth=None, algorithm=None) -> int:
+        """
+        Connect the IMU, apply the settings, log until stopped and close the log.
+
+        Args:
+            returnRate (float, optional): Return rate to set in Hz. Defaults to None (unchanged).
+            bandwidth (int, optional): Bandwidth to set in Hz. Defaults to None (unchanged).
+            algorithm (int, optional): Algorithm to set, 6 or 9 axis. Defaults to None (unchanged).
+
+        Returns:
+            exitCode (int): 0 if the log was completed, 1 if the IMU could not be connected or set up or writing the log
+                failed.
+        """
+        self.connection.connect()
+        if not self.connection.waitForConnection():
+            return 1
+        try:
+            if returnRate:
+                self.imu.setReturnRate(returnRate)
+            if bandwidth:
+                self.imu.setBandwidth(bandwidth)
+            if algorithm:
+                self.imu.setAlgorithm(algorithm)
+        except Exception as e:
+            print(f'Error configuring IMU: {e}')
+            self.connection.disconnect(wait=True)
+            return 1
+
+        if self.livePort is not None:
+            try:
+                self.liveServer = LiveServer(self.imu.samples, port=self.livePort)
+                self.liveServer.start()
+            except OSError as e:
+                print(f'Error starting the live stream: {e}')
+                self.connection.disconnect(wait=True)
+                return 1
+        try:
+            self.imu.startLogging(self.logPath, binary=self.logPath.suffix == LogFormat.BINARY_EXTENSION,
+                                  segmentSeconds=self.segmentSeconds, channels=self.channels)
+        except (OSError, ValueError) as e:
+            print(f'Error starting the log: {e}')
+            self.connection.disconnect(wait=True)
+            if self.liveServer:
+                self.liveServer.stop()
+            return 1
+        start = time.monotonic()
+        self.lastReport = (start, self.imu.samples.writeSeq)
+        while not self.stopEvent.is_set():
+            timeout = self.reportInterval
+            if self.duration is not None:
+                timeout = min(timeout, max(start + self.duration - time.monotonic(), 0))
+            if self.stopEvent.wait(timeout):
+                break
+            if self.duration is not None and time.monotonic() - start >= self.duration:
+                print(f'Duration of {self.duration:g}s reached, stopping.')
+                break
+            if self.imu.getLogError():
+                print('Writing the log failed, stopping.')
+                break
+            self.report()
+
+        # Acquisition is stopped first, so every sample received is still written before the log is closed.
+        self.connection.disconnect(wait=True)
+        self.imu.stopLogging()
+        self.imu.joinLogging()
+        error = self.imu.getLogError()
+        self.report()
+        if self.liveServer:
+            self.liveServer.stop()
+        if self.tracePath:
+            try:
+                events = profiler.exportTrace(self.tracePath)
+                print(f'{events} events written to {self.tracePath}.')
+            except OSError as e:
+                print(f'Error exporting the trace: {e}')
+        if error:
+            print(f'The log is incomplete: {error}')
+            return 1
+        return 0
+
+    def report(self):
+        """
+        Print the samples received and logged, the throughput since the last status line, the measured rate and
+        jitter, the samples dropped by the log writer and lost in gaps of the IMU timestamps, the connection drop-outs,
+        and the live stream clients with the samples dropped for them.
+        """
+        now = time.monotonic()
+        received = self.imu.samples.writeSeq
+        lastTime, lastReceived = self.lastReport
+        throughput = (received - lastReceived) / (now - lastTime) if now > lastTime else 0.0
+        self.lastReport = (now, received)
+        timing = self.imu.getTiming()
+        rate = f'{timing["rate"]:.1f}Hz' if timing['rate'] else 'unknown'
+        jitter = f'{timing["jitterMs"]:.2f}ms' if timing['jitterMs'] is not None else 'unknown'
+        print(f'{time.strftime("%H:%M:%S")} received {received}, logged {self.imu.getLinesLogged()}, '
+              f'{throughput:.1f} samples/s, rate {rate}, jitter {jitter}, '
+              f'dropped {self.imu.logWriter.droppedLines}, gaps {timing["gaps"]}'
+              f'{", rate mismatch" if timing["mismatch"] else ""}.')
+        connection = self.connection.summary()
+        if connection['gaps']:
+            print(f'Connection: {self.connection.describe()}, {connection["reconnects"]} reconnects, '
+                  f'{connection["downtime"]}s without data.')
+        if self.liveServer:
+            clients = self.liveServer.clientStats()
+            print(f'Live stream: {len(clients)} clients, dropped {[client["dropped"] for client in clients]}.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', type=Path, help='Path of the log, .scglog for a binary log.')
+    parser.add_argument('--port', default='COM3',
+                        help='COM port of the IMU, "auto" to search the ports for the IMU and its baud rate.')
+    parser.add_argument('--baud', type=int, default=115200, choices=c.COMMON_BAUD_RATES, help='Baud rate.')
+    parser.add_argument('--backend', default=c.BACKEND_PARSER, choices=c.IMU_BACKEND_OPTIONS, help='IMU backend.')
+    parser.add_argument('--replay', type=Path, help='Log file replayed by the replay backend.')
+    parser.add_argument('--rate', type=float, choices=[float(option[:-2]) for option in c.IMU_RATE_OPTIONS],
+                        help='Return rate to set in Hz.')
+    parser.add_argument('--bandwidth', type=int, choices=[int(option[:-2]) for option in c.IMU_BANDWIDTH_OPTIONS],
+                        help='Bandwidth to set in Hz.')
+    parser.add_argument('--algorithm', type=int, choices=[6, 9], help='Algorithm to set, 6 or 9 axis.')
+    parser.add_argument('--filter', default=c.FILTER_NONE, choices=c.FILTER_OPTIONS,
+                        help='Filter whose output is logged after the raw accelerations.')
+    parser.add_argument('--segment-seconds', type=float, help='Split the log into segments of this length.')
+    parser.add_argument('--report-interval', type=float, default=10.0, help='Seconds between status lines.')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds.')
+    parser.add_argument('--live', type=int, nargs='?', const=c.LIVE_PORT, metavar='PORT',
+                        help=f'Publish the samples to other processes, on port {c.LIVE_PORT} by default.')
+    parser.add_argument('--channels', nargs='*', choices=list(c.IMU_CHANNELS), metavar='CHANNEL',
+                        help=f'Also log these channels of the IMU, all of them if none are named: '
+                             f'{", ".join(c.IMU_CHANNELS)}.')
+    parser.add_argument('--stall-timeout', type=float, default=c.STALL_TIMEOUT,
+                        help='Seconds without data after which the IMU is reconnected.')
+    parser.add_argument('--trace', type=Path, help='Write the instrumentation events to this Chrome trace (.json).')
+    args = parser.parse_args()
+    channels = (args.channels or list(c.IMU_CHANNELS)) if args.channels is not None else []
+
+    if args.log.exists() or LogFormat.manifestPath(args.log).exists() or \
+            any(LogFormat.channelPath(args.log, channel).exists() for channel in channels):
+        print(f'{args.log} already exists.')
+        sys.exit(1)
+    args.log.parent.mkdir(parents=True, exist_ok=True)
+
+    if args.port == 'auto':
+        results = PortDiscovery.discover()
+        if not results:
+            print('No IMU found.')
+            sys.exit(1)
+        args.port, args.baud = results[0]['port'], results[0]['baudRate']
+        print(f'IMU found on {args.port} at {args.baud} baud.')
+    imu = IMU.IMU(comPort=args.port, baudRate=args.baud, backend=args.backend)
+    imu.replayPath = args.replay
+    imu.setFilter(args.filter)
+    logger = HeadlessLogger(imu, args.log, args.segment_seconds, args.report_interval, args.duration, args.live,
+                            channels, args.stall_timeout, args.trace)
+    logger.installSignalHandlers()
+    sys.exit(logger.run(args.rate, args.bandwidth, args.algorithm))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,46 @@ import witmotion as wm
 import time
 import serial.tools.list_ports
 import math
-from datetime import datetime
+import numpy as np
+
+import constants as c
+import Filters
+import LogFormat
+from BeatDetector import BeatDetector
+from Instrumentation import profiler
+from SignalStats import SignalStats
+import Simulation
+from Acquisition import ChannelStore, SampleChannel
+from LogWriter import LogWriter
+from RateMonitor import RateMonitor
+from RingBuffer import RingBuffer
+from WitmotionParser import decodeTimePayload
+from WitmotionReader import WitmotionReader
+
+# Witmotion module message type -> (channel of IMU.channels, values of the message). The values are read from the
+# message, the Witmotion object stores it only after the subscribers are called.
+MESSAGE_CHANNELS = {
+    wm.protocol.AngularVelocityMessage: ('angularVelocity', lambda msg: msg.w),
+    wm.protocol.AngleMessage: ('angle', lambda msg: (msg.roll, msg.pitch, msg.yaw)),
+    wm.protocol.MagneticMessage: ('magnetic', lambda msg: msg.mag),
+    wm.protocol.QuaternionMessage: ('quaternion', lambda msg: msg.q)
+}
+
+
+class TimeMessage(wm.protocol.TimeMessage):
+    """
+    Time message of the Witmotion module, decoded like the built-in parser does (see
+    WitmotionParser.decodeTimeFrames()). The module counts the year from 1970 and the month and day from 0, which puts
+    the IMU's dates 30 years early and fails on December and on the 31st of a month.
+    """
+
+    @classmethod
+    def parse(cls, body):
+        return cls(timestamp=decodeTimePayload(body))
+
+
+# The Witmotion module's receive thread looks the message classes up in this table.
+wm.protocol.receive_messages[TimeMessage.code] = TimeMessage
 
 
 def availableComPorts():
@@ -40,11 +79,26 @@ class IMU:
     subscribed that lets the class know when new IMU data is available. This appears to be off the main thread, which
     can cause errors during closing of the main program, but it does not seem to be anything worth worrying about.
 
-    The default values made available are acceleration, angle, and quaternion values, if other fields are
-    required then the __imuCallback() method must be updated.
+    The callback runs on the Witmotion receive thread, which owns the serial stream. It only publishes each sample to
+    self.samples, a lock-free SampleChannel. The plot (updatePlotData(), on the GUI thread) and the LogWriter thread
+    are independent consumers of that channel, each with its own Subscription and overrun counter. Every sample is
+    published with the host's time.monotonic() at arrival, the clock shared by all IMUs, which a StreamMerger uses to
+    align the streams of several IMUs. The sample timestamps are also passed to a RateMonitor on the receive thread,
+    which measures the rate the IMU actually returns and its jitter, and flags a mismatch with the requested rate.
+
+    The backend used by connect() is one of constants.IMU_BACKEND_OPTIONS. With the built-in parser a WitmotionReader
+    is used instead of the Witmotion module, it decodes whole chunks of serial data at once and publishes them with
+    __framesCallback(), so there is no Python call per message. The synthetic and replay backends (see Simulation.py)
+    publish through the same callback without any hardware.
+
+    The other messages of the IMU (angular velocity, angle, magnetic field and quaternion, see constants.IMU_CHANNELS)
+    are published to self.channels, a ChannelStore with a SampleChannel per message type, each with the timestamps and
+    at the rate of its own messages. Any one channel can be plotted in place of the accelerations (setPlotChannel())
+    and any of them logged next to the acceleration log (startLogging()). The accelerations are always consumed by the
+    beat detector and the signal statistics.
     """
 
-    def __init__(self, comPort='COM3', baudRate=115200):
+    def __init__(self, comPort='COM3', baudRate=115200, backend=c.BACKEND_WITMOTION):
         """
         Initialises an IMU object. No connection is made, only default variables
         are set.
@@ -52,29 +106,59 @@ class IMU:
         Args :
             comPort (String, optional): Comport the IMU is connected to. Defaults to 'COM3'.
             baudRate (int, optional): Operational baud rate of the IMU. Defaults to 115200.
+            backend (str, optional): One of constants.IMU_BACKEND_OPTIONS. Defaults to the Witmotion module.
         """
         self.startTime = time.time()
-        self.imu = None  # Witmotion IMU object
+        self.imu = None  # Witmotion IMU object, or the WitmotionReader/simulated source of the other backends.
+        self.backend = backend  # Backend used by connect().
+        self.replayPath = None  # Log file streamed by the replay backend.
+        self.simulationSpeed = 1.0  # Speed of the synthetic and replay backends, 0 runs as fast as possible.
         self.isConnected = False  # Has an IMU object been successfully connected (does not account for callback).
         self.comPort = comPort  # IMU object's COM port
         self.baudRate = baudRate  # IMU object's baudRate
+        self.returnRate = None  # Last return rate requested in Hz, None if not set by this program.
+        self.bandwidth = None  # Last bandwidth requested in Hz, None if not set by this program.
+        self.algorithm = None  # Last algorithm requested (6 or 9 axis), None if not set by this program.
         self.acceleration = []  # Acceleration returned by IMU
         self.angle = []  # Euler angles returned by IMU
         self.quaternion = []  # Quaternion returned by IMU
 
-        self.loggingFile = None  # Logging file.
+        self.logWriter = None  # Background writer for the current/last log file.
         self.enableLogging = False  # Logging flag.
-        self.logData = []  # Data to store to log file.
         self.loggingPath = None  # Path to logging file.
-        self.logStartTime = time.time()  # Start time of log for offset.
+        self.logStartTime = time.time()  # Start time of log.
+
+        # Samples [timestamp, ax, ay, az, hostTime] published by the callback, hostTime is time.monotonic() at arrival.
+        self.samples = SampleChannel(columns=5)
+        # Samples [timestamp, values..., hostTime] of the other channels, one SampleChannel per message type.
+        self.channels = ChannelStore({name: len(values) for name, (_, _, values) in c.IMU_CHANNELS.items()})
 
+        self.beatDetector = BeatDetector()  # Live heart rate, run on the plot samples.
+        self.stats = SignalStats()  # Rolling signal statistics of the last 5 seconds, run on the plot samples.
+        self.filterOption = c.FILTER_NONE  # One of constants.FILTER_OPTIONS, applied to the plot and log.
+        self.plotFilter = None  # Filters.FilterStage of the plot, None if not filtering.
+
+        self.rateMonitor = RateMonitor()  # Measured return rate and jitter, updated on the receive thread.
+
+        self.plotWindow = c.PLOT_SECONDS_DEFAULT  # Plotted time in seconds, None for a fixed number of points.
         self.plotSize = 1000  # Number of data points to plot.
-        self.plotData = []  # List of data for plotting.
+        # Ring buffer of [timestamp, ax, ay, az, norm, filtered ax, filtered ay, filtered az] for plotting.
+        self.plotData = RingBuffer(self.plotSize, columns=8)
+        self.plotSubscription = self.samples.subscribe()  # Plot consumer of self.samples.
+        self.plotChannel = None  # Channel of self.channels that is plotted, None for the accelerations.
+        self.channelSubscription = None  # Plot consumer of the plotted channel.
+        self.channelWriters = {}  # LogWriter of every other channel logged, by channel name.
+        # Timers of the receive thread callbacks and the plot buffer update, see Instrumentation.py.
+        self.callbackTimer = profiler.stage('imu.callback')
+        self.framesTimer = profiler.stage('imu.frames')
+        self.plotDataTimer = profiler.stage('gui.plotData')
 
     def __del__(self):
         """
         On class object delete the IMU object must be disconnected. This ensures that required connections are closed.
         """
+        if self.enableLogging:
+            self.stopLogging()
         self.disconnect()
         self.imu = None
 
@@ -84,62 +168,334 @@ class IMU:
         activated for every value sent by the IMU (Acceleration, Quaternion, Angle, ..etc) and not just for each serial
         packet.
 
-        The plotting data and logging data are also updated here.
+        Acceleration samples are published to self.samples, the other messages to their channel of self.channels with
+        the timestamp of the last time message, nothing else is done with them on this thread.
 
         Args:
             msg (String): The type of dataset that is newly available.
         """
+        start = time.perf_counter_ns()
         msg_type = type(msg)
 
         if msg_type is wm.protocol.AccelerationMessage:
-            self.acceleration = self.imu.get_acceleration()
-            if self.acceleration:
-                data = [self.imu.get_timestamp(), self.acceleration[0], self.acceleration[1], self.acceleration[2]]
+            # Subscribers are called before the Witmotion object stores the message, so read it from msg directly.
+            self.acceleration = msg.a
+            ax, ay, az = msg.a
+            timestamp = self.imu.get_timestamp()
+            if timestamp is None:
+                # Time messages are disabled on the IMU, fall back to the time of arrival.
+                timestamp = time.time()
+
+            self.rateMonitor.update(timestamp)
+            self.samples.publish((timestamp, ax, ay, az, time.monotonic()))
+        elif msg_type in MESSAGE_CHANNELS:
+            name, getValues = MESSAGE_CHANNELS[msg_type]
+            values = getValues(msg)
+            timestamp = self.imu.get_timestamp()
+            self.channels.publish(name, time.time() if timestamp is None else timestamp, values, time.monotonic())
+            if name == 'quaternion':
+                self.quaternion = values
+            elif name == 'angle':
+                self.angle = values
+        self.callbackTimer.record(start)
+
+    def __framesCallback(self, channels):
+        """
+        Callback of the built-in WitmotionReader and the simulated sources, called on their thread with every decoded
+        chunk of data. The acceleration block is published to self.samples and the blocks of the other channels to
+        self.channels, each in one go, all rows of a chunk share its arrival time.
+
+        Args:
+            channels (dict[str, np.ndarray]): Decoded channels, see WitmotionParser.feed().
+        """
+        start = time.perf_counter_ns()
+        hostTime = time.monotonic()
+        acceleration = channels.get('acceleration')
+        if acceleration is not None:
+            self.rateMonitor.update(acceleration[:, 0])
+            self.samples.publishBlock(np.column_stack((acceleration, np.full(len(acceleration), hostTime))))
+            self.acceleration = tuple(acceleration[-1, 1:])
+        self.channels.publishBlocks(channels, hostTime)
+        if 'quaternion' in channels:
+            self.quaternion = tuple(channels['quaternion'][-1, 1:])
+        if 'angle' in channels:
+            self.angle = tuple(channels['angle'][-1, 1:])
+        self.framesTimer.record(start)
+
+    def updatePlotData(self) -> int:
+        """
+        Move newly published samples into the plot buffer, adding the acceleration norm and the filtered accelerations
+        (NaN if not filtering). Only the new samples are filtered, the filter state carries over between calls. The
+        new samples are also passed to the beat detector for the live heart rate and to the rolling signal statistics.
+        If another channel is plotted its new samples are moved into the plot buffer instead, with the norm of three
+        values (the fourth value of the quaternion) and no filtered values. Called from the GUI thread.
+
+        Returns:
+            count (int): Number of new acceleration samples.
+        """
+        start = time.perf_counter_ns()
+        rows = self.plotSubscription.read()
+        if len(rows):
+            self.beatDetector.process(rows)
+            self.stats.update(rows)
+        if self.channelSubscription is not None:
+            channelRows = self.channelSubscription.read()
+            if len(channelRows):
+                values = channelRows[:, 1:-1]
+                if values.shape[1] == 3:
+                    values = np.column_stack((values, np.sqrt(np.einsum('ij,ij->i', values, values))))
+                self.plotData.extend(np.column_stack((channelRows[:, 0], values,
+                                                      np.full((len(channelRows), 3), np.nan))))
+        elif len(rows):
+            plotRows = rows
+            if self.plotFilter:
+                plotRows = self.plotFilter.process(plotRows)
+            else:
+                plotRows = np.column_stack((plotRows[:, :4], np.full((len(plotRows), 3), np.nan)))
+            norm = np.sqrt(np.einsum('ij,ij->i', plotRows[:, 1:4], plotRows[:, 1:4]))
+            self.plotData.extend(np.column_stack((plotRows[:, :4], norm, plotRows[:, 4:7])))
+        if len(rows) and self.plotWindow:
+            self.__sizePlotWindow()
+        self.plotDataTimer.record(start)
+        return len(rows)
+
+    def setPlotChannel(self, name):
+        """
+        Plot another channel of the IMU in place of the accelerations, or the accelerations again. The plot data is
+        cleared, the channel is plotted from its next samples. The plot buffer is sized from the acceleration rate,
+        the IMU returns every enabled message at the return rate.
+
+        Args:
+            name (str): Channel of constants.IMU_CHANNELS, None for the accelerations.
+        """
+        self.plotChannel = name
+        self.channelSubscription = self.channels[name].subscribe() if name else None
+        self.plotData.clear()
+
+    def getPlotLabels(self) -> tuple:
+        """
+        Returns:
+            quantity (str): Name of the plotted quantity.
+            unit (str): Unit of its values.
+            labels (list[str]): Legend labels of the traces, see Plotter.TRACES.
+        """
+        if not self.plotChannel:
+            return None, None, None
+        quantity, unit, names = c.IMU_CHANNELS[self.plotChannel]
+        labels = [f'{quantity} {name}' for name in names] + ([f'{quantity} Norm'] if len(names) == 3 else [])
+        return quantity, unit, labels
 
-                if self.enableLogging:
-                    self.logData.append(data)
+    def getHeartRate(self):
+        """
+        Returns:
+            bpm (float): Current heart rate in beats per minute, None if no heartbeat is detected.
+        """
+        return self.beatDetector.bpm
+
+    def getSignalStats(self) -> dict:
+        """
+        Returns:
+            stats (dict): Rolling signal statistics of the last seconds, see SignalStats.summary().
+        """
+        return self.stats.summary()
+
+    def getTiming(self) -> dict:
+        """
+        Returns:
+            timing (dict): Measured return rate and jitter, see RateMonitor.summary().
+        """
+        return self.rateMonitor.summary()
 
-                self.plotData.append(
-                    [data[0], data[1], data[2], data[3], math.sqrt(data[1] ** 2 + data[2] ** 2 + data[3] ** 2)])
+    def setFilter(self, option):
+        """
+        Set the filter applied to the plot and to logs started from now on. The plot data is cleared, as the filtered
+        (and possibly decimated) samples do not continue the old ones.
 
-                if len(self.plotData) > self.plotSize:
-                    del self.plotData[:len(self.plotData) - self.plotSize]
-        elif msg_type is wm.protocol.QuaternionMessage:
-            self.quaternion = self.imu.get_quaternion()
-        elif msg_type is wm.protocol.AngleMessage:
-            self.angle = self.imu.get_angle
+        Args:
+            option (str): One of constants.FILTER_OPTIONS.
+        """
+        print(f'Setting filter: {option}')
+        self.filterOption = option
+        self.plotFilter = Filters.createFilterStage(option, rate=self.returnRate)
+        self.plotData.clear()
+        if self.plotWindow:
+            self.__sizePlotWindow(tolerance=0)
 
     def resetPlotData(self):
         """
         Clear plot data.
         """
-        self.plotData = []
+        self.plotData.clear()
+
+    def setPlotSize(self, plotSize):
+        """
+        Set a fixed number of data points to plot, instead of a plot window in seconds. The plot buffer is resized,
+        keeping the most recent points.
+
+        Args:
+            plotSize (int): Number of data points to plot.
+        """
+        self.plotWindow = None
+        self.__resizePlot(plotSize)
+
+    def setPlotWindow(self, seconds):
+        """
+        Set the plotted time in seconds. The plot buffer is sized from the measured return rate (the requested rate
+        until it is measured), and resized as the measured rate changes.
+
+        Args:
+            seconds (float): Plotted time in seconds.
+        """
+        self.plotWindow = seconds
+        self.__sizePlotWindow(tolerance=0)
 
-    def startLogging(self, filePath):
+    def __sizePlotWindow(self, tolerance=0.05):
         """
-        Enable logging. Empty log list first.
+        Resize the plot buffer to the plot window if the rate of the plotted samples changed by more than the
+        tolerance, e.g. after a return rate change or with a decimating filter.
+
+        Args:
+            tolerance (float, optional): Relative change of the buffer size that is ignored. Defaults to 0.05.
+        """
+        rate = self.rateMonitor.rate or self.returnRate or 200
+        if self.plotFilter and not self.plotChannel:
+            rate /= self.plotFilter.decimation
+        plotSize = min(max(int(round(self.plotWindow * rate)), 10), c.PLOT_POINTS_MAX)
+        if abs(plotSize - self.plotSize) > tolerance * self.plotSize:
+            self.__resizePlot(plotSize)
+
+    def __resizePlot(self, plotSize):
+        """
+        Resize the plot buffer, keeping the most recent points.
+
+        Args:
+            plotSize (int): Number of data points to plot.
+        """
+        self.plotSize = int(plotSize)
+        self.plotData.resize(self.plotSize)
+
+    def getLogHeader(self) -> dict:
+        """
+        Return the IMU settings stored in the header of binary logs.
+
+        Returns:
+            header (dict): Connection and configuration of the IMU.
+        """
+        return {
+            'comPort': self.comPort,
+            'baudRate': self.baudRate,
+            'backend': self.backend,
+            'returnRate': self.returnRate,
+            'bandwidth': self.bandwidth,
+            'algorithm': self.algorithm,
+            'filter': self.filterOption,
+            'timing': self.rateMonitor.summary()
+        }
+
+    def startLogging(self, filePath, binary=False, segmentSeconds=None, channels=None):
+        """
+        Enable logging. A new LogWriter is started that writes samples to file as they arrive. If a filter is set the
+        filtered accelerations are logged after the raw ones: date,hostNs,deviceNs,Ax,Ay,Az,fAx,fAy,fAz. The IMU clock
+        is synchronised with the host clock from the arrival times of the samples (see ClockSync.py). The detected
+        heartbeats are written to a beats file next to the log. Each of the other channels given is logged by its own
+        LogWriter to a log of the same format next to it (see LogFormat.channelPath()), with its own timestamps. A
+        channel log is only created once the channel's first message arrives, the IMU or backend may not send it.
+
+        Args:
+            filePath (Path): Path to the log file.
+            binary (bool, optional): Use the binary log format, the IMU settings are stored in its header. Defaults
+                to False.
+            segmentSeconds (float, optional): Split the log into segments of this length (also closed at
+                constants.LOG_SEGMENT_BYTES). Defaults to None (a single file).
+            channels (list[str], optional): Channels of constants.IMU_CHANNELS that are also logged. Defaults to None.
+
+        Raises:
+            OSError: If a log can not be created.
+            ValueError: If a binary log header is too large.
         """
         self.loggingPath = filePath
         print(f'Starting logging: {self.loggingPath}')
-        self.logData = []
-        self.enableLogging = True
         self.logStartTime = time.time()
+        self.logWriter = LogWriter(self.samples.subscribe(), self.loggingPath, self.logStartTime, binary=binary,
+                                   header=self.getLogHeader(), columns=4, hostColumn=4,
+                                   filterStage=Filters.createFilterStage(self.filterOption, rate=self.returnRate),
+                                   beatDetector=BeatDetector(rate=self.returnRate), segmentSeconds=segmentSeconds,
+                                   segmentBytes=c.LOG_SEGMENT_BYTES if segmentSeconds else None)
+        self.channelWriters = {}
+        for name in channels or []:
+            channel = self.channels[name]
+            columns = channel.columns - 1
+            self.channelWriters[name] = LogWriter(channel.subscribe(), LogFormat.channelPath(filePath, name),
+                                                  self.logStartTime, binary=binary,
+                                                  header=dict(self.getLogHeader(), channel=name), columns=columns,
+                                                  hostColumn=columns, segmentSeconds=segmentSeconds,
+                                                  segmentBytes=c.LOG_SEGMENT_BYTES if segmentSeconds else None,
+                                                  openOnData=True)
+        started = []
+        try:
+            for writer in [self.logWriter] + list(self.channelWriters.values()):
+                writer.start()
+                started.append(writer)
+        except (OSError, ValueError):
+            # Logs already started are completed, so nothing is left half written.
+            for writer in started:
+                writer.stop()
+            raise
+        self.enableLogging = True
 
     def stopLogging(self):
         """
-        Disable logging. First set logging flag to False, then close logging file.
+        Disable logging. First set logging flag to False, then signal the LogWriter to finish. The remaining lines are
+        written in the background, so this returns immediately.
+
+        Returns:
+            error (Exception): Error that stopped a log writer early, None if the log was written without errors.
         """
-        print(f'Stopping logging. Writing {len(self.logData)} lines to file...')
         self.enableLogging = False
-        with open(self.loggingPath, 'w') as file:
-            timeOffset = self.logData[0][0]
-            for row in self.logData:
-                convertedTime = (row[0] - timeOffset) + self.logStartTime
-                dt = datetime.fromtimestamp(convertedTime)
-                date = dt.strftime('%d %m %Y %H:%M:%S')
-                date += '.' + str(int((convertedTime * 1000) % 1000))
-                file.write(f'{date},{row[1]},{row[2]},{row[3]}\n')
-        print('Log file completed.')
+        print('Stopping logging.')
+        error = self.getLogError()
+        if error:
+            print(f'The log was incomplete, writing stopped after an error: {error}')
+        self.logWriter.stop()
+        for writer in self.channelWriters.values():
+            writer.stop()
+        return error
+
+    def getLogError(self) -> Exception:
+        """
+        Returns:
+            error (Exception): Error that stopped a log writer of the current (or last) log, None if there was none.
+        """
+        writers = [self.logWriter] + list(self.channelWriters.values()) if self.logWriter else []
+        return next((writer.error for writer in writers if writer.error), None)
+
+    def joinLogging(self):
+        """
+        Wait until the LogWriters of the last log have completed their files.
+        """
+        self.logWriter.join()
+        for writer in self.channelWriters.values():
+            writer.join()
+
+    def getLinesLogged(self) -> int:
+        """
+        Return the number of lines logged in the current (or last) log.
+
+        Returns:
+            linesLogged (int): Number of lines written by the log writer.
+        """
+        return self.logWriter.linesWritten if self.logWriter else 0
+
+    def getDroppedSamples(self) -> int:
+        """
+        Return the number of samples lost by the plot and the current (or last) log, including the logs of the other
+        channels, because a consumer fell too far behind the acquisition thread.
+
+        Returns:
+            dropped (int): Number of overrun samples.
+        """
+        return self.plotSubscription.dropped + (self.logWriter.droppedLines if self.logWriter else 0) + \
+            sum(writer.droppedLines for writer in self.channelWriters.values())
 
     def getNorm(self) -> float:
         """
@@ -154,31 +510,60 @@ class IMU:
             norm = math.sqrt(acc[0] ** 2 + acc[1] ** 2 + acc[2] ** 2)
         return norm
 
-    def connect(self) -> bool:
+    def connect(self, reset=True) -> bool:
         """
         Attempt to connect to the IMU. If the COM port and baud rate were not explicitly set, the default values will
         be used. The callbackCounter and startTime are reset on a successful connection. self.isConnected is set to
         True if a successful IMU object is created, and does not account for the state of the callback subscription.
         If subscription fails the self.isConnected state can still be True but the successFlag will be False.
 
+        Args:
+            reset (bool, optional): Clear the plot data, heart rate, statistics and rate estimate. A reconnection after
+                a lost connection (see ConnectionManager.py) keeps them, the gap is marked with markGap(). Defaults to
+                True.
+
         Returns:
             successFlag (bool): True if the IMU connects, else False.
         """
         successFlag = False
         try:
             print(
-                f'Attempting to connect to {self.comPort} at {self.baudRate}...')
-            self.imu = wm.IMU(path=self.comPort, baudrate=self.baudRate)
-            self.isConnected = True
-
-            print('IMU serial connection created. Subscribing callback...')
-            self.imu.subscribe(self.__imuCallback)
-
-            print(f'Callback subscribed. IMU connected on {self.comPort}!')
+                f'Attempting to connect to {self.comPort} at {self.baudRate} ({self.backend})...')
+            if reset:
+                self.plotData.clear()
+                self.plotSubscription = self.samples.subscribe()
+                if self.plotChannel:
+                    self.channelSubscription = self.channels[self.plotChannel].subscribe()
+                self.beatDetector = BeatDetector(rate=self.returnRate)
+                self.stats.clear()
+                self.rateMonitor = RateMonitor()
+                if self.returnRate:
+                    self.rateMonitor.expectRate(self.returnRate)
+
+            if self.backend == c.BACKEND_PARSER:
+                self.imu = WitmotionReader(self.comPort, self.baudRate, self.__framesCallback)
+                self.isConnected = True
+                print(f'IMU serial connection created with the built-in parser. IMU connected on {self.comPort}!')
+            elif self.backend == c.BACKEND_SYNTHETIC:
+                self.imu = Simulation.SyntheticSource(self.__framesCallback, rate=self.returnRate or 200,
+                                                      speed=self.simulationSpeed)
+                self.isConnected = True
+                print('Synthetic IMU connected!')
+            elif self.backend == c.BACKEND_REPLAY:
+                self.imu = Simulation.ReplaySource(self.__framesCallback, self.replayPath, speed=self.simulationSpeed,
+                                                   loop=True)
+                self.isConnected = True
+                print(f'Replaying {self.replayPath}!')
+            else:
+                self.imu = wm.IMU(path=self.comPort, baudrate=self.baudRate)
+                self.isConnected = True
+
+                print('IMU serial connection created. Subscribing callback...')
+                self.imu.subscribe(self.__imuCallback)
+
+                print(f'Callback subscribed. IMU connected on {self.comPort}!')
             self.startTime = time.time()
 
-            self.logData = []
-            self.plotData = []
             successFlag = True
         except Exception as e:
             print(f'Error initialising IMU class object: {e}')
@@ -189,34 +574,71 @@ class IMU:
     def disconnect(self):
         """
         Disconnect from IMU. This closes the IMU and the serial connection. For some reason closing the IMU does not
-        close the serial connection, this is a problem with the Witmotion module.
+        close the serial connection, this is a problem with the Witmotion module. If closing fails (e.g. the port has
+        already gone) the IMU is still taken to be disconnected.
         """
         try:
             if self.imu:
                 print(f'Attempting to disconnect from IMU ({self.comPort})...')
                 self.imu.close()
-                self.imu.ser.close()
+                if self.imu.ser:
+                    self.imu.ser.close()
                 print('Disconnected from IMU!')
-                self.isConnected = False
         except Exception as e:
             print(f'Error disconnecting from IMU: {e}')
+        finally:
+            if self.imu:
+                self.isConnected = False
+
+    def markGap(self):
+        """
+        Publish a row of NaN values after the last sample of self.samples and of every other channel, marking a gap in
+        the data, e.g. while the connection was lost. The plot breaks its traces at the row and the logs record it as a
+        line of NaN values. The row is timed one sample interval after the last sample, with the current host time as
+        its arrival, so a ClockSync never takes it for a sample that was delayed the least.
+
+        Must only be called while the IMU is disconnected, the acquisition thread is the producer of the channels
+        otherwise.
+        """
+        interval = self.rateMonitor.meanInterval or 1 / (self.returnRate or 200)
+        hostTime = time.monotonic()
+        for channel in [self.samples] + list(self.channels.channels.values()):
+            if channel.writeSeq:
+                row = np.full(channel.columns, np.nan)
+                row[0] = channel.data[(channel.writeSeq - 1) % channel.capacity, 0] + interval
+                row[-1] = hostTime
+                channel.publish(row)
 
     def setReturnRate(self, rate):
         """
-        Set the return rate of the IMU in Hz. Not all IMUs have the same return rate capabilities and at the moment
-        there is no way to test if the command was received correctly by the IMU. The return rate just needs to be
-        monitored.
+        Set the return rate of the IMU in Hz. Not all IMUs have the same return rate capabilities and the IMU does
+        not confirm the command, so the rate monitor is told to expect the new rate and reports a mismatch if the
+        measured rate does not follow.
 
         Args:
             rate (float): Requested return rate. One of the values in the constants.py file.
         """
         print(f'Setting return rate of IMU: {rate}Hz')
-        self.imu.set_update_rate(rate)
+        sel = {
+            0.2: wm.protocol.ReturnRateSelect.rate_0_2hz,
+            0.5: wm.protocol.ReturnRateSelect.rate_0_5hz,
+            1: wm.protocol.ReturnRateSelect.rate_1hz,
+            2: wm.protocol.ReturnRateSelect.rate_2hz,
+            5: wm.protocol.ReturnRateSelect.rate_5hz,
+            10: wm.protocol.ReturnRateSelect.rate_10hz,
+            20: wm.protocol.ReturnRateSelect.rate_20hz,
+            50: wm.protocol.ReturnRateSelect.rate_50hz,
+            100: wm.protocol.ReturnRateSelect.rate_100hz,
+            200: wm.protocol.ReturnRateSelect.rate_200hz}[rate]
+        self.imu.send_config_command(wm.protocol.ConfigCommand(register=wm.protocol.Register.rate, data=sel.value))
+        self.returnRate = rate
+        self.rateMonitor.expectRate(rate)
 
     def setBandwidth(self, bandwidth):
         """
         Set the bandwidth of the IMU in Hz. If a high return rate of 200Hz is required, the bandwidth must be set
-        to a higher rate (256Hz), if it is not increased the IMU will return repeat values.
+        to a higher rate (256Hz), if it is not increased the IMU will return repeat values (see the duplicates of the
+        signal statistics). The return rate is measured again afterwards.
 
         The Witmotion library does not have the capability to change the bandwidth, so it is mostly done here
         using lower level functions.
@@ -227,13 +649,18 @@ class IMU:
         print(f'Setting bandwidth of IMU: {bandwidth}Hz')
         sel = {
             256: BandwidthSelect.bandwidth_256_Hz,
-            184: BandwidthSelect.bandwidth_188_Hz,
-            94: BandwidthSelect.bandwidth_98_Hz,
+            188: BandwidthSelect.bandwidth_188_Hz,
+            98: BandwidthSelect.bandwidth_98_Hz,
             42: BandwidthSelect.bandwidth_42_Hz,
-            21: BandwidthSelect.bandwidth_20_Hz,
+            20: BandwidthSelect.bandwidth_20_Hz,
             10: BandwidthSelect.bandwidth_10_Hz,
             5: BandwidthSelect.bandwidth_5_Hz}[bandwidth]
         self.imu.send_config_command(wm.protocol.ConfigCommand(register=RegisterExtra.bandwidth, data=sel.value))
+        self.bandwidth = bandwidth
+        if self.returnRate:
+            self.rateMonitor.expectRate(self.returnRate)
+        else:
+            self.rateMonitor.reset()
 
     def setAlgorithm(self, algorithmType):
         """
@@ -245,7 +672,9 @@ class IMU:
             algorithmType (int): Either 6 or 9.
         """
         print(f'Setting the algorithm of the IMU: {algorithmType}-axis.')
-        self.imu.set_algorithm_dof(algorithmType)
+        self.imu.send_config_command(
+            wm.protocol.ConfigCommand(register=wm.protocol.Register.alg, data=0x00 if algorithmType == 9 else 0x01))
+        self.algorithm = algorithmType
 
     def calibrateAcceleration(self):
         """
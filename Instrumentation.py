@@ -0,0 +1,279 @@
+"""
+Built-in instrumentation of the hot paths: timers of the processing stages (serial callbacks, plot buffer updates,
+drawing, the GUI event loop) and counters (log bytes, queue depths, dropped samples), each kept in a preallocated ring
+buffer so recording costs about a microsecond. The GUI shows a summary in its performance overlay, and both the GUI
+and Headless.py can export the recorded events as a Chrome trace, which chrome://tracing, Perfetto (ui.perfetto.dev)
+and speedscope open:
+
+    python Headless.py "logging/test.txt" --backend "Synthetic signal" --duration 10 --trace "logging/test.trace.json"
+
+Every module records to the shared Instrumentation.profiler.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import constants as c
+
+
+class StageTimer:
+    """
+    Ring buffer of the start times, durations and threads of the runs of one processing stage. A stage can be recorded
+    from several threads (e.g. the callbacks of several IMUs), each record takes a short lock. The ring is made of
+    preallocated lists, which take a Python int faster than a NumPy array, and is converted to arrays when read.
+    """
+
+    def __init__(self, name, capacity=c.PROFILER_CAPACITY):
+        """
+        Args:
+            name (str): Name of the stage, the part before the first '.' is its category in the trace.
+            capacity (int, optional): Number of runs kept. Defaults to constants.PROFILER_CAPACITY.
+        """
+        self.name = name
+        self.capacity = capacity
+        self.starts = [0] * capacity  # time.perf_counter_ns() at the start of each run.
+        self.durations = [0] * capacity  # Duration of each run in nanoseconds.
+        self.threads = [0] * capacity  # threading.get_ident() of the thread of each run.
+        self.threadNames = {}  # Name of every thread that recorded a run, by ident, the thread may have ended since.
+        self.count = 0  # Runs recorded in total, the write position is count % capacity.
+        self.lock = threading.Lock()
+
+    def record(self, startNs, endNs=None):
+        """
+        Record a run of the stage on the calling thread. For hot paths, where a context manager costs too much:
+
+            start = time.perf_counter_ns()
+            ...
+            timer.record(start)
+
+        Args:
+            startNs (int): time.perf_counter_ns() at the start of the run.
+            endNs (int, optional): time.perf_counter_ns() at the end of the run. Defaults to None (now).
+        """
+        if endNs is None:
+            endNs = time.perf_counter_ns()
+        thread = threading.get_ident()
+        with self.lock:
+            if thread not in self.threadNames:
+                self.threadNames[thread] = threading.current_thread().name
+            index = self.count % self.capacity
+            self.starts[index] = startNs
+            self.durations[index] = endNs - startNs
+            self.threads[index] = thread
+            self.count += 1
+
+    @contextmanager
+    def measure(self):
+        """
+        Record the run of the enclosed block:
+
+            with timer.measure():
+                ...
+        """
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(start)
+
+    def snapshot(self) -> tuple:
+        """
+        Returns:
+            starts, durations, threads (np.ndarray): Copies of the runs kept, oldest first.
+        """
+        with self.lock:
+            count = self.count
+            index = count % self.capacity if count > self.capacity else 0
+            rings = [(values[index:count] + values[:index]) for values in (self.starts, self.durations, self.threads)]
+        starts, durations, threads = rings
+        return np.array(starts, dtype=np.int64), np.array(durations, dtype=np.int64), np.array(threads, dtype=np.uint64)
+
+
+class Counter:
+    """
+    Ring buffer of the values of a counter, e.g. the bytes logged (increased with add()) or a queue depth (set with
+    set()), with the time of every change.
+    """
+
+    def __init__(self, name, capacity=c.PROFILER_CAPACITY):
+        """
+        Args:
+            name (str): Name of the counter.
+            capacity (int, optional): Number of changes kept. Defaults to constants.PROFILER_CAPACITY.
+        """
+        self.name = name
+        self.capacity = capacity
+        self.times = [0] * capacity  # time.perf_counter_ns() of each change.
+        self.values = [0.0] * capacity  # Value after each change.
+        self.value = 0.0  # Current value.
+        self.count = 0  # Changes recorded in total.
+        self.lock = threading.Lock()
+
+    def add(self, amount=1):
+        """
+        Increase the counter.
+
+        Args:
+            amount (float, optional): Amount to add. Defaults to 1.
+        """
+        with self.lock:
+            self.__store(self.value + amount)
+
+    def set(self, value):
+        """
+        Set the counter, e.g. to the current depth of a queue.
+
+        Args:
+            value (float): New value.
+        """
+        with self.lock:
+            self.__store(value)
+
+    def __store(self, value):
+        """
+        Store a new value, the lock must be held.
+        """
+        index = self.count % self.capacity
+        self.value = value
+        self.times[index] = time.perf_counter_ns()
+        self.values[index] = value
+        self.count += 1
+
+    def snapshot(self) -> tuple:
+        """
+        Returns:
+            times, values (np.ndarray): Copies of the changes kept, oldest first.
+        """
+        with self.lock:
+            count = self.count
+            index = count % self.capacity if count > self.capacity else 0
+            times = self.times[index:count] + self.times[:index]
+            values = self.values[index:count] + self.values[:index]
+        return np.array(times, dtype=np.int64), np.array(values, dtype=np.float64)
+
+
+class Profiler:
+    """
+    Registry of the stage timers and counters. Timers and counters are created on first use and kept, so modules fetch
+    them once, e.g. in __init__(), and record to them directly.
+    """
+
+    def __init__(self, capacity=c.PROFILER_CAPACITY):
+        """
+        Args:
+            capacity (int, optional): Number of events kept per timer and counter. Defaults to
+                constants.PROFILER_CAPACITY.
+        """
+        self.capacity = capacity
+        self.originNs = time.perf_counter_ns()  # Time zero of the exported trace.
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()  # Guards the creation of timers and counters.
+
+    def stage(self, name) -> StageTimer:
+        """
+        Returns:
+            timer (StageTimer): Timer of the named stage, created if it does not exist.
+        """
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = StageTimer(name, self.capacity)
+            return self.stages[name]
+
+    def counter(self, name) -> Counter:
+        """
+        Returns:
+            counter (Counter): The named counter, created if it does not exist.
+        """
+        with self.lock:
+            if name not in self.counters:
+                self.counters[name] = Counter(name, self.capacity)
+            return self.counters[name]
+
+    def summary(self, window=c.PROFILER_WINDOW) -> dict:
+        """
+        Summarise the events of the last window.
+
+        Args:
+            window (float, optional): Length of the window in seconds. Defaults to constants.PROFILER_WINDOW.
+
+        Returns:
+            summary (dict): 'stages' with the runs per second, mean, 95th percentile and maximum duration in
+                milliseconds and the load (fraction of the window spent in the stage) of every stage that ran in the
+                window, and 'counters' with the value and its change per second of every counter.
+        """
+        startNs = time.perf_counter_ns() - int(window * 1e9)
+        stages = {}
+        for name, timer in list(self.stages.items()):
+            starts, durations, _ = timer.snapshot()
+            durations = durations[starts >= startNs] / 1e6
+            if len(durations):
+                stages[name] = {'rate': round(len(durations) / window, 1),
+                                'meanMs': round(float(durations.mean()), 3),
+                                'p95Ms': round(float(np.percentile(durations, 95)), 3),
+                                'maxMs': round(float(durations.max()), 3),
+                                'load': round(float(durations.sum()) / (window * 1e3), 3)}
+        counters = {}
+        for name, counter in list(self.counters.items()):
+            times, values = counter.snapshot()
+            # The change since the last value before the window, or the first value in it.
+            before = np.flatnonzero(times < startNs)
+            first = values[before[-1]] if len(before) else (values[0] if len(values) else 0.0)
+            counters[name] = {'value': counter.value, 'rate': round(float(counter.value - first) / window, 1)}
+        return {'stages': stages, 'counters': counters}
+
+    def describe(self, window=c.PROFILER_WINDOW) -> str:
+        """
+        Returns:
+            description (str): One line per stage and one line with the counters, for the performance overlay.
+        """
+        summary = self.summary(window)
+        lines = [f'{name:<18} {stage["rate"]:7.1f}/s  mean {stage["meanMs"]:7.2f}ms  p95 {stage["p95Ms"]:7.2f}ms  '
+                 f'max {stage["maxMs"]:7.2f}ms  load {100 * stage["load"]:5.1f}%'
+                 for name, stage in sorted(summary['stages'].items())]
+        counters = [f'{name} {counter["value"]:g} ({counter["rate"]:+g}/s)'
+                    for name, counter in sorted(summary['counters'].items())]
+        return '\n'.join(lines + ([', '.join(counters)] if counters else [])) or 'No events recorded.'
+
+    def exportTrace(self, filePath) -> int:
+        """
+        Write the events kept as a Chrome trace (Trace Event Format, JSON): every stage run as a complete event on its
+        thread and every counter change as a counter event.
+
+        Args:
+            filePath (Path): Path of the trace file, conventionally ending in .json.
+
+        Returns:
+            events (int): Number of events written.
+        """
+        pid = os.getpid()
+        threadNames = {}
+        events = []
+        tids = set()
+        for name, timer in list(self.stages.items()):
+            starts, durations, threads = timer.snapshot()
+            category = name.split('.')[0]
+            for start, duration, tid in zip(((starts - self.originNs) / 1e3).tolist(), (durations / 1e3).tolist(),
+                                            threads.tolist()):
+                events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': duration, 'pid': pid,
+                               'tid': tid})
+            tids.update(threads.tolist())
+            threadNames.update(timer.threadNames)
+        for name, counter in list(self.counters.items()):
+            times, values = counter.snapshot()
+            for t, value in zip(((times - self.originNs) / 1e3).tolist(), values.tolist()):
+                events.append({'name': name, 'ph': 'C', 'ts': t, 'pid': pid, 'args': {'value': value}})
+        events.sort(key=lambda event: event['ts'])
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                     'args': {'name': threadNames.get(tid, f'Thread {tid}')}} for tid in sorted(tids)]
+        with open(filePath, 'w') as file:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, file)
+        return len(events)
+
+
+# Profiler shared by every module.
+profiler = Profiler()
@@ -32,10 +32,30 @@ class Layout:
         ]
 
         logLineColumn = [
-            [sg.Text(text='Lines to Log', font=st.FONT_DESCR)],
+            [sg.Text(text='Lines Logged', font=st.FONT_DESCR)],
             [sg.Text(k='-TXT-LINES-LOGGED-', text='0', font=st.FONT_DESCR, size=(12, 1), justification='center')]
         ]
 
+        droppedColumn = [
+            [sg.Text(text='Dropped Samples', font=st.FONT_DESCR)],
+            [sg.Text(k='-TXT-DROPPED-', text='0', font=st.FONT_DESCR, size=(12, 1), justification='center')]
+        ]
+
+        # Rolling signal statistics of the last seconds (title, key, width).
+        signalColumns = [
+            sg.Column([[sg.Text(text=title, font=st.FONT_DESCR)],
+                       [sg.Text(k=key, text='--', font=st.FONT_DESCR, size=(width, 1), justification='center')]],
+                      element_justification='center', pad=(0, 0))
+            for title, key, width in (('Sample Rate', '-TXT-STAT-RATE-', 12),
+                                      ('Jitter', '-TXT-STAT-JITTER-', 10),
+                                      ('Mean X/Y/Z', '-TXT-STAT-MEAN-', 20),
+                                      ('RMS X/Y/Z', '-TXT-STAT-RMS-', 20),
+                                      ('Min / Max', '-TXT-STAT-RANGE-', 16),
+                                      ('Duplicates', '-TXT-STAT-DUPLICATES-', 12),
+                                      ('Signal Quality', '-TXT-STAT-QUALITY-', 22),
+                                      ('Connection', '-TXT-STAT-CONNECTION-', 22))
+        ]
+
         layout = [
             [sg.Col(element_justification='left', layout=[
                 [sg.Menu(k='-MENU-', menu_definition=self.menu.getMenu())],
@@ -44,30 +64,61 @@ class Layout:
                         layout=[
                             [sg.Button(k='-BTN-PLOT-REFRESH-', button_text='Reset Plot', font=st.FONT_BTN,
                                        border_width=3)],
-                            [sg.Slider(k='-SLD-PLOT-POINTS-', default_value=1000, range=(10, 10000), orientation='v',
-                                       size=(19, 15), enable_events=True, disable_number_display=True)],
-                            [sg.Text(k='-TXT-PLOT-POINTS-', text='Points: 1000', size=(11, 1), font=st.FONT_DESCR)]
+                            [sg.Slider(k='-SLD-PLOT-SECONDS-', default_value=c.PLOT_SECONDS_DEFAULT,
+                                       range=(1, c.PLOT_SECONDS_MAX), orientation='v', size=(19, 15),
+                                       enable_events=True, disable_number_display=True)],
+                            [sg.Text(k='-TXT-PLOT-SECONDS-', text=f'Window: {c.PLOT_SECONDS_DEFAULT}s', size=(11, 1),
+                                     font=st.FONT_DESCR)],
+                            [sg.Text(k='-TXT-PLOT-POINTS-', text='Points: 1000', size=(11, 1), font=st.FONT_DESCR)],
+                            [sg.Text(text='Heart Rate', font=st.FONT_DESCR, pad=((0, 0), (20, 0)))],
+                            [sg.Text(k='-TXT-BPM-', text='-- BPM', size=(11, 1), font=st.FONT_DESCR,
+                                     justification='center')]
                         ])],
                 [sg.Col(element_justification='c', expand_x=True, layout=[
-                    [sg.Checkbox(k='-BOX-ACC-X-', text='X-Acceleration', default=True, font=st.FONT_DESCR,
-                                 pad=(10, 0)),
+                    [sg.Text(text='Channel:', font=st.FONT_DESCR),
+                     sg.Combo(k='-COMBO-PLOT-CHANNEL-', values=list(c.PLOT_CHANNEL_OPTIONS),
+                              default_value=c.PLOT_CHANNEL_ACCELERATION, readonly=True, enable_events=True,
+                              font=st.FONT_DESCR, size=(16, 1)),
+                     sg.Checkbox(k='-BOX-ACC-X-', text='X-Acceleration', default=True, font=st.FONT_DESCR,
+                                 pad=(10, 0), enable_events=True),
                      sg.Checkbox(k='-BOX-ACC-Y-', text='Y-Acceleration', default=True, font=st.FONT_DESCR,
-                                 pad=(10, 0)),
+                                 pad=(10, 0), enable_events=True),
                      sg.Checkbox(k='-BOX-ACC-Z-', text='Z-Acceleration', default=True, font=st.FONT_DESCR,
-                                 pad=(10, 0)),
+                                 pad=(10, 0), enable_events=True),
                      sg.Checkbox(k='-BOX-ACC-NORM-', text='Acceleration Norm', default=True, font=st.FONT_DESCR,
-                                 pad=(10, 0))]
+                                 pad=(10, 0), enable_events=True)],
+                    [sg.Text(text='Filter:', font=st.FONT_DESCR),
+                     sg.Combo(k='-COMBO-FILTER-', values=c.FILTER_OPTIONS, default_value=c.FILTER_NONE, readonly=True,
+                              enable_events=True, font=st.FONT_DESCR, size=(32, 1)),
+                     sg.Checkbox(k='-BOX-FILT-X-', text='Filtered X', default=True, font=st.FONT_DESCR, pad=(10, 0),
+                                 enable_events=True),
+                     sg.Checkbox(k='-BOX-FILT-Y-', text='Filtered Y', default=True, font=st.FONT_DESCR, pad=(10, 0),
+                                 enable_events=True),
+                     sg.Checkbox(k='-BOX-FILT-Z-', text='Filtered Z', default=True, font=st.FONT_DESCR, pad=(10, 0),
+                                 enable_events=True)]
                 ])]])],
+            [sg.pin(sg.Text(k='-TXT-PERF-', text='', font=st.FONT_MONO, visible=False))],
+            [sg.HSeparator()],
+            [sg.Col(element_justification='c', expand_x=True, layout=[signalColumns])],
             [sg.HSeparator()],
             [sg.Col(element_justification='c', expand_x=True, layout=[
                 [sg.Text(text='Enter log file name: ', font=st.FONT_DESCR, pad=((5, 0), (10, 5))),
-                 sg.Input(k='-INP-FILE-NAME-', size=(50, 1), font=st.FONT_DESCR, pad=((5, 0), (10, 5)))],
+                 sg.Input(k='-INP-FILE-NAME-', size=(50, 1), font=st.FONT_DESCR, pad=((5, 0), (10, 5))),
+                 sg.Checkbox(k='-BOX-LOG-BINARY-', text='Binary Log', default=False, font=st.FONT_DESCR,
+                             pad=((10, 0), (10, 5))),
+                 sg.Checkbox(k='-BOX-LOG-CHANNELS-', text='All Channels', default=False, font=st.FONT_DESCR,
+                             pad=((10, 0), (10, 5)), tooltip='Also log the angular velocity, angle, magnetic field and '
+                                                             'quaternion of the IMU, each to its own file.'),
+                 sg.Combo(k='-COMBO-LOG-SEGMENT-', values=list(c.LOG_SEGMENT_OPTIONS),
+                          default_value=list(c.LOG_SEGMENT_OPTIONS)[0], font=st.FONT_DESCR, readonly=True,
+                          pad=((10, 0), (10, 5)))],
                 [sg.Button(k='-BTN-TOGGLE-LOG-', button_text='Start Logging', font=st.FONT_BTN, border_width=3,
                            pad=((5, 0), (10, 5)), disabled=True),
                  sg.Column(logStartColumn, element_justification='center', pad=(0, 0)),
                  sg.Column(logEndColumn, element_justification='center', pad=(0, 0)),
                  sg.Column(logElapsedColumn, element_justification='center', pad=(0, 0)),
                  sg.Column(logLineColumn, element_justification='center', pad=(0, 0)),
+                 sg.Column(droppedColumn, element_justification='center', pad=(0, 0)),
                  sg.Column(vertical_alignment='c', element_justification='c', layout=[
                      [sg.Text(k='-TXT-LOG-DIR-', text='Open Logging Folder', font=st.FONT_DESCR + ' underline',
                               text_color='blue', enable_events=True)]
@@ -78,7 +129,8 @@ class Layout:
 
         return layout
 
-    def getImuWindowLayout(self, availableComPorts, comPort, baudRate) -> list:
+    def getImuWindowLayout(self, availableComPorts, comPort, baudRate, backend=c.BACKEND_WITMOTION,
+                           replayPath=None) -> list:
         """
         Create the layout for the IMU connection window.
 
@@ -86,6 +138,8 @@ class Layout:
             availableComPorts (list): A list of available COM ports.
             comPort (string): Default COM port to show in COMBO box.
             baudRate (int): Default baud rate to show in COMBO box.
+            backend (str, optional): Default backend to show in COMBO box. Defaults to the Witmotion module.
+            replayPath (Path, optional): Default log file for the replay backend. Defaults to None.
 
         Returns:
             layout (list): Layout in the form of a list.
@@ -95,11 +149,22 @@ class Layout:
                        image_subsample=4, border_width=3, pad=((0, 10), (20, 0))),
              sg.Combo(k='-COMBO-COM-PORT-', values=availableComPorts, size=7, font=st.FONT_COMBO,
                       enable_events=True, readonly=True, default_value=comPort, pad=((0, 0), (20, 0))),
+             sg.Button(k='-BTN-COM-FIND-', button_text='Find IMU', border_width=3, font=st.FONT_BTN_SMALL,
+                       pad=((10, 0), (20, 0))),
              sg.Text('Baud Rate:', justification='right', font=st.FONT_DESCR, pad=((20, 0), (20, 0))),
              sg.Combo(k='-COMBO-BAUD-RATE-', values=c.COMMON_BAUD_RATES, size=7, font=st.FONT_COMBO,
                       enable_events=True, readonly=True, default_value=baudRate, pad=((0, 0), (20, 0)))],
+            [sg.Text('Backend:', justification='right', font=st.FONT_DESCR, pad=((0, 0), (10, 0))),
+             sg.Combo(k='-COMBO-BACKEND-', values=c.IMU_BACKEND_OPTIONS, size=16, font=st.FONT_COMBO,
+                      enable_events=True, readonly=True, default_value=backend, pad=((0, 0), (10, 0)))],
+            [sg.Text('Replay file:', justification='right', font=st.FONT_DESCR, pad=((0, 0), (10, 0))),
+             sg.Input(k='-INP-REPLAY-FILE-', default_text=replayPath or '', size=(30, 1), font=st.FONT_DESCR,
+                      enable_events=True, pad=((0, 0), (10, 0))),
+             sg.FileBrowse(file_types=(('Log Files', '*.txt *.scglog'),), font=st.FONT_BTN_SMALL,
+                           pad=((5, 0), (10, 0)))],
             [sg.HSeparator(pad=((10, 10), (20, 20)))],
-            [sg.Button(k='-BTN-IMU-CONNECT-', button_text='Connect', border_width=3, font=st.FONT_BTN)]
+            [sg.Button(k='-BTN-IMU-CONNECT-', button_text='Connect', border_width=3, font=st.FONT_BTN)],
+            [sg.Text(k='-TXT-CONNECT-STATUS-', text='', size=(30, 1), justification='center', font=st.FONT_DESCR)]
         ]
 
         return layout
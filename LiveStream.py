@@ -0,0 +1,380 @@
+"""
+Live stream of the acquired samples to other processes on the same machine, e.g. a second plot, an analysis script or a
+recorder. A LiveServer publishes the rows of a SampleChannel over a local TCP socket, any number of LiveClients can
+subscribe. Running this file connects a client and prints the received rate, as an example consumer:
+
+    python LiveStream.py [port]
+
+Every message is a frame:
+    MAGIC (4 bytes)
+    message type (uint8)
+    payload length (uint32)
+    payload
+
+HELLO is the first message to a client, its payload is a JSON object with the format version and the number of
+columns of the rows, it is sent again if the stream changes (e.g. an IMU is added). SAMPLES carries a batch of rows:
+    sequence number of the first row (uint64)
+    row count n (uint32)
+    samples dropped for this client so far (uint64)
+    n rows of float64 values, row after row
+
+The sequence number counts the rows published to the channel, so a client can also see gaps itself.
+"""
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import constants as c
+
+MAGIC = b'SCGS'
+VERSION = 1
+HELLO = 0
+SAMPLES = 1
+FRAME_HEADER = struct.Struct('<4sBI')
+BATCH_HEADER = struct.Struct('<QIQ')
+
+
+def encodeFrame(messageType, payload) -> bytes:
+    """
+    Returns:
+        frame (bytes): The payload framed for sending, see the module docstring.
+    """
+    return FRAME_HEADER.pack(MAGIC, messageType, len(payload)) + payload
+
+
+def encodeHello(columns) -> bytes:
+    """
+    Returns:
+        frame (bytes): HELLO frame for rows of the given number of columns.
+    """
+    return encodeFrame(HELLO, json.dumps({'version': VERSION, 'columns': columns}).encode('utf-8'))
+
+
+class LiveServer:
+    """
+    Publishes the rows of a SampleChannel to local clients. The server is one more consumer of the channel, with its
+    own Subscription, so the acquisition thread does no extra work however many clients are connected.
+
+    A publisher thread reads the new rows every poll interval and encodes them into one batch, which is queued for
+    every client. Each client has a sender thread that writes its queue to the socket, so a stalled client only blocks
+    its own sender. When a client's queue is full the oldest batch is dropped and its rows are counted in the client's
+    dropped samples, which are sent with every batch and reported by clientStats(). A HELLO is never dropped.
+    """
+
+    def __init__(self, channel, host=c.LIVE_HOST, port=c.LIVE_PORT, pollInterval=0.05,
+                 queueBatches=c.LIVE_QUEUE_BATCHES):
+        """
+        Initialise a LiveServer. Nothing is published until start() is called.
+
+        Args:
+            channel (SampleChannel): Channel whose rows are published.
+            host (str, optional): Address to listen on. Defaults to constants.LIVE_HOST (local connections only).
+            port (int, optional): TCP port to listen on, 0 for any free port. Defaults to constants.LIVE_PORT.
+            pollInterval (float, optional): Time between batches in seconds. Defaults to 0.05.
+            queueBatches (int, optional): Batches queued per client before the oldest is dropped. Defaults to
+                constants.LIVE_QUEUE_BATCHES.
+        """
+        self.host = host
+        self.port = port
+        self.pollInterval = pollInterval
+        self.queueBatches = queueBatches
+        self.subscription = channel.subscribe()
+        self.clients = []  # Connected clients.
+        # Guards self.clients, which the accept and publisher threads change, and self.subscription.
+        self.clientsLock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.listener = None  # Listening socket.
+        self.threads = []
+
+    def start(self):
+        """
+        Start listening and publishing.
+        """
+        self.listener = socket.create_server((self.host, self.port))
+        self.listener.settimeout(0.5)
+        self.port = self.listener.getsockname()[1]
+        self.threads = [threading.Thread(target=self.__acceptLoop, name='LiveServerAccept', daemon=True),
+                        threading.Thread(target=self.__publishLoop, name='LiveServerPublish', daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        print(f'Live stream published on {self.host}:{self.port}.')
+
+    def stop(self):
+        """
+        Stop publishing and disconnect all clients.
+        """
+        self.stopEvent.set()
+        for thread in self.threads:
+            thread.join()
+        self.listener.close()
+        with self.clientsLock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            client.close()
+        print('Live stream stopped.')
+
+    def setChannel(self, channel):
+        """
+        Publish another channel, e.g. the merged stream once an IMU is added. Clients stay connected and are sent a
+        new HELLO with the number of columns of the new channel, batches of the previous channel still queued for a
+        client are dropped.
+
+        Args:
+            channel (SampleChannel): Channel whose rows are published.
+        """
+        with self.clientsLock:
+            self.subscription = channel.subscribe()
+            for client in self.clients:
+                client.sendHello(encodeHello(channel.columns))
+                client.serverDropped = 0
+
+    def clientStats(self) -> list:
+        """
+        Returns:
+            stats (list[dict]): Address, samples sent, samples dropped and batches queued of every client.
+        """
+        with self.clientsLock:
+            return [client.stats() for client in self.clients]
+
+    def __acceptLoop(self):
+        """
+        Accept thread. New clients are sent a HELLO and receive the batches published from then on.
+        """
+        while not self.stopEvent.is_set():
+            try:
+                connection, address = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = LiveServerClient(connection, address, self.queueBatches)
+            with self.clientsLock:
+                client.sendHello(encodeHello(self.subscription.channel.columns))
+                client.serverDropped = self.subscription.dropped
+                self.clients.append(client)
+            print(f'Live stream client connected: {address[0]}:{address[1]}.')
+
+    def __publishLoop(self):
+        """
+        Publisher thread. Reads the new rows every poll interval and queues them as one batch for every client.
+        Disconnected clients are removed.
+        """
+        while not self.stopEvent.wait(self.pollInterval):
+            with self.clientsLock:
+                subscription = self.subscription
+                rows = subscription.read()
+                for client in [client for client in self.clients if client.closed]:
+                    print(f'Live stream client disconnected: {client.address[0]}:{client.address[1]}, '
+                          f'{client.sent} samples sent, {client.dropped} dropped.')
+                    self.clients.remove(client)
+                if len(rows) == 0 or not self.clients:
+                    continue
+                sequence = subscription.cursor - len(rows)
+                payload = np.ascontiguousarray(rows, dtype='<f8').tobytes()
+                for client in self.clients:
+                    # Rows the server itself missed (the channel overran it) are dropped for every client.
+                    client.dropped += subscription.dropped - client.serverDropped
+                    client.serverDropped = subscription.dropped
+                    client.send(encodeFrame(SAMPLES, BATCH_HEADER.pack(sequence, len(rows), client.dropped) +
+                                            payload), len(rows))
+
+
+class LiveServerClient:
+    """
+    A connected client of a LiveServer: a bounded queue of batches and the sender thread that writes them to the socket.
+
+    The HELLO is not queued with the batches but kept aside and sent before the next batch, so it is never dropped
+    however slow the client is. A new HELLO (the channel changed) discards the queued batches, which are rows of the
+    previous channel that the client would decode with the new number of columns.
+    """
+
+    def __init__(self, connection, address, queueBatches):
+        """
+        Args:
+            connection (socket.socket): Socket of the client.
+            address (tuple): Address of the client.
+            queueBatches (int): Batches queued before the oldest is dropped.
+        """
+        self.connection = connection
+        self.address = address
+        self.queueBatches = queueBatches
+        self.batches = deque()  # (frame, rows) to send.
+        self.hello = None  # HELLO frame to send before the next batch.
+        self.condition = threading.Condition()  # Guards self.batches and self.hello, wakes the sender thread.
+        self.sent = 0  # Samples sent.
+        self.dropped = 0  # Samples dropped because the client did not keep up.
+        self.serverDropped = 0  # Samples missed by the server when last checked.
+        self.closed = False
+        self.thread = threading.Thread(target=self.__sendLoop, name='LiveServerClient', daemon=True)
+        self.thread.start()
+
+    def send(self, frame, rows):
+        """
+        Queue a SAMPLES frame. If the queue is full the oldest batch is dropped, its rows are counted as dropped. Never
+        blocks.
+
+        Args:
+            frame (bytes): Frame to send.
+            rows (int): Samples in the frame.
+        """
+        with self.condition:
+            if len(self.batches) >= self.queueBatches:
+                self.dropped += self.batches.popleft()[1]
+            self.batches.append((frame, rows))
+            self.condition.notify()
+
+    def sendHello(self, frame):
+        """
+        Send a HELLO before any further batch. Queued batches are discarded and counted as dropped. Never blocks.
+
+        Args:
+            frame (bytes): HELLO frame to send.
+        """
+        with self.condition:
+            self.dropped += sum(rows for _, rows in self.batches)
+            self.batches.clear()
+            self.hello = frame
+            self.condition.notify()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            stats (dict): Address, samples sent, samples dropped and batches queued.
+        """
+        return {'address': f'{self.address[0]}:{self.address[1]}', 'sent': self.sent, 'dropped': self.dropped,
+                'queued': len(self.batches)}
+
+    def close(self):
+        """
+        Stop the sender thread and close the socket.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def __sendLoop(self):
+        """
+        Sender thread. Writes the HELLO and the queued batches until the client disconnects or is closed.
+        """
+        while True:
+            with self.condition:
+                while not self.closed and self.hello is None and not self.batches:
+                    self.condition.wait()
+                if self.closed:
+                    break
+                if self.hello is not None:
+                    (frame, rows), self.hello = (self.hello, 0), None
+                else:
+                    frame, rows = self.batches.popleft()
+            try:
+                self.connection.sendall(frame)
+            except OSError:
+                break
+            self.sent += rows
+        self.closed = True
+
+
+class LiveClient:
+    """
+    Subscriber of a LiveServer, for consumers in other processes.
+    """
+
+    def __init__(self, host=c.LIVE_HOST, port=c.LIVE_PORT, timeout=5.0):
+        """
+        Connect to a LiveServer and read its HELLO.
+
+        Args:
+            host (str, optional): Address of the server. Defaults to constants.LIVE_HOST.
+            port (int, optional): TCP port of the server. Defaults to constants.LIVE_PORT.
+            timeout (float, optional): Timeout of the connection and the HELLO in seconds, read() waits for the next
+                batch without a timeout. Defaults to 5.
+        """
+        self.connection = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.connection.makefile('rb')
+        self.columns = None
+        self.dropped = 0  # Samples dropped by the server for this client.
+        messageType, payload = self.__readFrame()
+        self.__handleHello(messageType, payload)
+        self.connection.settimeout(None)
+
+    def close(self):
+        """
+        Disconnect from the server.
+        """
+        self.file.close()
+        self.connection.close()
+
+    def __readFrame(self):
+        """
+        Returns:
+            messageType (int): Type of the next frame.
+            payload (bytes): Its payload.
+        """
+        header = self.file.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise ConnectionError('Live stream closed.')
+        magic, messageType, length = FRAME_HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('Not a live stream.')
+        payload = self.file.read(length)
+        if len(payload) < length:
+            raise ConnectionError('Live stream closed.')
+        return messageType, payload
+
+    def __handleHello(self, messageType, payload):
+        """
+        Take the number of columns from a HELLO.
+        """
+        if messageType != HELLO:
+            raise ValueError('Live stream did not start with a HELLO.')
+        hello = json.loads(payload.decode('utf-8'))
+        if hello.get('version') != VERSION:
+            raise ValueError(f'Unsupported live stream version {hello.get("version")}.')
+        self.columns = hello['columns']
+
+    def read(self):
+        """
+        Wait for the next batch of rows.
+
+        Returns:
+            sequence (int): Sequence number of the first row.
+            rows (np.ndarray): float64 rows of shape (n, self.columns).
+        """
+        while True:
+            messageType, payload = self.__readFrame()
+            if messageType == HELLO:
+                self.__handleHello(messageType, payload)
+                continue
+            sequence, n, self.dropped = BATCH_HEADER.unpack_from(payload)
+            rows = np.frombuffer(payload, dtype='<f8', offset=BATCH_HEADER.size)
+            return sequence, rows.reshape(n, self.columns)
+
+
+if __name__ == '__main__':
+    client = LiveClient(port=int(sys.argv[1]) if len(sys.argv) > 1 else c.LIVE_PORT)
+    print(f'Connected, {client.columns} columns per row.')
+    received = 0
+    reportTime = time.monotonic()
+    try:
+        while True:
+            _, batch = client.read()
+            received += len(batch)
+            if time.monotonic() - reportTime >= 1:
+                print(f'{received} samples/s, last row {np.round(batch[-1], 3).tolist()}, dropped {client.dropped}.')
+                received = 0
+                reportTime = time.monotonic()
+    except (ConnectionError, KeyboardInterrupt) as e:
+        print(e)
+    finally:
+        client.close()
@@ -0,0 +1,444 @@
+"""
+Log file formats. Every sample is logged with two integer times in nanoseconds: the host time, the wall clock time the
+sample was taken, corrected for the offset and drift of the IMU clock (see ClockSync.py), and the device time, the
+IMU's own timestamp. Text logs use a csv-type format: date,hostNs,deviceNs,Ax,Ay,Az, where the date is the host time
+as 'dd mm YYYY HH:MM:SS.ffffff' for reading by eye. Binary logs use a columnar format that starts with a fixed size
+header followed by any number of chunks, so data can be appended as it arrives. Logs of the merged stream of several
+IMUs have three acceleration columns per IMU: date,hostNs,deviceNs,Ax1,Ay1,Az1,Ax2,Ay2,Az2,... Running this file
+converts a binary log to the text log format:
+
+    python LogFormat.py "logging/my log.scglog" ["logging/my log.txt"]
+
+Binary file layout:
+    MAGIC (8 bytes)
+    header length (uint32) + JSON header, padded with spaces to HEADER_SIZE bytes in total
+    chunks, each chunk is:
+        sample count n (uint32)
+        n host times (int64 nanoseconds)
+        n device times (int64 nanoseconds)
+        n x-accelerations, n y-accelerations, n z-accelerations (float32), repeated for every IMU of a merged log
+
+The number of float32 value columns is stored in the header as valueColumns (3 if missing).
+
+Logs written before the integer times were added are still read: text lines of date,Ax,Ay,Az (with milliseconds that
+were not zero padded), and binary logs starting with MAGIC_V1 whose chunks hold n float64 IMU timestamps instead of
+the two integer times.
+"""
+import json
+import struct
+import sys
+from itertools import islice
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from ClockSync import NS_PER_SECOND, toNs
+
+MAGIC = b'SCGLOG\x00\x02'
+MAGIC_V1 = b'SCGLOG\x00\x01'  # Binary logs with float64 IMU timestamps only.
+HEADER_SIZE = 1024
+TEXT_EXTENSION = '.txt'
+BINARY_EXTENSION = '.scglog'
+BEATS_SUFFIX = '.beats'  # Added to the log file name for the beats file, e.g. 'my log.beats.txt'.
+STATS_SUFFIX = '.stats.json'  # Added to the log file name for its statistics, e.g. 'my log.txt.stats.json'.
+SEGMENT_SUFFIX = '.seg'  # Added to the log file name with the segment number, e.g. 'my log.seg0001.txt'.
+MANIFEST_SUFFIX = '.manifest.json'  # Replaces the extension of a segmented log for its manifest.
+SUMMARY_SUFFIX = '.summary.json'  # Added to the log file name for its batch processing summary.
+INDEX_SUFFIX = '.index.npz'  # Added to the log file name for its index, e.g. 'my log.txt.index.npz'.
+SETTINGS_SUFFIX = '.settings.json'  # Added to the file name of a merged log for the settings of its IMUs.
+# The other channels of an IMU (see constants.IMU_CHANNELS) are logged next to the log, e.g. 'my log.angle.txt'.
+
+
+def beatsPath(logPath) -> Path:
+    """
+    Returns:
+        beatsPath (Path): Path of the beats file written next to the given log, it contains date,hostNs,deviceNs,BPM
+            lines in the text log format, one per detected heartbeat.
+    """
+    logPath = Path(logPath)
+    return logPath.with_name(logPath.stem + BEATS_SUFFIX + TEXT_EXTENSION)
+
+
+def channelPath(logPath, channel) -> Path:
+    """
+    Returns:
+        channelPath (Path): Path of the log of another channel of the IMU (see constants.IMU_CHANNELS) written next to
+            the given log, in the same format, with a timestamp column followed by the values of the channel.
+    """
+    logPath = Path(logPath)
+    return logPath.with_name(f'{logPath.stem}.{channel}{logPath.suffix}')
+
+
+def statsPath(logPath) -> Path:
+    """
+    Returns:
+        statsPath (Path): Path of the JSON file with the signal statistics of a text or segmented log (binary logs
+            store them in their header). The full file name of the log is kept, like for indexPath().
+    """
+    logPath = Path(logPath)
+    return logPath.with_name(logPath.name + STATS_SUFFIX)
+
+
+def segmentPath(logPath, index) -> Path:
+    """
+    Returns:
+        segmentPath (Path): Path of the given segment (counted from 1) of a segmented log, each segment is a complete
+            log file of the same format.
+    """
+    logPath = Path(logPath)
+    return logPath.with_name(f'{logPath.stem}{SEGMENT_SUFFIX}{index:04d}{logPath.suffix}')
+
+
+def manifestPath(logPath) -> Path:
+    """
+    Returns:
+        manifestPath (Path): Path of the JSON manifest of a segmented log, listing its segments and their time ranges
+            (see SegmentedLog.py).
+    """
+    logPath = Path(logPath)
+    return logPath.with_name(logPath.stem + MANIFEST_SUFFIX)
+
+
+def summaryPath(logPath) -> Path:
+    """
+    Returns:
+        summaryPath (Path): Path of the JSON summary of the given log, written by BatchProcess.py. The full file name
+            of the log is kept, so a text and a binary log of the same name have their own summary.
+    """
+    logPath = Path(logPath)
+    return logPath.with_name(logPath.name + SUMMARY_SUFFIX)
+
+
+def settingsPath(logPath) -> Path:
+    """
+    Returns:
+        settingsPath (Path): Path of the JSON file with the settings of every IMU of a merged log, which do not fit in
+            the fixed size binary header. The full file name of the log is kept, like for indexPath().
+    """
+    logPath = Path(logPath)
+    return logPath.with_name(logPath.name + SETTINGS_SUFFIX)
+
+
+def indexPath(logPath) -> Path:
+    """
+    Returns:
+        indexPath (Path): Path of the index of the given log, written by LogReader.py the first time the log is
+            opened. The full file name of the log is kept, so a text and a binary log of the same name have their own
+            index.
+    """
+    logPath = Path(logPath)
+    return logPath.with_name(logPath.name + INDEX_SUFFIX)
+
+
+def formatTextLines(hostNs, deviceNs, values) -> str:
+    """
+    Format samples as date,hostNs,deviceNs,Ax,Ay,Az lines. The date string is only rebuilt when the second changes and
+    the microseconds are taken from the integer host time, so there is no datetime conversion per row.
+
+    Args:
+        hostNs (np.ndarray): int64 corrected wall clock times in nanoseconds.
+        deviceNs (np.ndarray): int64 IMU timestamps in nanoseconds.
+        values (np.ndarray): Values of each sample, shape (n, columns).
+
+    Returns:
+        chunk (str): Formatted lines.
+    """
+    lastSecond = None
+    prefix = ''
+    lines = []
+    for host, device, row in zip(np.asarray(hostNs).tolist(), np.asarray(deviceNs).tolist(),
+                                 np.asarray(values).tolist()):
+        second, nanoseconds = divmod(host, NS_PER_SECOND)
+        if second != lastSecond:
+            lastSecond = second
+            prefix = datetime.fromtimestamp(second).strftime('%d %m %Y %H:%M:%S')
+        lines.append(f'{prefix}.{nanoseconds // 1000:06d},{host},{device},{",".join([str(v) for v in row])}\n')
+    return ''.join(lines)
+
+
+def parseTextLines(lines):
+    """
+    Parse date,hostNs,deviceNs,Ax,Ay,Az lines back into numbers, the inverse of formatTextLines(). The time is taken
+    from the integer host time. Lines without the integer times (older logs) are timed from their date string, which
+    is only parsed when it differs from the previous line's.
+
+    Args:
+        lines (iterable[str]): Lines of a text log.
+
+    Returns:
+        timestamps (np.ndarray): Wall clock times in seconds since the epoch, float64 array of shape (n,).
+        acceleration (np.ndarray): float64 array of shape (n, 3), or (n, 3 * IMUs) for a merged log.
+    """
+    lastPrefix = None
+    second = 0.0
+    timestamps = []
+    acceleration = []
+    for line in lines:
+        if not line.strip():
+            continue
+        date, *values = line.split(',')
+        if values[0].isdigit():
+            # Accelerations are always written with a decimal point, so an integer column is the host time.
+            timestamps.append(int(values[0]) / NS_PER_SECOND)
+            values = values[2:]
+        else:
+            prefix, milliseconds = date.rsplit('.', 1)
+            if prefix != lastPrefix:
+                lastPrefix = prefix
+                second = datetime.strptime(prefix, '%d %m %Y %H:%M:%S').timestamp()
+            timestamps.append(second + int(milliseconds) / 1000)
+        acceleration.append([float(v) for v in values])
+    acceleration = np.array(acceleration, dtype=np.float64)
+    return np.array(timestamps, dtype=np.float64), acceleration.reshape(len(timestamps), -1) if len(timestamps) else \
+        np.empty((0, 3))
+
+
+def readTextLog(filePath):
+    """
+    Read a whole text log into memory.
+
+    Args:
+        filePath (Path): Path to the text log.
+
+    Returns:
+        timestamps (np.ndarray): Wall clock times in seconds since the epoch, float64 array of shape (n,).
+        acceleration (np.ndarray): float64 array of shape (n, 3), or (n, 3 * IMUs) for a merged log.
+    """
+    with open(filePath, 'r') as file:
+        return parseTextLines(file)
+
+
+def encodeHeader(header) -> bytes:
+    """
+    Encode the header dictionary into the fixed size header block.
+
+    Args:
+        header (dict): JSON serialisable header fields.
+
+    Returns:
+        block (bytes): Header block of HEADER_SIZE bytes.
+    """
+    body = json.dumps(header).encode('utf-8')
+    block = MAGIC + struct.pack('<I', len(body)) + body
+    if len(block) > HEADER_SIZE:
+        raise ValueError(f'Binary log header is too large ({len(block)} > {HEADER_SIZE} bytes).')
+    return block.ljust(HEADER_SIZE, b' ')
+
+
+def encodeChunk(hostNs, deviceNs, values) -> bytes:
+    """
+    Encode a batch of samples into a single chunk.
+
+    Args:
+        hostNs (np.ndarray): int64 corrected wall clock times in nanoseconds.
+        deviceNs (np.ndarray): int64 IMU timestamps in nanoseconds.
+        values (np.ndarray): Values of each sample, shape (n, columns), all samples of a log must have the same number
+            of values.
+
+    Returns:
+        chunk (bytes): Encoded chunk.
+    """
+    return (struct.pack('<I', len(hostNs)) + np.asarray(hostNs, dtype='<i8').tobytes() +
+            np.asarray(deviceNs, dtype='<i8').tobytes() +
+            np.ascontiguousarray(np.asarray(values).T, dtype=np.float32).tobytes())
+
+
+def readHeader(file) -> dict:
+    """
+    Read and validate the header of an open binary log. The file position is left at the first chunk.
+
+    Args:
+        file (BinaryIO): Binary log opened in 'rb' mode.
+
+    Returns:
+        header (dict): Header fields, with the format version (1 or 2) added as 'version'.
+    """
+    block = file.read(HEADER_SIZE)
+    if len(block) < HEADER_SIZE or not block.startswith((MAGIC, MAGIC_V1)):
+        raise ValueError('Not a binary SCG log file.')
+    length = struct.unpack_from('<I', block, len(MAGIC))[0]
+    start = len(MAGIC) + 4
+    header = json.loads(block[start:start + length].decode('utf-8'))
+    header['version'] = 2 if block.startswith(MAGIC) else 1
+    return header
+
+
+def iterChunkBytes(file, valueColumns=3, version=2):
+    """
+    Iterate over the encoded chunks of an open binary log, starting at the current file position, without decoding
+    them. A partially written chunk at the end of the file (e.g. after a crash) is ignored.
+
+    Args:
+        file (BinaryIO): Binary log opened in 'rb' mode, positioned after the header.
+        valueColumns (int, optional): Number of value columns, header['valueColumns']. Defaults to 3.
+        version (int, optional): Format version, header['version']. Defaults to 2.
+
+    Yields:
+        count (int): Number of samples n of the chunk.
+        body (bytes): The chunk after its sample count.
+    """
+    timeBytes = 16 if version >= 2 else 8
+    while True:
+        countBytes = file.read(4)
+        if len(countBytes) < 4:
+            return
+        n = struct.unpack('<I', countBytes)[0]
+        size = n * timeBytes + n * 4 * valueColumns
+        body = file.read(size)
+        if len(body) < size:
+            return
+        yield n, body
+
+
+def iterChunks(file, valueColumns=3, version=2):
+    """
+    Iterate over the chunks of an open binary log, starting at the current file position. A partially written chunk
+    at the end of the file (e.g. after a crash) is ignored.
+
+    Args:
+        file (BinaryIO): Binary log opened in 'rb' mode, positioned after the header.
+        valueColumns (int, optional): Number of value columns, header['valueColumns']. Defaults to 3.
+        version (int, optional): Format version, header['version']. Defaults to 2.
+
+    Yields:
+        timestamps (np.ndarray): float64 array of shape (n,), the host times in seconds (version 1: the IMU
+            timestamps).
+        acceleration (np.ndarray): float32 array of shape (n, valueColumns).
+        deviceNs (np.ndarray): int64 array of shape (n,), the IMU timestamps in nanoseconds.
+    """
+    timeBytes = 16 if version >= 2 else 8
+    for n, body in iterChunkBytes(file, valueColumns, version):
+        if version >= 2:
+            timestamps = np.frombuffer(body, dtype='<i8', count=n) / NS_PER_SECOND
+            deviceNs = np.frombuffer(body, dtype='<i8', count=n, offset=n * 8)
+        else:
+            timestamps = np.frombuffer(body, dtype=np.float64, count=n)
+            deviceNs = toNs(timestamps)
+        acceleration = np.frombuffer(body, dtype=np.float32, offset=n * timeBytes).reshape(valueColumns, n).T
+        yield timestamps, acceleration, deviceNs
+
+
+def readBinaryLog(filePath):
+    """
+    Read a whole binary log into memory.
+
+    Args:
+        filePath (Path): Path to the binary log.
+
+    Returns:
+        header (dict): Header fields.
+        timestamps (np.ndarray): float64 array of shape (n,).
+        acceleration (np.ndarray): float32 array of shape (n, header['valueColumns']).
+    """
+    with open(filePath, 'rb') as file:
+        header = readHeader(file)
+        valueColumns = header.get('valueColumns', 3)
+        chunks = list(iterChunks(file, valueColumns, header['version']))
+    if not chunks:
+        return header, np.empty(0, dtype=np.float64), np.empty((0, valueColumns), dtype=np.float32)
+    return header, np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+
+
+def iterLogBlocks(filePath, blockRows=10000):
+    """
+    Iterate over the samples of a text or binary log in blocks, so a log of any length can be processed without
+    loading it whole. A partially written chunk or line at the end of the log (e.g. after a crash) is ignored.
+
+    Args:
+        filePath (Path): Path to the text or binary log.
+        blockRows (int, optional): Samples per block, binary chunks are combined into blocks of at least this many
+            samples. Defaults to 10000.
+
+    Yields:
+        timestamps (np.ndarray): float64 array of shape (n,), the host times in seconds.
+        values (np.ndarray): Array of shape (n, valueColumns).
+    """
+    filePath = Path(filePath)
+    if filePath.suffix == BINARY_EXTENSION:
+        with open(filePath, 'rb') as file:
+            header = readHeader(file)
+            chunks = []
+            rows = 0
+            for timestamps, values, _ in iterChunks(file, header.get('valueColumns', 3), header['version']):
+                chunks.append((timestamps, values))
+                rows += len(timestamps)
+                if rows >= blockRows:
+                    yield np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+                    chunks = []
+                    rows = 0
+            if chunks:
+                yield np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+    else:
+        with open(filePath, 'r') as file:
+            while lines := list(islice(file, blockRows)):
+                if not lines[-1].endswith('\n'):
+                    lines.pop()
+                if lines:
+                    yield parseTextLines(lines)
+
+
+def countImus(logPath, header, valueColumns) -> int:
+    """
+    Find the number of IMUs of a log, the value columns after the raw accelerations of every IMU are filtered values.
+
+    Args:
+        logPath (Path): Path to the log.
+        header (dict): Header of a binary log, empty for a text log.
+        valueColumns (int): Number of value columns of the log.
+
+    Returns:
+        imus (int): Number of IMUs, from the header of a merged binary log (the IMU count, or the IMU settings of
+            older logs) or the raw channels in the statistics of the log. Every group of three value columns is taken
+            to be an IMU if neither is available.
+    """
+    if 'imuCount' in header:
+        return header['imuCount']
+    if 'imus' in header:
+        return len(header['imus'])
+    stats = header.get('stats')
+    if not stats:
+        try:
+            with open(statsPath(logPath), 'r') as file:
+                stats = json.load(file)
+        except (OSError, ValueError):
+            stats = {}
+    groups = valueColumns // 3
+    imus = len(stats.get('mean', [])) // 3
+    return imus if imus and groups % imus == 0 else groups
+
+
+def convertToText(binaryPath, textPath=None):
+    """
+    Regenerate the text log (date,hostNs,deviceNs,Ax,Ay,Az,...) from a binary log. The conversion is done one chunk at
+    a time. The IMU timestamps of a version 1 log are converted to wall clock time relative to the start of the log.
+
+    Args:
+        binaryPath (Path): Path to the binary log.
+        textPath (Path, optional): Path to the text log. Defaults to the binary path with a .txt extension.
+
+    Returns:
+        textPath (Path): Path to the text log.
+    """
+    binaryPath = Path(binaryPath)
+    textPath = Path(textPath) if textPath else binaryPath.with_suffix('.txt')
+    print(f'Converting {binaryPath} to {textPath}...')
+    with open(binaryPath, 'rb') as binaryFile, open(textPath, 'w') as textFile:
+        header = readHeader(binaryFile)
+        timeOffset = None
+        for timestamps, acceleration, deviceNs in iterChunks(binaryFile, header.get('valueColumns', 3),
+                                                             header['version']):
+            if header['version'] == 1:
+                if timeOffset is None:
+                    timeOffset = timestamps[0]
+                timestamps = timestamps - timeOffset + header['logStartTime']
+            textFile.write(formatTextLines(toNs(timestamps), deviceNs, acceleration))
+    print('Conversion completed.')
+    return textPath
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(f'Usage: python {Path(__file__).name} <binary log> [text log]')
+        sys.exit(1)
+    convertToText(*sys.argv[1:3])
@@ -0,0 +1,415 @@
+"""
+Random access to log files of any length, for viewing recordings. Log files are memory-mapped rather than read, so
+opening a log of several hundred MB is fast and only the parts that are looked at are loaded from disk.
+
+Binary logs are indexed by scanning the sample counts of their chunks. Text logs are indexed by the byte offset of
+every INDEX_STRIDE-th line. For both, a min/max pyramid of the samples is built on the first open (see Pyramid) and
+stored with the text offsets in an index file next to the log (see LogFormat.indexPath()), so later opens only map
+the file and load the index.
+"""
+import mmap
+import struct
+from pathlib import Path
+
+import numpy as np
+
+import LogFormat
+from ClockSync import NS_PER_SECOND
+
+INDEX_STRIDE = 1024  # Lines of a text log per indexed block.
+PYRAMID_BASE = 16  # Samples per bucket of the finest pyramid level.
+PYRAMID_FACTOR = 4  # Buckets of a level combined into one bucket of the next level.
+# Pyramid levels are added until a level has at most this many buckets. The top level is a single bucket, so a range
+# of any length has a level with fewer than PYRAMID_FACTOR times the buckets wanted.
+PYRAMID_TOP = 1
+# Points per bucket up to which a range is read sample by sample. A pyramid level has fewer than PYRAMID_FACTOR times
+# the buckets wanted, each plotted as its minimum and maximum, so envelopes have at most about this many points too.
+DIRECT_POINTS = 2 * PYRAMID_FACTOR
+SCAN_BYTES = 64 * 1024 * 1024  # Bytes of a text log searched for newlines at a time.
+
+
+class LogReader:
+    """
+    Memory-mapped reader of a text or binary log. Samples are addressed by index, times are wall clock times in seconds
+    (the host times of the log). read() returns the samples of an index range and envelope() a plot-ready min/max
+    envelope of a time range, at a cost that depends on the number of buckets requested and not on the length of the
+    range.
+
+    The value columns are grouped in threes (the X, Y and Z accelerations of an IMU, or their filtered values), the
+    pyramid also holds the norm of each group.
+    """
+
+    def __init__(self, filePath, useIndexFile=True):
+        """
+        Open and index a log.
+
+        Args:
+            filePath (Path): Path to the text or binary log.
+            useIndexFile (bool, optional): Load the index from the index file next to the log if it is up to date, and
+                write it after indexing. Defaults to True.
+        """
+        self.filePath = Path(filePath)
+        self.binary = self.filePath.suffix == LogFormat.BINARY_EXTENSION
+        self.header = {}  # Header of a binary log.
+        self.file = open(self.filePath, 'rb')
+        size = self.filePath.stat().st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.data = np.frombuffer(self.map, dtype=np.uint8)  # The whole file, memory-mapped.
+
+        cached = self.__loadIndexFile() if useIndexFile else None
+        if self.binary:
+            self.__indexBinary()
+        elif cached is not None:
+            self.lineOffsets = cached['lineOffsets']
+            self.lineCount = int(cached['lineCount'])
+            self.blockTimes = cached['blockTimes']
+            self.valueColumns = int(cached['valueColumns'])
+        else:
+            self.__indexText()
+        if self.valueColumns % 3:
+            raise ValueError(f'{self.filePath} has {self.valueColumns} value columns, not a multiple of 3.')
+        self.groups = self.valueColumns // 3
+        # IMUs of the log, the groups after the first imus groups are filtered values.
+        self.imus = LogFormat.countImus(self.filePath, self.header, self.valueColumns)
+
+        if cached is not None:
+            self.pyramid = Pyramid.fromArrays(cached)
+        else:
+            print(f'Indexing {self.filePath}...')
+            self.pyramid = Pyramid.build(self)
+            if useIndexFile:
+                self.__saveIndexFile()
+
+    def close(self):
+        """
+        Unmap and close the log.
+        """
+        self.data = None
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return int(self.chunkStarts[-1]) if self.binary else self.lineCount
+
+    def __indexBinary(self):
+        """
+        Read the header and find the offset and first time of every complete chunk.
+        """
+        self.file.seek(0)
+        self.header = LogFormat.readHeader(self.file)
+        self.valueColumns = self.header.get('valueColumns', 3)
+        self.timeBytes = 16 if self.header['version'] >= 2 else 8
+        offsets = []
+        counts = []
+        offset = LogFormat.HEADER_SIZE
+        end = len(self.data)
+        while offset + 4 <= end:
+            n = struct.unpack_from('<I', self.map, offset)[0]
+            size = n * (self.timeBytes + 4 * self.valueColumns)
+            if offset + 4 + size > end:
+                break
+            offsets.append(offset + 4)
+            counts.append(n)
+            offset += 4 + size
+        self.chunkOffsets = np.array(offsets, dtype=np.int64)
+        self.chunkCounts = np.array(counts, dtype=np.int64)
+        self.chunkStarts = np.concatenate(([0], np.cumsum(self.chunkCounts)))  # Index of the first sample per chunk.
+        self.chunkTimes = np.array([self.__chunkTimes(i)[0] if counts[i] else np.nan for i in range(len(counts))])
+
+    def __chunkTimes(self, chunk) -> np.ndarray:
+        """
+        Returns:
+            times (np.ndarray): Times in seconds of the samples of a chunk of a binary log.
+        """
+        offset = int(self.chunkOffsets[chunk])
+        n = int(self.chunkCounts[chunk])
+        if self.timeBytes == 16:
+            return self.data[offset:offset + 8 * n].view('<i8') / NS_PER_SECOND
+        return self.data[offset:offset + 8 * n].view('<f8')
+
+    def __chunkValues(self, chunk) -> np.ndarray:
+        """
+        Returns:
+            values (np.ndarray): float32 values of the samples of a chunk of a binary log, shape (n, valueColumns), a
+                view of the mapped file.
+        """
+        offset = int(self.chunkOffsets[chunk])
+        n = int(self.chunkCounts[chunk])
+        start = offset + self.timeBytes * n
+        return self.data[start:start + 4 * n * self.valueColumns].view('<f4').reshape(self.valueColumns, n).T
+
+    def __indexText(self):
+        """
+        Find the byte offset of every INDEX_STRIDE-th line and the time of those lines. A partially written last line
+        is left out.
+        """
+        # Newlines are searched in slices of the file, so memory use does not grow with the size of the log.
+        newlines = np.concatenate([np.empty(0, dtype=np.int64)] + [
+            np.flatnonzero(self.data[offset:offset + SCAN_BYTES] == ord('\n')) + offset
+            for offset in range(0, len(self.data), SCAN_BYTES)])
+        starts = np.concatenate(([0], newlines[:-1] + 1))
+        self.lineCount = len(newlines)
+        # Offsets of the first line of each block, and the end of the last complete line.
+        self.lineOffsets = np.concatenate((starts[::INDEX_STRIDE], newlines[-1:] + 1)).astype(np.int64)
+        self.blockTimes = np.empty(len(self.lineOffsets) - 1)
+        self.valueColumns = 3
+        for block in range(len(self.blockTimes)):
+            offset = int(self.lineOffsets[block])
+            end = self.map.find(b'\n', offset) + 1
+            timestamps, values = LogFormat.parseTextLines([self.map[offset:end].decode('utf-8')])
+            self.blockTimes[block] = timestamps[0]
+            self.valueColumns = values.shape[1]
+
+    def __readTextBlock(self, block):
+        """
+        Returns:
+            timestamps (np.ndarray): Times in seconds of the lines of an indexed block of a text log.
+            values (np.ndarray): Values of the lines, shape (n, valueColumns).
+        """
+        text = self.map[int(self.lineOffsets[block]):int(self.lineOffsets[block + 1])].decode('utf-8')
+        timestamps, values = LogFormat.parseTextLines(text.splitlines())
+        return timestamps, values.reshape(len(timestamps), self.valueColumns)
+
+    def read(self, start, stop):
+        """
+        Read the samples of an index range.
+
+        Args:
+            start (int): Index of the first sample.
+            stop (int): Index after the last sample.
+
+        Returns:
+            timestamps (np.ndarray): Times in seconds, float64 array of shape (n,).
+            values (np.ndarray): Values, array of shape (n, valueColumns).
+        """
+        start = max(int(start), 0)
+        stop = min(int(stop), len(self))
+        if stop <= start:
+            return np.empty(0), np.empty((0, self.valueColumns))
+        if self.binary:
+            first = int(np.searchsorted(self.chunkStarts, start, side='right')) - 1
+            last = int(np.searchsorted(self.chunkStarts, stop, side='left'))
+            chunks = range(first, last)
+            base = int(self.chunkStarts[first])
+            timestamps = np.concatenate([self.__chunkTimes(i) for i in chunks])
+            values = np.concatenate([self.__chunkValues(i) for i in chunks])
+        else:
+            first = start // INDEX_STRIDE
+            last = -(-stop // INDEX_STRIDE)
+            blocks = [self.__readTextBlock(i) for i in range(first, last)]
+            base = first * INDEX_STRIDE
+            timestamps = np.concatenate([block[0] for block in blocks])
+            values = np.concatenate([block[1] for block in blocks])
+        return timestamps[start - base:stop - base], values[start - base:stop - base]
+
+    def indexAt(self, time) -> int:
+        """
+        Returns:
+            index (int): Index of the first sample at or after the given time in seconds.
+        """
+        if len(self) == 0:
+            return 0
+        if self.binary:
+            chunk = max(int(np.searchsorted(self.chunkTimes, time, side='right')) - 1, 0)
+            return int(self.chunkStarts[chunk]) + int(np.searchsorted(self.__chunkTimes(chunk), time))
+        block = max(int(np.searchsorted(self.blockTimes, time, side='right')) - 1, 0)
+        return block * INDEX_STRIDE + int(np.searchsorted(self.__readTextBlock(block)[0], time))
+
+    @property
+    def startTime(self) -> float:
+        """
+        Returns:
+            startTime (float): Time of the first sample in seconds, NaN for an empty log.
+        """
+        return float(self.pyramid.times[0][0]) if len(self) else np.nan
+
+    @property
+    def endTime(self) -> float:
+        """
+        Returns:
+            endTime (float): Time of the last sample in seconds, NaN for an empty log.
+        """
+        return float(self.read(len(self) - 1, len(self))[0][0]) if len(self) else np.nan
+
+    def envelope(self, startTime, endTime, buckets):
+        """
+        Return the samples of a time range for plotting. A range of at most DIRECT_POINTS * buckets samples is read
+        sample by sample, a longer one is taken from the pyramid level with the fewest buckets that still has at least
+        the given number of buckets in the range (or from the finest level), as the minimum and maximum of each bucket.
+        Either way there are at most DIRECT_POINTS * buckets points (plus the partial buckets at the ends), however
+        long the range.
+
+        Args:
+            startTime (float): Start of the range in seconds.
+            endTime (float): End of the range in seconds.
+            buckets (int): Number of buckets, typically the width of the plot in pixels.
+
+        Returns:
+            timestamps (np.ndarray): Times of the points in seconds, shape (m,).
+            values (np.ndarray): Values of the points, shape (m, valueColumns + groups), the value columns followed by
+                the norm of each group of three.
+        """
+        start = self.indexAt(startTime)
+        stop = min(self.indexAt(endTime) + 1, len(self))
+        level = self.pyramid.levelFor(stop - start, buckets)
+        if level is None:
+            timestamps, values = self.read(start, stop)
+            return timestamps, withNorms(values)
+        return self.pyramid.envelope(level, start, stop)
+
+    def __loadIndexFile(self):
+        """
+        Returns:
+            arrays (dict): Arrays of the index file, None if there is none or it does not match the log.
+        """
+        path = LogFormat.indexPath(self.filePath)
+        try:
+            with np.load(path) as arrays:
+                stat = self.filePath.stat()
+                if int(arrays['logSize']) != stat.st_size or int(arrays['logModified']) != stat.st_mtime_ns:
+                    return None
+                if len(arrays[f'times{int(arrays["levels"]) - 1}']) > PYRAMID_TOP:
+                    # Written before the pyramid was built up to PYRAMID_TOP buckets.
+                    return None
+                return dict(arrays)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def __saveIndexFile(self):
+        """
+        Store the text line index and the pyramid next to the log. A failure (e.g. a read-only folder) only means the
+        next open indexes the log again.
+        """
+        stat = self.filePath.stat()
+        arrays = dict(self.pyramid.toArrays(), logSize=stat.st_size, logModified=stat.st_mtime_ns)
+        if not self.binary:
+            arrays.update(lineOffsets=self.lineOffsets, lineCount=self.lineCount, blockTimes=self.blockTimes,
+                          valueColumns=self.valueColumns)
+        try:
+            with open(LogFormat.indexPath(self.filePath), 'wb') as file:
+                np.savez(file, **arrays)
+        except OSError as e:
+            print(f'Index of {self.filePath} not saved: {e}')
+
+
+class Pyramid:
+    """
+    Multi-resolution min/max summary of a log. Level 0 has the minimum and maximum of every PYRAMID_BASE samples, each
+    further level combines PYRAMID_FACTOR buckets of the level below, until a level has at most PYRAMID_TOP buckets.
+    Each bucket also has the time of its first sample. NaN values (e.g. a stale IMU of a merged log) are ignored.
+    """
+
+    def __init__(self, times, minima, maxima):
+        """
+        Args:
+            times (list[np.ndarray]): Time of the first sample of each bucket, per level.
+            minima (list[np.ndarray]): Minimum of each bucket, shape (buckets, channels), per level.
+            maxima (list[np.ndarray]): Maximum of each bucket, shape (buckets, channels), per level.
+        """
+        self.times = times
+        self.minima = minima
+        self.maxima = maxima
+
+    @classmethod
+    def build(cls, reader, blockSize=PYRAMID_BASE * 4096):
+        """
+        Build the pyramid of a log, reading it one block of samples at a time.
+
+        Args:
+            reader (LogReader): Log to summarise.
+            blockSize (int, optional): Samples read at a time, a multiple of PYRAMID_BASE.
+
+        Returns:
+            pyramid (Pyramid): Pyramid of the log.
+        """
+        times, minima, maxima = [], [], []
+        for start in range(0, len(reader), blockSize):
+            timestamps, values = reader.read(start, start + blockSize)
+            values = withNorms(values).astype(np.float32)
+            starts = np.arange(0, len(values), PYRAMID_BASE)
+            times.append(timestamps[starts])
+            minima.append(np.fmin.reduceat(values, starts, axis=0))
+            maxima.append(np.fmax.reduceat(values, starts, axis=0))
+        channels = reader.valueColumns + reader.groups
+        levelTimes = [np.concatenate(times) if times else np.empty(0)]
+        levelMinima = [np.concatenate(minima) if minima else np.empty((0, channels), dtype=np.float32)]
+        levelMaxima = [np.concatenate(maxima) if maxima else np.empty((0, channels), dtype=np.float32)]
+        while len(levelTimes[-1]) > PYRAMID_TOP:
+            starts = np.arange(0, len(levelTimes[-1]), PYRAMID_FACTOR)
+            levelTimes.append(levelTimes[-1][starts])
+            levelMinima.append(np.fmin.reduceat(levelMinima[-1], starts, axis=0))
+            levelMaxima.append(np.fmax.reduceat(levelMaxima[-1], starts, axis=0))
+        return cls(levelTimes, levelMinima, levelMaxima)
+
+    @classmethod
+    def fromArrays(cls, arrays):
+        """
+        Returns:
+            pyramid (Pyramid): Pyramid loaded from the arrays of an index file, see toArrays().
+        """
+        levels = int(arrays['levels'])
+        return cls([arrays[f'times{k}'] for k in range(levels)], [arrays[f'minima{k}'] for k in range(levels)],
+                   [arrays[f'maxima{k}'] for k in range(levels)])
+
+    def toArrays(self) -> dict:
+        """
+        Returns:
+            arrays (dict): Named arrays of every level, for the index file.
+        """
+        arrays = {'levels': len(self.times)}
+        for k in range(len(self.times)):
+            arrays.update({f'times{k}': self.times[k], f'minima{k}': self.minima[k], f'maxima{k}': self.maxima[k]})
+        return arrays
+
+    @staticmethod
+    def bucketSize(level) -> int:
+        """
+        Returns:
+            size (int): Samples per bucket of the given level.
+        """
+        return PYRAMID_BASE * PYRAMID_FACTOR ** level
+
+    def levelFor(self, samples, buckets):
+        """
+        Choose the level to plot a range of samples with the given number of buckets.
+
+        Args:
+            samples (int): Number of samples in the range.
+            buckets (int): Number of buckets wanted.
+
+        Returns:
+            level (int): Coarsest level with at least the given number of buckets in the range, or level 0 if none has,
+                None if the samples should be read directly (at most DIRECT_POINTS per bucket).
+        """
+        buckets = max(int(buckets), 1)
+        if samples <= buckets * DIRECT_POINTS:
+            return None
+        level = 0
+        while level + 1 < len(self.times) and samples // self.bucketSize(level + 1) >= buckets:
+            level += 1
+        return level
+
+    def envelope(self, level, start, stop):
+        """
+        Returns:
+            timestamps (np.ndarray): Bucket times of the buckets covering an index range, each twice, shape (2m,).
+            values (np.ndarray): Minimum and maximum of each bucket, interleaved, shape (2m, channels).
+        """
+        size = self.bucketSize(level)
+        first = start // size
+        last = min(-(-stop // size), len(self.times[level]))
+        minima = self.minima[level][first:last]
+        maxima = self.maxima[level][first:last]
+        values = np.stack((minima, maxima), axis=1).reshape(-1, minima.shape[1])
+        return np.repeat(self.times[level][first:last], 2), values
+
+
+def withNorms(values) -> np.ndarray:
+    """
+    Returns:
+        values (np.ndarray): The given values with the norm of each group of three columns appended.
+    """
+    groups = values.shape[1] // 3
+    grouped = np.asarray(values, dtype=np.float64)[:, :3 * groups].reshape(len(values), groups, 3)
+    return np.column_stack((values, np.sqrt(np.einsum('ijk,ijk->ij', grouped, grouped))))
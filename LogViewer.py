@@ -0,0 +1,149 @@
+"""
+Offline viewer of recorded logs, drawn on the main window's plot in place of the live data.
+"""
+import numpy as np
+
+import Plotter
+from LogReader import LogReader
+
+MIN_SPAN = 0.1  # Shortest time range shown in seconds.
+ZOOM_STEP = 1.25  # Change of the shown time range per scroll step.
+
+
+class LogViewer:
+    """
+    Pan and zoom through a log of any length. The log is opened with a LogReader, so only the samples in view are
+    read, and long time ranges are drawn from the reader's min/max pyramid: every zoom level is drawn from about the
+    same number of points, whether it shows a second or several hours.
+
+    Scrolling over the plot zooms the time axis around the mouse pointer, dragging with the left mouse button pans it.
+    The mouse events only change the time range and set dirty, the plot is redrawn by the main loop.
+
+    Times are shown in seconds from the start of the log. Each IMU of the log is drawn on its own axes with the trace
+    columns of the live plot (see Plotter.TRACES), filtered values are drawn if they were logged.
+    """
+
+    def __init__(self, filePath, canvas):
+        """
+        Open a log for viewing, showing all of it.
+
+        Args:
+            filePath (Path): Path to the text or binary log.
+            canvas (FigureCanvasBase): Canvas of the plot, mouse events of the canvas pan and zoom the view.
+        """
+        self.reader = LogReader(filePath)
+        if len(self.reader) == 0:
+            self.reader.close()
+            raise ValueError(f'{filePath} has no samples.')
+        self.filePath = filePath
+        self.startTime = self.reader.startTime  # Time of the first sample, the origin of the time axis.
+        self.duration = max(self.reader.endTime - self.startTime, MIN_SPAN)
+        self.view = (0.0, self.duration)  # Shown time range in seconds from the start of the log.
+        self.dirty = True  # The view changed since the last getDatasets().
+        self.dragStart = None  # (x in pixels, view, axes) at the start of a left mouse button drag.
+        self.canvas = canvas
+        self.connections = [canvas.mpl_connect(name, callback) for name, callback in (
+            ('scroll_event', self.__onScroll),
+            ('button_press_event', self.__onPress),
+            ('motion_notify_event', self.__onMotion),
+            ('button_release_event', self.__onRelease))]
+
+    @property
+    def axesCount(self) -> int:
+        """
+        Returns:
+            axesCount (int): Number of stacked axes, one per IMU of the log.
+        """
+        return self.reader.imus
+
+    def close(self):
+        """
+        Stop handling mouse events and close the log.
+        """
+        for connection in self.connections:
+            self.canvas.mpl_disconnect(connection)
+        self.reader.close()
+
+    def setView(self, start, end):
+        """
+        Set the shown time range. The range is kept within the log and no shorter than MIN_SPAN.
+
+        Args:
+            start (float): Start of the range in seconds from the start of the log.
+            end (float): End of the range in seconds from the start of the log.
+        """
+        span = min(max(end - start, MIN_SPAN), self.duration)
+        start = min(max(start, 0.0), self.duration - span)
+        if (start, start + span) != self.view:
+            self.view = (float(start), float(start + span))
+            self.dirty = True
+
+    def zoom(self, factor, centre):
+        """
+        Zoom the time axis.
+
+        Args:
+            factor (float): Change of the shown time range, below 1 zooms in.
+            centre (float): Time in seconds from the start of the log that stays in place.
+        """
+        start, end = self.view
+        self.setView(centre - (centre - start) * factor, centre + (end - centre) * factor)
+
+    def getDatasets(self, width):
+        """
+        Get the data of the shown time range for Plotter.update(), and clear dirty.
+
+        Args:
+            width (int): Width of the plot in pixels.
+
+        Returns:
+            datasets (list[tuple[np.ndarray, np.ndarray]]): (t, traces) of each IMU, see Plotter.update().
+            xLimits (tuple[float, float]): The shown time range.
+        """
+        self.dirty = False
+        start, end = self.view
+        timestamps, values = self.reader.envelope(self.startTime + start, self.startTime + end, max(int(width), 1))
+        t = timestamps - self.startTime
+        reader = self.reader
+        datasets = []
+        for imu in range(reader.imus):
+            traces = np.full((len(t), len(Plotter.TRACES)), np.nan)
+            traces[:, 0:3] = values[:, 3 * imu:3 * imu + 3]
+            traces[:, 3] = values[:, reader.valueColumns + imu]
+            if reader.groups > reader.imus:
+                filtered = 3 * (reader.imus + imu)
+                traces[:, 4:7] = values[:, filtered:filtered + 3]
+            datasets.append((t, traces))
+        return datasets, self.view
+
+    def __onScroll(self, event):
+        """
+        Zoom in (scroll up) or out (scroll down) around the mouse pointer.
+        """
+        if event.xdata is None:
+            return
+        self.zoom(1 / ZOOM_STEP if event.button == 'up' else ZOOM_STEP, event.xdata)
+
+    def __onPress(self, event):
+        """
+        Start panning on a left mouse button press inside the plot.
+        """
+        if event.button == 1 and event.inaxes is not None:
+            self.dragStart = (event.x, self.view, event.inaxes)
+
+    def __onMotion(self, event):
+        """
+        Pan the view with the mouse while dragging. The pixel distance is used, as the data coordinates of the pointer
+        change with the view.
+        """
+        if self.dragStart is None or event.x is None:
+            return
+        x, (start, end), ax = self.dragStart
+        shift = (x - event.x) / ax.bbox.width * (end - start)
+        self.setView(start + shift, end + shift)
+
+    def __onRelease(self, event):
+        """
+        Stop panning.
+        """
+        self.dragStart = None
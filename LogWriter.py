@@ -0,0 +1,370 @@
+"""
+Background log writer. The writer is an independent consumer of the IMU sample channel, so log files are written
+while data arrives rather than all at once when logging stops, and without any work on the acquisition thread.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import LogFormat
+from ClockSync import ClockSync, toNs
+from Instrumentation import profiler
+from SignalStats import SignalStats
+
+
+class LogWriter:
+    """
+    Streams logged samples to a log file from a dedicated writer thread. The thread wakes up every poll interval, reads
+    all new samples from its subscription to the sample channel, encodes them into a single chunk, either text or
+    binary (see LogFormat.py), and writes the chunk to the file. Memory use stays flat regardless of the length of the
+    recording.
+
+    If the writer falls more than the channel capacity behind (the disk cannot keep up) the oldest samples are lost and
+    counted in the subscription rather than growing memory without limit.
+
+    Each sample is logged with its IMU timestamp and the corrected host time (see LogFormat.py). If the rows carry the
+    host's monotonic arrival time, a ClockSync fits the offset and drift of the IMU clock while logging, otherwise the
+    timestamps are taken to be wall clock times already (e.g. the merged stream of a StreamMerger).
+
+    Signal statistics of all logged samples (see SignalStats.py) are kept while writing. When the log is completed they
+    are added to the header of a binary log, which is rewritten in place, or written to a JSON file next to a text log
+    (see LogFormat.statsPath()).
+
+    A long recording can be split into segments: a new file is started after the given time or size, so a crash or
+    lost connection costs at most the segment being written. Each segment is a complete log (see
+    LogFormat.segmentPath()), flushed and fsync'd when it is closed, and a manifest next to the log (see
+    LogFormat.manifestPath()) lists the segments with their time ranges. The manifest is replaced atomically whenever
+    a segment is opened or closed, so it is never left half written. SegmentedLog.py stitches the segments back into
+    one log. The statistics of a segmented log are written to the JSON file.
+
+    If writing fails (e.g. the disk is full or removed) the writer stops: the exception is kept in self.error and the
+    log is completed as far as possible, with its statistics, the manifest and the beats file.
+    """
+
+    def __init__(self, subscription, filePath, logStartTime, binary=False, header=None, pollInterval=0.1,
+                 columns=None, filterStage=None, beatDetector=None, hostColumn=None, segmentSeconds=None,
+                 segmentBytes=None, openOnData=False):
+        """
+        Initialise a LogWriter. The file is not opened until start() is called.
+
+        Args:
+            subscription (Subscription): Subscription to the sample channel, samples published after it was created
+                are logged.
+            filePath (Path): Path to the log file.
+            logStartTime (float): Wall clock time the log was started, stored in the binary log header.
+            binary (bool, optional): Write the binary log format instead of text. Defaults to False.
+            header (dict, optional): Extra fields for the binary log header, e.g. IMU settings. Defaults to None.
+            pollInterval (float, optional): Time between reads of the sample channel in seconds. Defaults to 0.1.
+            columns (int, optional): Number of leading columns of each row that are logged, the first being the
+                timestamp. Defaults to None (all columns).
+            filterStage (Filters.FilterStage, optional): Filter applied to the logged columns, the filtered values are
+                logged after the raw ones. Defaults to None (raw values only).
+            beatDetector (BeatDetector.BeatDetector, optional): Detector run on the raw logged samples, the detected
+                beats are written to a beats file next to the log (see LogFormat.beatsPath()). Defaults to None.
+            hostColumn (int, optional): Column of the rows with the host monotonic arrival time, used to synchronise
+                the IMU clock. Defaults to None (the timestamps are wall clock times).
+            segmentSeconds (float, optional): Start a new segment after this many seconds. Defaults to None.
+            segmentBytes (int, optional): Start a new segment once a segment reaches this size in bytes. Defaults to
+                None. The log is not segmented if neither segmentSeconds nor segmentBytes is given.
+            openOnData (bool, optional): Create the log with the first samples instead of in start(), so no log is left
+                for a channel that never produces any. Defaults to False.
+        """
+        self.subscription = subscription
+        self.filePath = filePath
+        self.logStartTime = logStartTime
+        self.binary = binary
+        self.columns = columns or subscription.channel.columns
+        self.filterStage = filterStage
+        self.beatDetector = beatDetector
+        self.hostColumn = hostColumn
+        self.clockSync = ClockSync() if hostColumn is not None else None  # Fit of the IMU clock to the host clock.
+        self.beatsFile = None  # Open beats file, if detecting beats.
+        self.beatsWritten = 0  # Beats written to the beats file.
+        valueColumns = self.columns - 1 + (filterStage.channels if filterStage else 0)
+        self.header = dict(header or {}, logStartTime=logStartTime, valueColumns=valueColumns)
+        self.stats = SignalStats(channels=self.columns - 1, window=None)  # Statistics of the raw logged samples.
+        self.pollInterval = pollInterval
+        self.stopEvent = threading.Event()  # Set to finish the log.
+        self.thread = None  # Writer thread.
+        self.lastHostNs = None  # Host time of the last logged row, host times are kept non-decreasing.
+        self.linesWritten = 0  # Rows written to file.
+        self.segmentSeconds = segmentSeconds
+        self.segmentBytes = segmentBytes
+        self.segmented = bool(segmentSeconds or segmentBytes)
+        self.segments = []  # Manifest entry of every segment, the last one is being written if self.file is open.
+        self.file = None  # Open log file or segment.
+        self.openOnData = openOnData
+        self.opened = False  # The log file, or the manifest of a segmented log, was created.
+        self.error = None  # Exception that stopped the writer, None while writing succeeds.
+        # Timer of the writes and count of the bytes written by all writers, see Instrumentation.py.
+        self.writeTimer = profiler.stage('log.write')
+        self.bytesCounter = profiler.counter('log.bytes')
+
+    @property
+    def droppedLines(self) -> int:
+        """
+        Returns:
+            droppedLines (int): Rows lost because the writer fell too far behind.
+        """
+        return self.subscription.dropped
+
+    def start(self):
+        """
+        Open the log file and start the writer thread. For binary logs the header is written immediately. A segmented
+        log starts with an empty manifest, the first segment is opened with the first samples. With openOnData both
+        are created with the first samples instead.
+
+        Raises:
+            OSError: If the log can not be created.
+            ValueError: If the binary log header does not fit in LogFormat.HEADER_SIZE, checked before any file is
+                created.
+        """
+        if self.binary:
+            LogFormat.encodeHeader(self.header)
+        if not self.openOnData:
+            self.__openLog()
+        if self.beatDetector:
+            self.beatsFile = open(LogFormat.beatsPath(self.filePath), 'w')
+        self.thread = threading.Thread(target=self.__writeLoop, name='LogWriter')
+        self.thread.start()
+
+    def stop(self):
+        """
+        Signal the writer thread to write the remaining samples and finish. Returns immediately, the writer thread
+        completes the file in the background.
+        """
+        self.stopEvent.set()
+
+    def join(self, timeout=None):
+        """
+        Wait for the writer thread to finish writing and close the file.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to None (wait indefinitely).
+        """
+        if self.thread:
+            self.thread.join(timeout)
+
+    def __openLog(self):
+        """
+        Create the log file, or the empty manifest of a segmented log.
+        """
+        if self.segmented:
+            self.__writeManifest(complete=False)
+        else:
+            self.file = self.__openFile(self.filePath, self.header)
+        self.opened = True
+
+    def __openFile(self, filePath, header):
+        """
+        Returns:
+            file (IO): The given log file opened for writing, with the header written for binary logs.
+        """
+        if self.binary:
+            file = open(filePath, 'wb')
+            file.write(LogFormat.encodeHeader(header))
+        else:
+            file = open(filePath, 'w')
+        return file
+
+    def __openSegment(self, startNs):
+        """
+        Open the next segment and add it to the manifest.
+
+        Args:
+            startNs (int): Host time of the first row of the segment in nanoseconds.
+        """
+        index = len(self.segments) + 1
+        path = LogFormat.segmentPath(self.filePath, index)
+        self.file = self.__openFile(path, dict(self.header, segment=index))
+        self.segments.append({'file': path.name, 'startNs': startNs, 'endNs': startNs, 'lines': 0, 'bytes': 0,
+                              'complete': False})
+        self.__writeManifest(complete=False)
+
+    def __closeSegment(self):
+        """
+        Flush, fsync and close the current segment, and mark it complete in the manifest.
+        """
+        self.__closeFile()
+        self.segments[-1]['complete'] = True
+        self.__writeManifest(complete=False)
+
+    def __closeFile(self):
+        """
+        Flush the open log file or segment to disk and close it. The file is closed even if the flush fails.
+        """
+        file, self.file = self.file, None
+        try:
+            file.flush()
+            os.fsync(file.fileno())
+            if self.segmented:
+                self.segments[-1]['bytes'] = os.fstat(file.fileno()).st_size
+        finally:
+            file.close()
+
+    def __writeManifest(self, complete):
+        """
+        Atomically replace the manifest of a segmented log: it is written to a temporary file, which is fsync'd and
+        renamed over the old manifest.
+
+        Args:
+            complete (bool): The log was stopped and every segment is closed.
+        """
+        manifest = {
+            'log': Path(self.filePath).name,
+            'binary': self.binary,
+            'logStartTime': self.logStartTime,
+            'segmentSeconds': self.segmentSeconds,
+            'segmentBytes': self.segmentBytes,
+            'complete': complete,
+            'error': str(self.error) if self.error else None,
+            'segments': self.segments
+        }
+        path = LogFormat.manifestPath(self.filePath)
+        temporary = path.with_name(path.name + '.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(manifest, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+    def __writeAvailable(self):
+        """
+        Read all new samples from the subscription and write them to the file as a single chunk. A segment is closed
+        once it reaches the segment time or size, the next one is opened with the next samples.
+        """
+        rows = self.subscription.read()
+        if len(rows) == 0:
+            return
+        if self.clockSync:
+            self.clockSync.update(rows[:, 0], rows[:, self.hostColumn])
+        rows = rows[:, :self.columns]
+        self.stats.update(rows)
+        if self.beatDetector:
+            beats = self.beatDetector.process(rows)
+            if len(beats):
+                self.beatsFile.write(LogFormat.formatTextLines(self.__hostNs(beats[:, 0]), toNs(beats[:, 0]),
+                                                               beats[:, 1:].round(1)))
+                self.beatsFile.flush()
+                self.beatsWritten += len(beats)
+        if self.filterStage:
+            rows = self.filterStage.process(rows)
+            if len(rows) == 0:
+                return
+        hostNs = self.__hostNs(rows[:, 0])
+        if self.lastHostNs is not None:
+            hostNs[0] = max(hostNs[0], self.lastHostNs)
+        hostNs = np.maximum.accumulate(hostNs)
+        self.lastHostNs = int(hostNs[-1])
+        if not self.opened:
+            self.__openLog()
+        if self.segmented and self.file is None:
+            self.__openSegment(int(hostNs[0]))
+        if self.binary:
+            chunk = LogFormat.encodeChunk(hostNs, toNs(rows[:, 0]), rows[:, 1:])
+        else:
+            chunk = LogFormat.formatTextLines(hostNs, toNs(rows[:, 0]), rows[:, 1:])
+        self.file.write(chunk)
+        self.file.flush()
+        self.linesWritten += len(rows)
+        self.bytesCounter.add(len(chunk))
+
+        if self.segmented:
+            segment = self.segments[-1]
+            segment['endNs'] = self.lastHostNs
+            segment['lines'] += len(rows)
+            segment['bytes'] = os.fstat(self.file.fileno()).st_size
+            if (self.segmentBytes and segment['bytes'] >= self.segmentBytes) or (
+                    self.segmentSeconds and self.lastHostNs - segment['startNs'] >= self.segmentSeconds * 1e9):
+                self.__closeSegment()
+
+    def __hostNs(self, timestamps):
+        """
+        Returns:
+            hostNs (np.ndarray): int64 corrected wall clock times in nanoseconds of the given timestamps.
+        """
+        return self.clockSync.wallTimesNs(timestamps) if self.clockSync else toNs(timestamps)
+
+    def __writeStats(self):
+        """
+        Record the signal statistics of the log, with the final fit of the IMU clock if it was synchronised. Binary
+        logs have their header rewritten with the statistics added, if they do not fit in the header (e.g. a merged
+        log of many IMUs) they are written to a JSON file like for text and segmented logs.
+        """
+        stats = self.stats.summary()
+        if stats.get('flags'):
+            print(f'Signal problems in the log: {", ".join(stats["flags"])}.')
+        if self.clockSync:
+            stats['clockSync'] = self.clockSync.describe()
+        if self.binary and not self.segmented:
+            try:
+                header = LogFormat.encodeHeader(dict(self.header, stats=stats))
+                self.file.seek(0)
+                self.file.write(header)
+                return
+            except ValueError as e:
+                print(f'{e} Statistics written to {LogFormat.statsPath(self.filePath)}.')
+        with open(LogFormat.statsPath(self.filePath), 'w') as statsFile:
+            json.dump(stats, statsFile, indent=2)
+
+    def __writeLoop(self):
+        """
+        Writer thread. Writes new samples every poll interval until stopped, then writes what is left and completes the
+        log. Any error (e.g. OSError from a full disk, or a bug in encoding a chunk) stops the writer early and is kept
+        in self.error, the log is still completed, see __complete().
+        """
+        try:
+            while not self.stopEvent.wait(self.pollInterval):
+                with self.writeTimer.measure():
+                    self.__writeAvailable()
+            self.__writeAvailable()
+        except Exception as e:
+            self.error = e
+            print(f'Error writing {self.filePath}, logging stopped: {e}')
+        finally:
+            self.__complete()
+            if self.droppedLines:
+                print(f'Log writer fell behind, {self.droppedLines} lines were dropped.')
+            if self.opened:
+                print(f'Log file {"stopped" if self.error else "completed"}. {self.linesWritten} lines written to '
+                      f'{self.filePath}.')
+            else:
+                print(f'No samples arrived, {self.filePath} was not created.')
+
+    def __complete(self):
+        """
+        Write the statistics and close the file, or the last segment and the manifest, and the beats file. Every step is
+        attempted even if an earlier one fails, so as much of the log as possible is usable. The first error is kept in
+        self.error. A log that was never created (see openOnData) is left out.
+        """
+        for step in (self.__writeStats, self.__closeLog, self.__closeBeats) if self.opened else (self.__closeBeats,):
+            try:
+                step()
+            except Exception as e:
+                self.error = self.error or e
+                print(f'Error completing {self.filePath}: {e}')
+
+    def __closeLog(self):
+        """
+        Close the log file, or the last segment and write the final manifest.
+        """
+        if self.segmented:
+            try:
+                if self.file:
+                    self.__closeSegment()
+            finally:
+                self.__writeManifest(complete=True)
+            print(f'{len(self.segments)} segments listed in {LogFormat.manifestPath(self.filePath)}.')
+        elif self.file:
+            self.__closeFile()
+
+    def __closeBeats(self):
+        """
+        Close the beats file, if detecting beats.
+        """
+        if self.beatsFile:
+            self.beatsFile.close()
+            print(f'{self.beatsWritten} beats written to {LogFormat.beatsPath(self.filePath)}.')
@@ -9,10 +9,15 @@ class Menu:
         # Set initial values
         self.imuConnected = False
         self.imuImenu = None
+        self.viewerOpen = False
+        self.liveStreaming = False
+        self.logMenu = None
+        self.overlayShown = False
+        self.toolsMenu = None
         # Initial creation of menus.
         self.__generateMenus()
 
-    def getMenu(self, imuConnected=False):
+    def getMenu(self, imuConnected=False, viewerOpen=False, liveStreaming=False, overlayShown=False):
         """
         Return the current menu bar based on the parameter values given. The local parameter values are updated based on
         the given parameters and the menu(s) are generated. The generated menus are combined into a single menu bar
@@ -20,16 +25,22 @@ class Menu:
 
         Args:
             imuConnected (bool): True if IMU object is connected, else False.
+            viewerOpen (bool): True if a log is open in the log viewer, else False.
+            liveStreaming (bool): True if the live stream server is running, else False.
+            overlayShown (bool): True if the performance overlay is shown, else False.
 
         Returns:
             menuFinal (list): Final menu layout.
         """
         # Local variable update.
         self.imuConnected = imuConnected
+        self.viewerOpen = viewerOpen
+        self.liveStreaming = liveStreaming
+        self.overlayShown = overlayShown
         # Generate menus.
         self.__generateMenus()
 
-        menuFinal = [self.imuImenu]
+        menuFinal = [self.imuImenu, self.logMenu, self.toolsMenu]
         # Return menu bar layout.
         return menuFinal
 
@@ -42,7 +53,8 @@ class Menu:
                                     return rate cannot be changed and the acceleration cannot be calibrated, so these
                                     options are disabled.
         True (post connection):     Menu to show when the IMU has been connected, enabling return rate and acceleration
-                                    calibration.
+                                    calibration. Further IMUs can be added, the settings are applied to all connected
+                                    IMUs. The live stream to other processes can be started or stopped.
         """
         if not self.imuConnected:
             self.imuImenu = ['IMU', ['Connect::-MENU-IMU-CONNECT-',
@@ -54,13 +66,39 @@ class Menu:
                              ]
         if self.imuConnected:
             self.imuImenu = ['IMU', ['Disconnect::-MENU-IMU-DISCONNECT-',
+                                     'Add IMU::-MENU-IMU-ADD-',
                                      '---',
                                      'Set Return Rate', [f'{i}::-MENU-IMU-RATE-' for i in c.IMU_RATE_OPTIONS],
                                      'Set Bandwidth', [f'{i}::-MENU-IMU-BANDWIDTH-' for i in c.IMU_BANDWIDTH_OPTIONS],
                                      'Set Algorithm', [f'{i}::-MENU-IMU-ALGORITHM-' for i in c.IMU_ALGORITHM_OPTIONS],
-                                     'Calibrate Acceleration::-MENU-IMU-CALIBRATE-']
+                                     'Calibrate Acceleration::-MENU-IMU-CALIBRATE-',
+                                     '---',
+                                     f'{"Stop" if self.liveStreaming else "Start"} Live Stream::-MENU-IMU-LIVE-']
                              ]
 
+    def __generateLogMenu(self):
+        """
+        Function for creating the log menu based on the state of the log viewer. For viewing recorded logs in place of
+        the live plot. if self.viewerOpen:
+
+        False (initial state):      A log can be opened, the live plot is shown.
+        True (log open):            Another log can be opened, or the viewer closed to return to the live plot.
+        """
+        self.logMenu = ['Log', ['Open Log Viewer::-MENU-LOG-OPEN-',
+                                'Close Log Viewer::-MENU-LOG-CLOSE-' if self.viewerOpen else
+                                '!Close Log Viewer::-MENU-LOG-CLOSE-']
+                        ]
+
+    def __generateToolsMenu(self):
+        """
+        Function for creating the tools menu, for finding the cause of a slow GUI. The performance overlay shows the
+        timers and counters of Instrumentation.py below the plot, the recorded events can be exported as a trace.
+        """
+        overlayAction = 'Hide' if self.overlayShown else 'Show'
+        self.toolsMenu = ['Tools', [f'{overlayAction} Performance Overlay::-MENU-PERF-OVERLAY-',
+                                    'Export Performance Trace::-MENU-PERF-TRACE-']
+                          ]
+
     def __generateMenus(self):
         """
         Function to call individual menu generating functions. More menus can be added, which now only require a single
@@ -68,3 +106,7 @@ class Menu:
         """
         # IMU Menu.
         self.__generateImuMenu()
+        # Log Menu.
+        self.__generateLogMenu()
+        # Tools Menu.
+        self.__generateToolsMenu()
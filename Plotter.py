@@ -0,0 +1,244 @@
+"""
+Real-time plot renderer for the IMU acceleration traces, or the traces of another channel of the IMU.
+"""
+import numpy as np
+
+import Decimation
+from Instrumentation import profiler
+
+# Colour and legend label of each plotted trace, in plot buffer column order.
+TRACES = [
+    ('darkturquoise', 'X Acceleration'),
+    ('red', 'Y Acceleration'),
+    ('lime', 'Z Acceleration'),
+    ('magenta', 'Acceleration Norm'),
+    ('orange', 'Filtered X'),
+    ('gold', 'Filtered Y'),
+    ('white', 'Filtered Z')
+]
+
+
+class Plotter:
+    """
+    Renders the acceleration traces using blitting. The Line2D artists are created once and updated with set_data().
+    The static parts of the plot (axes, grid, labels, legend) are drawn once and cached as a background image, each
+    frame restores the background and draws only the traces on top of it.
+
+    A full redraw of the figure is only done when the axis limits change or a trace is shown/hidden. Limits are
+    changed with some headroom so that they do not change on every frame while the plot buffer fills up.
+
+    The traces are min/max decimated to the pixel width of the axes before drawing, so the cost of a frame does not
+    depend on the number of points in the plot buffer.
+
+    With several IMUs the figure has one axes per IMU, stacked vertically with a shared time axis. Each axes has its
+    own y-limits.
+    """
+
+    def __init__(self, figure, axesCount=1):
+        """
+        Create the axes and line artists on the given figure. setCanvas() must be called before the first update.
+
+        Args:
+            figure (Figure): Matplotlib figure to draw on.
+            axesCount (int, optional): Number of stacked axes, one per IMU. Defaults to 1.
+        """
+        self.figure = figure
+        self.canvas = None
+        self.background = None  # Cached image of the static parts of the plot.
+        self.redrawCounter = profiler.counter('plot.redraws')  # Full redraws, see Instrumentation.py.
+        self.axes = []  # One axes per IMU, top to bottom.
+        self.lines = []  # Line artists of each axes, in TRACES order.
+        self.yLimits = []  # [yMin, yMax] of each axes.
+        self.visibility = tuple(True for _ in TRACES)
+        self.xMax = 1.0
+        self.quantity = 'Acceleration'  # Plotted quantity and its unit, for the y-axis labels.
+        self.unit = 'm/s^2'
+        self.labels = [label for _, label in TRACES]  # Legend labels of the traces.
+        self.__createAxes(axesCount)
+
+    def __createAxes(self, axesCount):
+        """
+        Remove any existing axes and create the stacked axes and their line artists.
+
+        Args:
+            axesCount (int): Number of stacked axes.
+        """
+        self.figure.clear()
+        self.axes = []
+        self.lines = []
+        self.yLimits = []
+        height = 0.9 / axesCount
+        for i in range(axesCount):
+            ax = self.figure.add_axes((0.1, 0.1 + (axesCount - 1 - i) * height, 0.9, height),
+                                      sharex=self.axes[0] if self.axes else None)
+            ax.set_facecolor('black')
+            unit = f' [{self.unit}]' if self.unit else ''
+            ax.set_ylabel(f'{self.quantity}{unit}' if axesCount == 1 else f'IMU {i + 1}{unit}')
+            ax.grid()
+            if i < axesCount - 1:
+                ax.tick_params(labelbottom=False)
+            lines = [ax.plot([], [], color=colour, animated=True)[0] for colour, _ in TRACES]
+            for line, visible in zip(lines, self.visibility):
+                line.set_visible(visible)
+            ax.set_ylim(-1.0, 1.0)
+            self.axes.append(ax)
+            self.lines.append(lines)
+            self.yLimits.append([-1.0, 1.0])
+        self.axes[0].legend(self.lines[0], self.labels, loc='upper right')
+        self.axes[-1].set_xlabel('Time [s]')
+        self.xMax = 1.0
+        self.axes[0].set_xlim(0, self.xMax)
+        self.background = None
+
+    def setAxesCount(self, axesCount):
+        """
+        Change the number of stacked axes, e.g. when an IMU is added. The figure is redrawn.
+
+        Args:
+            axesCount (int): Number of stacked axes.
+        """
+        if axesCount != len(self.axes):
+            self.__createAxes(axesCount)
+            if self.canvas:
+                self.canvas.draw()
+
+    def setLabels(self, quantity=None, unit=None, labels=None):
+        """
+        Label the plot for another quantity, e.g. another channel of the IMU. The axes are recreated and the figure is
+        redrawn. Without arguments the acceleration labels are restored.
+
+        Args:
+            quantity (str, optional): Plotted quantity. Defaults to None (acceleration).
+            unit (str, optional): Unit of the plotted values. Defaults to None (m/s^2).
+            labels (list[str], optional): Legend labels of the leading traces, the other traces keep their labels of
+                TRACES. Defaults to None.
+        """
+        self.quantity = quantity or 'Acceleration'
+        self.unit = unit if quantity else 'm/s^2'
+        self.labels = [label for _, label in TRACES]
+        self.labels[:len(labels or [])] = labels or []
+        self.__createAxes(len(self.axes))
+        if self.canvas:
+            self.canvas.draw()
+
+    def setCanvas(self, canvas):
+        """
+        Set the canvas the figure is drawn on. The background is recaptured whenever the canvas does a full draw, e.g.
+        when the window is resized.
+
+        Args:
+            canvas (FigureCanvasBase): Canvas of the figure, e.g. FigureCanvasTkAgg or FigureCanvasAgg.
+        """
+        self.canvas = canvas
+        self.canvas.mpl_connect('draw_event', self.__onDraw)
+        self.canvas.draw()
+
+    def update(self, datasets, visibility, xLimits=None):
+        """
+        Update the plot with new data.
+
+        Args:
+            datasets (list[tuple[np.ndarray, np.ndarray]]): (t, traces) of each axes, where t are the times of the
+                samples in seconds, shape (n,), and traces the trace values, shape (n, len(TRACES)), columns in TRACES
+                order.
+            visibility (tuple[bool]): Whether each trace is shown.
+            xLimits (tuple[float, float], optional): Limits of the time axis, e.g. the range shown by a LogViewer.
+                Defaults to None (from 0 to the last sample, with headroom).
+        """
+        redraw = False
+        if visibility != self.visibility:
+            self.visibility = visibility
+            for lines in self.lines:
+                for line, visible in zip(lines, visibility):
+                    line.set_visible(visible)
+                    if not visible:
+                        line.set_data([], [])
+            redraw = True
+
+        if xLimits is not None:
+            if tuple(xLimits) != self.axes[0].get_xlim():
+                self.axes[0].set_xlim(*xLimits)
+                # Recompute the live limit on the next update without limits.
+                self.xMax = np.inf
+                redraw = True
+        elif datasets and self.__updateXLimit(max(t[-1] if len(t) else 0.0 for t, _ in datasets)):
+            redraw = True
+        for index, (t, traces) in enumerate(datasets[:len(self.axes)]):
+            tPlot, tracesPlot = Decimation.minMaxDecimate(t, traces, self.axes[index].bbox.width)
+            for i, line in enumerate(self.lines[index]):
+                if visibility[i]:
+                    line.set_data(tPlot if tPlot.ndim == 1 else tPlot[:, i], tracesPlot[:, i])
+
+            # Decimation keeps the extremes, so the limits can be found from the decimated traces.
+            if self.__updateYLimits(index, tracesPlot, visibility):
+                redraw = True
+
+        if redraw or self.background is None:
+            # Full redraw, the draw event recaptures the background.
+            self.redrawCounter.add()
+            self.canvas.draw()
+        self.__blit()
+
+    def __updateXLimit(self, tEnd) -> bool:
+        """
+        Update the shared time axis limit if the data no longer fits, or uses much less of the plot than it did.
+
+        Args:
+            tEnd (float): Time of the last sample in seconds.
+
+        Returns:
+            changed (bool): True if the limit was changed.
+        """
+        if tEnd > self.xMax or tEnd < 0.5 * self.xMax:
+            self.xMax = max(tEnd * 1.1, 1.0)
+            self.axes[0].set_xlim(0, self.xMax)
+            return True
+        return False
+
+    def __updateYLimits(self, index, traces, visibility) -> bool:
+        """
+        Update the y-limits of an axes if the data no longer fits, or uses much less of the plot than it did.
+
+        Args:
+            index (int): Index of the axes.
+            traces (np.ndarray): Trace values, shape (m, len(TRACES)).
+            visibility (tuple[bool]): Whether each trace is shown.
+
+        Returns:
+            changed (bool): True if the limits were changed.
+        """
+        columns = [i for i, visible in enumerate(visibility) if visible]
+        if not columns or len(traces) == 0:
+            return False
+        shown = traces[:, columns]
+        finite = shown[np.isfinite(shown)]
+        if len(finite) == 0:
+            # E.g. a stream of a merger that has not delivered samples yet.
+            return False
+        low = float(finite.min())
+        high = float(finite.max())
+        span = max(high - low, 0.1)
+        yMin, yMax = self.yLimits[index]
+        if low < yMin or high > yMax or span < 0.5 * (yMax - yMin):
+            self.yLimits[index] = [low - 0.1 * span, high + 0.1 * span]
+            self.axes[index].set_ylim(*self.yLimits[index])
+            return True
+        return False
+
+    def __onDraw(self, event):
+        """
+        Capture the background after a full draw of the canvas. The animated traces are not part of a full draw.
+        """
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    def __blit(self):
+        """
+        Restore the cached background, draw the traces on top and blit the result to the screen.
+        """
+        self.canvas.restore_region(self.background)
+        for ax, lines in zip(self.axes, self.lines):
+            for line in lines:
+                if line.get_visible():
+                    ax.draw_artist(line)
+        self.canvas.blit(self.figure.bbox)
+        self.canvas.flush_events()
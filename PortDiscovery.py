@@ -0,0 +1,247 @@
+"""
+Discovery of the COM ports that a Witmotion IMU is actually sending on. Every serial port is probed in its own thread,
+so a Bluetooth port that takes many seconds to open does not hold up the others. Running this file prints the ranked
+ports:
+
+    python PortDiscovery.py [--timeout 15]
+
+The last port and baud rate an IMU delivered data on are stored (see saveLastPort()), they are probed first and used as
+the defaults of the connect window, so reconnecting to the same IMU needs no search.
+"""
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+
+import serial
+import serial.tools.list_ports
+
+import constants as c
+from WitmotionParser import FRAME_LENGTH, WitmotionParser
+
+# Witmotion IMUs ship at 115200 or 9600 baud, so these are tried before the other common rates.
+DEFAULT_BAUD_RATES = (115200, 9600)
+
+
+def loadLastPort(filePath=None) -> tuple:
+    """
+    Args:
+        filePath (Path, optional): File with the last port. Defaults to constants.LAST_PORT_FILE in the working
+            directory.
+
+    Returns:
+        lastPort (tuple[str, int]): (COM port, baud rate) an IMU last delivered data on, None if unknown.
+    """
+    try:
+        with open(filePath or Path(Path.cwd(), c.LAST_PORT_FILE), 'r') as file:
+            lastPort = json.load(file)
+        return str(lastPort['port']), int(lastPort['baudRate'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def saveLastPort(port, baudRate, filePath=None):
+    """
+    Store the port and baud rate an IMU delivered data on.
+
+    Args:
+        port (str): COM port.
+        baudRate (int): Baud rate.
+        filePath (Path, optional): File with the last port. Defaults to constants.LAST_PORT_FILE in the working
+            directory.
+    """
+    if (port, baudRate) == loadLastPort(filePath):
+        return
+    try:
+        with open(filePath or Path(Path.cwd(), c.LAST_PORT_FILE), 'w') as file:
+            json.dump({'port': port, 'baudRate': baudRate}, file)
+    except OSError as e:
+        print(f'Error storing the last port: {e}')
+
+
+def baudRateOrder(baudRates, first=None) -> list:
+    """
+    Returns:
+        baudRates (list[int]): The baud rates in the order they are probed: the given first rate, the Witmotion
+            defaults, then the others from fast to slow.
+    """
+    preferred = [first] + list(DEFAULT_BAUD_RATES)
+    ordered = [rate for rate in preferred if rate in baudRates]
+    return list(dict.fromkeys(ordered + sorted(baudRates, reverse=True)))
+
+
+class PortDiscovery:
+    """
+    Probes serial ports for a Witmotion IMU. Each port has a probe thread that opens it at one baud rate after the
+    other, listens for the listen time and decodes what arrived with a WitmotionParser. A baud rate at which at least
+    constants.DISCOVERY_MIN_FRAMES frames with a valid 0x55 header, type and checksum arrive is the IMU's, the other
+    rates of that port are not tried. A port can only be opened once at a time, so the baud rates of a port are probed
+    one after the other, the ports in parallel.
+
+    The ports that responded are ranked by the fraction of the received bytes that formed valid frames (close to 1 at
+    the right baud rate, random data almost never forms a frame) and then by their frame rate. Probes that are still
+    opening a port when the discovery is stopped are abandoned, their daemon threads end once the open returns.
+    """
+
+    def __init__(self, ports=None, baudRates=c.COMMON_BAUD_RATES, listenTime=c.DISCOVERY_LISTEN_SECONDS,
+                 lastPort=None):
+        """
+        Initialise a PortDiscovery. Nothing is probed until start() is called.
+
+        Args:
+            ports (list[str], optional): Ports to probe. Defaults to None (every serial port of the computer).
+            baudRates (list[int], optional): Baud rates to probe. Defaults to constants.COMMON_BAUD_RATES.
+            listenTime (float, optional): Time listened at each baud rate in seconds. Defaults to
+                constants.DISCOVERY_LISTEN_SECONDS.
+            lastPort (tuple[str, int], optional): (port, baud rate) an IMU last delivered data on, its baud rate is
+                probed first on its port. Defaults to None.
+        """
+        if ports is None:
+            ports = sorted(port for port, _, _ in serial.tools.list_ports.comports())
+        self.ports = list(ports)
+        self.baudRates = list(baudRates)
+        self.listenTime = listenTime
+        self.lastPort = lastPort
+        self.status = {port: 'Waiting' for port in self.ports}  # Progress of the probe of each port.
+        self.found = {}  # Result of every port an IMU responded on, see results().
+        self.lock = threading.Lock()  # Guards self.status and self.found, which the probe threads write.
+        self.stopEvent = threading.Event()
+        self.threads = []
+        self.startTime = None
+
+    def start(self):
+        """
+        Start a probe thread for every port.
+        """
+        self.startTime = time.monotonic()
+        self.threads = [threading.Thread(target=self.__probe, args=(port,), name=f'PortDiscovery {port}', daemon=True)
+                        for port in self.ports]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stop probing. Returns immediately, probes that are opening a port end once the open returns.
+        """
+        self.stopEvent.set()
+
+    @property
+    def done(self) -> bool:
+        """
+        Returns:
+            done (bool): True once every probe has finished.
+        """
+        return all(not thread.is_alive() for thread in self.threads)
+
+    def wait(self, timeout=None) -> bool:
+        """
+        Wait for every probe to finish.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to None (wait indefinitely).
+
+        Returns:
+            done (bool): True if every probe finished.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        return self.done
+
+    def results(self) -> list:
+        """
+        Returns:
+            results (list[dict]): Port, baud rate, valid frames, frame rate, fraction of the bytes in valid frames,
+                channels sent and time to find of every port an IMU responded on, best first.
+        """
+        with self.lock:
+            found = list(self.found.values())
+        return sorted(found, key=lambda result: (-round(result['validFraction'], 1), -result['frameRate']))
+
+    def __setStatus(self, port, status):
+        with self.lock:
+            self.status[port] = status
+
+    def __probe(self, port):
+        """
+        Probe thread of a port. Tries the baud rates until the IMU responds, the port can not be opened or the
+        discovery is stopped.
+
+        Args:
+            port (str): Port to probe.
+        """
+        first = self.lastPort[1] if self.lastPort and self.lastPort[0] == port else None
+        for baudRate in baudRateOrder(self.baudRates, first):
+            if self.stopEvent.is_set():
+                self.__setStatus(port, 'Stopped')
+                return
+            self.__setStatus(port, f'Probing {baudRate}')
+            try:
+                with serial.Serial(port, baudrate=baudRate, timeout=0.05) as ser:
+                    parser = WitmotionParser()
+                    received = 0
+                    channels = set()
+                    start = time.monotonic()
+                    while time.monotonic() - start < self.listenTime and not self.stopEvent.is_set():
+                        data = ser.read(4096)
+                        received += len(data)
+                        channels.update(parser.feed(data))
+                    listened = time.monotonic() - start
+            except (serial.SerialException, OSError, ValueError) as e:
+                # The port is missing or in use, the other baud rates would fail the same way.
+                self.__setStatus(port, f'Error: {e}')
+                return
+            if parser.frameCount >= c.DISCOVERY_MIN_FRAMES:
+                result = {'port': port, 'baudRate': baudRate, 'frames': parser.frameCount,
+                          'frameRate': round(parser.frameCount / max(listened, 1e-3), 1),
+                          'validFraction': round(parser.frameCount * FRAME_LENGTH / received, 3),
+                          'channels': sorted(channels), 'seconds': round(time.monotonic() - self.startTime, 2)}
+                with self.lock:
+                    self.found[port] = result
+                    self.status[port] = f'IMU at {baudRate}'
+                return
+        self.__setStatus(port, 'No IMU')
+
+
+def discover(ports=None, timeout=c.DISCOVERY_TIMEOUT, lastPort=None) -> list:
+    """
+    Probe the ports for an IMU and wait for the result.
+
+    Args:
+        ports (list[str], optional): Ports to probe. Defaults to None (every serial port of the computer).
+        timeout (float, optional): Time after which ports that have not answered are given up, in seconds. Defaults
+            to constants.DISCOVERY_TIMEOUT.
+        lastPort (tuple[str, int], optional): (port, baud rate) probed first. Defaults to None (the stored last
+            port).
+
+    Returns:
+        results (list[dict]): The ports an IMU responded on, best first, see PortDiscovery.results().
+    """
+    discovery = PortDiscovery(ports, lastPort=lastPort or loadLastPort())
+    discovery.start()
+    discovery.wait(timeout)
+    discovery.stop()
+    return discovery.results()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ports', nargs='*', help='Ports to probe. Defaults to every serial port.')
+    parser.add_argument('--timeout', type=float, default=c.DISCOVERY_TIMEOUT,
+                        help='Seconds after which ports that have not answered are given up.')
+    args = parser.parse_args()
+    discovery = PortDiscovery(args.ports or None, lastPort=loadLastPort())
+    print(f'Probing {len(discovery.ports)} ports...')
+    discovery.start()
+    discovery.wait(args.timeout)
+    discovery.stop()
+    for port, status in discovery.status.items():
+        print(f'{port}: {status}')
+    for rank, result in enumerate(discovery.results(), 1):
+        print(f'{rank}. {result["port"]} at {result["baudRate"]}: {result["frameRate"]} frames/s, '
+              f'{100 * result["validFraction"]:.0f}% valid, channels {", ".join(result["channels"])}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Measurement of the IMU's actual return rate and timing jitter from the sample timestamps. The IMU does not confirm
+configuration commands, so the measured rate is the only way to know whether a new return rate was accepted.
+"""
+import threading
+
+import numpy as np
+
+
+class RateMonitor:
+    """
+    Running estimate of the interval between samples and its jitter (standard deviation), from exponentially weighted
+    moving averages of the timestamp deltas. A block of timestamps is folded into the averages with vectorised weights,
+    so the cost per sample is constant and no history is kept. The weighted sums are divided by the sum of the
+    weights, so the first intervals after a reset are averaged normally instead of being biased towards a start value.
+
+    Repeated timestamps (e.g. time frames sent less often than acceleration frames) are included as zero intervals, so
+    the mean interval stays correct, but show up as jitter. Negative intervals and gaps longer than maxGap (e.g. a
+    lost connection) are left out and counted as gaps.
+
+    After expectRate() (a return rate command) the estimate is restarted once the settle time has passed, and the
+    measured rate is compared with the expected one after minSamples intervals.
+
+    update() is called on the receive thread, reset(), expectRate() and summary() on the GUI thread, so they take a lock
+    and a reset can not interleave with an update.
+    """
+
+    def __init__(self, alpha=0.005, tolerance=0.1, settleTime=0.5, minSamples=10, maxGap=1.0):
+        """
+        Args:
+            alpha (float, optional): Fraction by which the weight of older intervals decays with each new interval,
+                the estimate follows roughly the last 1 / alpha intervals. Defaults to 0.005.
+            tolerance (float, optional): Relative difference between the measured and expected rate that is reported
+                as a mismatch. Defaults to 0.1.
+            settleTime (float, optional): Time after expectRate() during which intervals are ignored, while samples
+                at the old rate may still arrive. Defaults to 0.5 seconds.
+            minSamples (int, optional): Intervals needed before the rate is compared. Defaults to 10.
+            maxGap (float, optional): Longest interval in seconds that is not a gap. Defaults to 1.
+        """
+        self.alpha = alpha
+        self.tolerance = tolerance
+        self.settleTime = settleTime
+        self.minSamples = minSamples
+        self.maxGap = maxGap
+        self.expectedRate = None  # Rate requested from the IMU in Hz, None if unknown.
+        self.mismatch = False  # The measured rate differs from the expected rate.
+        self.gaps = 0  # Intervals left out as gaps.
+        self.lock = threading.Lock()  # Guards the estimate, see the class docstring.
+        self.__reset()
+
+    def reset(self):
+        """
+        Restart the estimate.
+        """
+        with self.lock:
+            self.__reset()
+
+    def __reset(self):
+        """
+        Restart the estimate, the lock must be held.
+        """
+        self.lastTimestamp = None
+        self.weightSum = 0.0  # Sum of the weights of the intervals.
+        self.intervalSum = 0.0  # Weighted sum of the intervals.
+        self.varianceSum = 0.0  # Weighted sum of the squared deviations from the mean interval.
+        self.meanInterval = None  # Weighted mean interval in seconds.
+        self.variance = 0.0  # Weighted variance of the intervals in seconds^2.
+        self.intervals = 0  # Intervals in the estimate.
+        self.settleUntil = None  # Timestamp until which intervals are ignored.
+        self.settling = False  # expectRate() was called and the settle time has not started yet.
+
+    def expectRate(self, rate):
+        """
+        Set the rate the IMU should now return, e.g. after a return rate command. The estimate is restarted after the
+        settle time and the rate is checked again.
+
+        Args:
+            rate (float): Expected rate in Hz.
+        """
+        with self.lock:
+            self.__reset()
+            self.expectedRate = rate
+            self.mismatch = False
+            self.settling = True
+
+    def update(self, timestamps):
+        """
+        Add the timestamps of new samples.
+
+        Args:
+            timestamps (float | np.ndarray): Timestamp of a sample, or timestamps of a block of samples, in seconds.
+        """
+        t = np.atleast_1d(np.asarray(timestamps, dtype=np.float64))
+        if len(t) == 0:
+            return
+        with self.lock:
+            self.__update(t)
+
+    def __update(self, t):
+        """
+        Add the timestamps of new samples, the lock must be held.
+
+        Args:
+            t (np.ndarray): Timestamps in seconds, at least one.
+        """
+        if self.settling:
+            self.settling = False
+            self.settleUntil = t[0] + self.settleTime
+        if self.settleUntil is not None:
+            if t[-1] < self.settleUntil:
+                return
+            t = t[t >= self.settleUntil]
+            self.settleUntil = None
+            self.lastTimestamp = None
+
+        if self.lastTimestamp is not None:
+            t = np.concatenate(([self.lastTimestamp], t))
+        self.lastTimestamp = float(t[-1])
+        deltas = np.diff(t)
+        valid = (deltas >= 0) & (deltas <= self.maxGap)
+        self.gaps += int(len(deltas) - valid.sum())
+        deltas = deltas[valid]
+        n = len(deltas)
+        if n == 0:
+            return
+
+        weights = (1 - self.alpha) ** np.arange(n - 1, -1, -1)
+        keep = (1 - self.alpha) ** n
+        self.weightSum = keep * self.weightSum + float(weights.sum())
+        self.intervalSum = keep * self.intervalSum + float(weights @ deltas)
+        self.meanInterval = self.intervalSum / self.weightSum
+        self.varianceSum = keep * self.varianceSum + float(weights @ (deltas - self.meanInterval) ** 2)
+        self.variance = self.varianceSum / self.weightSum
+        self.intervals += n
+
+        if self.expectedRate and self.intervals >= self.minSamples and self.rate:
+            mismatch = abs(self.rate - self.expectedRate) > self.tolerance * self.expectedRate
+            if mismatch and not self.mismatch:
+                print(f'Measured return rate {self.rate:.1f}Hz does not match the requested {self.expectedRate}Hz.')
+            self.mismatch = mismatch
+
+    @property
+    def rate(self):
+        """
+        Returns:
+            rate (float): Measured rate in Hz, None if not measured yet.
+        """
+        return 1 / self.meanInterval if self.meanInterval else None
+
+    @property
+    def jitter(self):
+        """
+        Returns:
+            jitter (float): Standard deviation of the intervals in seconds, None if not measured yet.
+        """
+        return float(np.sqrt(self.variance)) if self.meanInterval is not None else None
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            timing (dict): JSON serialisable measured rate (Hz), jitter (ms), expected rate, mismatch flag and gaps.
+        """
+        with self.lock:
+            return {
+                'rate': round(self.rate, 2) if self.rate else None,
+                'jitterMs': round(self.jitter * 1000, 3) if self.jitter is not None else None,
+                'expectedRate': self.expectedRate,
+                'mismatch': self.mismatch,
+                'gaps': self.gaps
+            }
@@ -0,0 +1,104 @@
+"""
+Fixed capacity, array-backed ring buffer used to hold the most recent IMU samples for plotting.
+"""
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Ring buffer of rows with a fixed number of columns, backed by a single preallocated NumPy array. Every row is
+    written twice, once at its ring position and once at the same position offset by the capacity. This mirroring
+    means the stored samples are always available as one contiguous slice, so getView() can return an ordered view
+    without copying or rebuilding any arrays.
+
+    Rows are written in place, nothing is allocated per sample. Resizing keeps the most recent rows.
+    """
+
+    def __init__(self, capacity=1000, columns=5):
+        """
+        Initialise an empty ring buffer.
+
+        Args:
+            capacity (int, optional): Maximum number of rows stored. Defaults to 1000.
+            columns (int, optional): Number of columns per row. Defaults to 5 (timestamp, ax, ay, az, norm).
+        """
+        self.columns = columns
+        self.capacity = max(int(capacity), 1)
+        self.data = np.zeros((2 * self.capacity, self.columns))
+        self.index = 0  # Ring position the next row will be written to.
+        self.count = 0  # Number of valid rows currently stored.
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row):
+        """
+        Write a single row into the buffer, overwriting the oldest row if the buffer is full.
+
+        Args:
+            row (sequence[float]): Row of length self.columns.
+        """
+        self.data[self.index] = row
+        self.data[self.index + self.capacity] = row
+        self.index += 1
+        if self.index == self.capacity:
+            self.index = 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    def extend(self, rows):
+        """
+        Write a block of rows into the buffer. Only the last self.capacity rows of the block are kept.
+
+        Args:
+            rows (np.ndarray): Array of shape (n, self.columns).
+        """
+        rows = rows[-self.capacity:]
+        n = len(rows)
+        if n == 0:
+            return
+        first = min(n, self.capacity - self.index)
+        self.data[self.index:self.index + first] = rows[:first]
+        self.data[self.index + self.capacity:self.index + self.capacity + first] = rows[:first]
+        if n > first:
+            self.data[:n - first] = rows[first:]
+            self.data[self.capacity:self.capacity + n - first] = rows[first:]
+        self.index = (self.index + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def getView(self) -> np.ndarray:
+        """
+        Return the stored rows in order, oldest first, as a view into the underlying array. The view is only valid
+        until the buffer is next written to or resized.
+
+        Returns:
+            view (np.ndarray): Array of shape (len(self), self.columns).
+        """
+        start = self.index - self.count
+        if start < 0:
+            start += self.capacity
+        return self.data[start:start + self.count]
+
+    def resize(self, capacity):
+        """
+        Change the capacity of the buffer, keeping the most recent rows that still fit.
+
+        Args:
+            capacity (int): New maximum number of rows.
+        """
+        capacity = max(int(capacity), 1)
+        if capacity == self.capacity:
+            return
+        keep = self.getView()[-capacity:].copy()
+        self.capacity = capacity
+        self.data = np.zeros((2 * self.capacity, self.columns))
+        self.index = 0
+        self.count = 0
+        self.extend(keep)
+
+    def clear(self):
+        """
+        Remove all rows from the buffer. The underlying array is kept.
+        """
+        self.index = 0
+        self.count = 0
@@ -4,18 +4,31 @@ Main class for logging accelerations for a heart rate monitor.
 
 import PySimpleGUI as sg
 import time
-import numpy as np
 import subprocess
+import constants as c
 import IMU
 import Layout
+import LogFormat
+import LogViewer
 import Menu
+import Plotter
 import styling as st
 import os
+import PortDiscovery
+from ConnectionManager import ConnectionManager
+from FrameScheduler import FrameScheduler
+from Instrumentation import profiler
+from LiveStream import LiveServer
+from StreamMerger import StreamMerger
 from pathlib import Path
 from datetime import datetime
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+# Check boxes of the traces of Plotter.TRACES, in order.
+TRACE_BOXES = ('-BOX-ACC-X-', '-BOX-ACC-Y-', '-BOX-ACC-Z-', '-BOX-ACC-NORM-', '-BOX-FILT-X-', '-BOX-FILT-Y-',
+               '-BOX-FILT-Z-')
+
 
 class SCGSensor:
     def __init__(self):
@@ -27,18 +40,45 @@ class SCGSensor:
         # Layout object.
         self.layout = Layout.Layout(self.menu)
         # Plotting variables.
-        self.bg = None
         self.fig_agg = None
-        self.ax = None
-        self.xLine = None
-        self.yLine = None
-        self.zLine = None
-        self.normLine = None
+        self.plotter = None
+        # Log viewer, shown on the plot in place of the live data while a log is open.
+        self.logViewer = None
         # Timing variables.
         self.logStart = None
-
-        # IMU object instantiated with default values.
+        self.statsUpdateTime = 0  # Time the signal statistics panel was last updated.
+        self.loggingUpdateTime = 0  # Time the logging details were last updated.
+        # Decides when the plot is redrawn and how long the main loop waits for events.
+        self.scheduler = FrameScheduler()
+        # UI state cached from events, so it is not read from the window every frame.
+        self.traceVisibility = (True,) * len(TRACE_BOXES)  # Whether each trace is shown, from the trace check boxes.
+        self.heartRateText = None  # Heart rate shown.
+        # Instrumentation of the main loop (see Instrumentation.py), summarised in the optional performance overlay.
+        self.overlayShown = False
+        self.overlayUpdateTime = 0  # Time the performance overlay was last updated.
+        self.waitTimer = profiler.stage('gui.wait')  # Time spent in windowMain.read(), waiting for and handling events.
+        self.frameTimer = profiler.stage('gui.frame')  # Periodic update of the main window.
+        self.drawTimer = profiler.stage('gui.draw')  # Drawing the plot.
+        self.receivedCounter = profiler.counter('samples.received')
+        self.droppedCounter = profiler.counter('samples.dropped')
+        self.plotQueueCounter = profiler.counter('queue.plot')  # Samples waiting for the plot.
+        self.logQueueCounter = profiler.counter('queue.log')  # Samples waiting for the log writer.
+
+        # IMU object instantiated with default values. This is the primary IMU, further IMUs can be added once it is
+        # connected. It starts on the port and baud rate an IMU last delivered data on, if known.
         self.imu = IMU.IMU()
+        lastPort = PortDiscovery.loadLastPort()
+        if lastPort:
+            self.imu.comPort, self.imu.baudRate = lastPort
+        self.imus = [self.imu]
+        # Connection manager of every IMU that was connected, connects and reconnects it in the background.
+        self.connections = {}
+        self.connectionStates = ()  # States of the connection managers at the last update of the menus.
+        self.connectionText = None  # Connection state shown in the signal statistics panel.
+        # Merges the streams of the connected IMUs when there is more than one.
+        self.merger = None
+        # Publishes the current stream to other processes while running.
+        self.liveServer = None
         self.availableComPorts = IMU.availableComPorts()
 
         # IMU connect window
@@ -53,157 +93,480 @@ class SCGSensor:
 
     def run(self):
         """
-        Main loop/thread for displaying the GUI and reacting to events, in standard PySimpleGUI fashion.
+        Main loop/thread for displaying the GUI and reacting to events, in standard PySimpleGUI fashion. The time waited
+        for events is set by the frame scheduler: until the next frame is due while an IMU or log is live, longer while
+        idle. Every event requests a frame, as it may have changed the plot.
         """
         while True:
 
-            event, values = self.windowMain.read(timeout=50)
+            start = time.perf_counter_ns()
+            event, values = self.windowMain.read(timeout=self.scheduler.timeout(self.isLive()))
+            self.waitTimer.record(start)
 
             if event in [sg.WIN_CLOSED, 'None']:
                 # On window close clicked.
                 self.close()
                 break
 
+            if event != sg.TIMEOUT_KEY:
+                self.scheduler.invalidate()
+
             if event.endswith('::-MENU-IMU-CONNECT-'):
-                self.showImuConnectWindow()
+                self.showImuConnectWindow(self.imu)
             elif event.endswith('::-MENU-IMU-DISCONNECT-'):
-                self.imu.disconnect()
+                self.disconnectImus()
                 self.updateMenus()
+            elif event.endswith('::-MENU-IMU-ADD-'):
+                self.addImu()
             elif event.endswith('::-MENU-IMU-RATE-'):
-                self.imu.setReturnRate(float(event.split('Hz')[0]))
+                for imu in self.getConnectedImus():
+                    imu.setReturnRate(float(event.split('Hz')[0]))
             elif event.endswith('::-MENU-IMU-BANDWIDTH-'):
-                self.imu.setBandwidth(int(event.split('Hz')[0]))
+                for imu in self.getConnectedImus():
+                    imu.setBandwidth(int(event.split('Hz')[0]))
             elif event.endswith('::-MENU-IMU-ALGORITHM-'):
-                self.imu.setAlgorithm(int(event.split('-')[0]))
+                for imu in self.getConnectedImus():
+                    imu.setAlgorithm(int(event.split('-')[0]))
             elif event.endswith('::-MENU-IMU-CALIBRATE-'):
-                self.imu.calibrateAcceleration()
+                for imu in self.getConnectedImus():
+                    imu.calibrateAcceleration()
+            elif event.endswith('::-MENU-IMU-LIVE-'):
+                self.toggleLiveStream()
+            elif event.endswith('::-MENU-LOG-OPEN-'):
+                self.openLogViewer()
+            elif event.endswith('::-MENU-LOG-CLOSE-'):
+                self.closeLogViewer()
+            elif event.endswith('::-MENU-PERF-OVERLAY-'):
+                self.toggleOverlay()
+            elif event.endswith('::-MENU-PERF-TRACE-'):
+                self.exportTrace()
 
             if event == '-BTN-TOGGLE-LOG-':
                 self.toggleLogging()
 
             if event == '-BTN-PLOT-REFRESH-':
-                self.imu.resetPlotData()
+                self.getStream().resetPlotData()
+
+            if event == '-COMBO-FILTER-':
+                for stream in self.imus + ([self.merger] if self.merger else []):
+                    stream.setFilter(values[event])
+
+            if event in TRACE_BOXES:
+                self.traceVisibility = tuple(values[key] for key in TRACE_BOXES)
+
+            if event == '-COMBO-PLOT-CHANNEL-':
+                self.setPlotChannel(values[event])
 
-            if event == '-SLD-PLOT-POINTS-':
-                self.imu.plotSize = int(values[event])
-                self.windowMain['-TXT-PLOT-POINTS-'].update(f'Points: {self.imu.plotSize}')
+            if event == '-SLD-PLOT-SECONDS-':
+                for stream in self.imus + ([self.merger] if self.merger else []):
+                    stream.setPlotWindow(values[event])
+                self.windowMain['-TXT-PLOT-SECONDS-'].update(f'Window: {values[event]:.0f}s')
+                self.windowMain['-TXT-PLOT-POINTS-'].update(f'Points: {self.getStream().plotSize}')
 
             if event == '-TXT-LOG-DIR-':
                 self.openLoggingDirectory()
 
-            if self.imu.isConnected:
+            self.updateLiveElements()
+
+    def updateLiveElements(self):
+        """
+        Periodic update of the main window: the connection state, the log viewer, the plot, heart rate, signal
+        statistics and logging details. Called on every pass of the main loop, and while the IMU connect window is
+        open, so the main window stays live while an IMU is connecting. New samples are moved into the plot buffer on
+        every pass, the plot is only redrawn when the frame scheduler has a frame due.
+        """
+        start = time.perf_counter_ns()
+        self.updateConnectionState()
+        self.updateInstrumentation()
+        if self.logViewer:
+            self.updateLogViewer()
+        if self.imu.isConnected or self.merger:
+            self.scheduler.addSamples(self.getStream().updatePlotData())
+            if not self.logViewer and self.scheduler.isDue():
                 self.updatePlot()
-            if self.imu.enableLogging:
-                self.updateLoggingElements()
+            self.updateHeartRate()
+            self.updateSignalStats()
+        if self.getStream().enableLogging:
+            self.updateLoggingElements()
+        self.frameTimer.record(start)
 
-    def updateLoggingElements(self):
+    def updateInstrumentation(self):
+        """
+        Sample the counters of the current stream for the instrumentation: samples received and dropped, and the samples
+        waiting for the plot and the log writer (read before the plot update of the frame). The performance overlay, if
+        shown, is updated at most once a second.
+        """
+        stream = self.getStream()
+        self.receivedCounter.set(stream.samples.writeSeq)
+        self.droppedCounter.set(stream.getDroppedSamples())
+        self.plotQueueCounter.set(stream.plotSubscription.available())
+        if stream.enableLogging and stream.logWriter:
+            self.logQueueCounter.set(stream.logWriter.subscription.available())
+        now = time.time()
+        if self.overlayShown and now - self.overlayUpdateTime >= 1:
+            self.overlayUpdateTime = now
+            self.windowMain['-TXT-PERF-'].update(profiler.describe())
+
+    def toggleOverlay(self):
+        """
+        Show or hide the performance overlay below the plot: the rate and duration of each instrumented stage (e.g.
+        gui.draw, the plot frames per second and their cost) and the counters, over the last seconds.
+        """
+        self.overlayShown = not self.overlayShown
+        self.overlayUpdateTime = 0
+        self.windowMain['-TXT-PERF-'].update(visible=self.overlayShown)
+        self.updateMenus()
+
+    def exportTrace(self):
+        """
+        Export the recorded instrumentation events to a Chrome trace in the logging directory, which chrome://tracing,
+        Perfetto and speedscope open.
+        """
+        tracePath = Path(self.loggingPath, f'trace {datetime.now().strftime("%Y-%m-%d %H-%M-%S")}.json')
+        try:
+            events = profiler.exportTrace(tracePath)
+            print(f'{events} events written to {tracePath}.')
+        except OSError as e:
+            print(f'Error exporting the trace: {e}')
+
+    def isLive(self) -> bool:
+        """
+        Returns:
+            live (bool): True while data may arrive or the plot may change: an IMU is connected, connecting or
+                reconnecting, or a log is open in the log viewer.
+        """
+        return bool(self.logViewer or self.merger or self.imu.isConnected or
+                    any(connection.active for connection in self.connections.values()))
+
+    def isImuActive(self) -> bool:
+        """
+        Returns:
+            active (bool): True while the primary IMU is connecting, connected or reconnecting after a drop-out.
+        """
+        connection = self.connections.get(self.imu)
+        return connection is not None and connection.active
+
+    def updateConnectionState(self):
+        """
+        Show the state of the connection managers, and update the menus and logging button when a state changes, e.g.
+        when an IMU connects or starts reconnecting after a drop-out.
+        """
+        states = tuple(connection.state for connection in self.connections.values())
+        if states != self.connectionStates:
+            self.connectionStates = states
+            self.updateMenus()
+            self.windowMain['-BTN-TOGGLE-LOG-'].update(
+                disabled=not self.isImuActive() and not self.getStream().enableLogging)
+        text = ' / '.join(self.connections[imu].describe() for imu in self.imus if imu in self.connections) or \
+            c.CONNECTION_DISCONNECTED
+        if text != self.connectionText:
+            self.connectionText = text
+            reconnecting = any(connection.lostTime is not None for connection in self.connections.values())
+            self.windowMain['-TXT-STAT-CONNECTION-'].update(
+                text, text_color=st.COL_TXT_WARNING if reconnecting else sg.theme_text_color())
+
+    def getConnectedImus(self) -> list:
+        """
+        Returns:
+            imus (list[IMU.IMU]): The connected IMUs, primary IMU first.
+        """
+        return [imu for imu in self.imus if imu.isConnected]
+
+    def getStream(self):
+        """
+        Return the stream that is plotted and logged: the merged stream if more than one IMU is connected, else the
+        primary IMU. Both have the same plotting and logging methods.
+
+        Returns:
+            stream (StreamMerger | IMU.IMU): Current stream.
+        """
+        return self.merger if self.merger else self.imu
+
+    def addImu(self):
+        """
+        Connect a further IMU. Once connected, the streams of all connected IMUs are merged into one stream that is
+        logged to a single file and plotted on stacked axes.
+        """
+        if self.getStream().enableLogging:
+            print('Stop logging before adding an IMU.')
+            return
+        imu = IMU.IMU(backend=self.imu.backend, baudRate=self.imu.baudRate)
+        imu.setPlotWindow(self.imu.plotWindow)
+        imu.setFilter(self.imu.filterOption)
+        if self.showImuConnectWindow(imu):
+            self.imus.append(imu)
+            self.restartMerger()
+        else:
+            self.connections.pop(imu, None)
+
+    def restartMerger(self):
+        """
+        Replace the merger with one for the currently connected IMUs, or remove it if only one IMU is connected.
+        """
+        if self.merger:
+            self.merger.close()
+            self.merger = None
+        connected = self.getConnectedImus()
+        if len(connected) > 1:
+            rate = max(imu.returnRate or 200 for imu in connected)
+            self.merger = StreamMerger(connected, rate=rate)
+            self.merger.setPlotWindow(self.imu.plotWindow)
+            self.merger.setFilter(self.imu.filterOption)
+            self.merger.start()
+            print(f'Merging {len(connected)} IMUs at {rate}Hz.')
+            if self.imu.plotChannel:
+                self.setPlotChannel(c.PLOT_CHANNEL_ACCELERATION)
+        if not self.logViewer:
+            self.plotter.setAxesCount(max(len(connected), 1))
+        if self.liveServer:
+            self.liveServer.setChannel(self.getStream().samples)
+
+    def disconnectImus(self):
+        """
+        Disconnect every IMU, also while it is connecting or reconnecting. The connection managers disconnect in the
+        background. Added IMUs are removed, only the primary IMU is kept.
+        """
+        if self.liveServer:
+            self.toggleLiveStream()
+        if self.merger:
+            self.merger.close()
+            self.merger = None
+        for imu in self.imus:
+            if imu in self.connections:
+                self.connections[imu].disconnect()
+            else:
+                imu.disconnect()
+        self.imus = [self.imu]
+        self.connections = {imu: connection for imu, connection in self.connections.items() if imu is self.imu}
+        if not self.logViewer:
+            self.plotter.setAxesCount(1)
+
+    def setPlotChannel(self, option):
+        """
+        Plot another channel of the primary IMU in place of the accelerations, or the accelerations again. The trace
+        check boxes and the plot are labelled for the channel. The merged stream of several IMUs only has the
+        accelerations, so they are always plotted with more than one IMU.
+
+        Args:
+            option (str): One of constants.PLOT_CHANNEL_OPTIONS.
+        """
+        if self.merger and c.PLOT_CHANNEL_OPTIONS[option]:
+            print('Only the accelerations are plotted with more than one IMU.')
+            option = c.PLOT_CHANNEL_ACCELERATION
+        self.windowMain['-COMBO-PLOT-CHANNEL-'].update(option)
+        self.imu.setPlotChannel(c.PLOT_CHANNEL_OPTIONS[option])
+        quantity, unit, labels = self.imu.getPlotLabels()
+        for key, text in zip(TRACE_BOXES[:4],
+                             labels or ('X-Acceleration', 'Y-Acceleration', 'Z-Acceleration', 'Acceleration Norm')):
+            self.windowMain[key].update(text=text)
+        if not self.logViewer:
+            self.plotter.setLabels(quantity, unit, labels)
+
+    def updateHeartRate(self):
         """
-        Update logging details while a log test is underway.
+        Show the heart rate detected from the (first) IMU.
         """
+        bpm = self.getStream().getHeartRate()
+        text = f'{bpm:.0f} BPM' if bpm else '-- BPM'
+        if text != self.heartRateText:
+            self.heartRateText = text
+            self.windowMain['-TXT-BPM-'].update(text)
 
+    def updateSignalStats(self):
+        """
+        Show the rolling signal statistics of the (first) IMU, at most once a second. The sample rate and jitter are
+        measured from the primary IMU's timestamps. Problems found in any channel, and a return rate of any IMU that
+        does not match the requested rate, are shown in the signal quality element. The number of plotted points
+        follows the measured rate, so it is shown here too.
+        """
+        now = time.time()
+        if now - self.statsUpdateTime < 1:
+            return
+        self.statsUpdateTime = now
+        self.windowMain['-TXT-PLOT-POINTS-'].update(f'Points: {self.getStream().plotSize}')
+        timing = self.imu.getTiming()
+        self.windowMain['-TXT-STAT-RATE-'].update(f'{timing["rate"]:.1f}Hz' if timing['rate'] else '--')
+        self.windowMain['-TXT-STAT-JITTER-'].update(f'{timing["jitterMs"]:.2f}ms' if timing['rate'] else '--')
+        stats = self.getStream().getSignalStats()
+        if not stats:
+            return
+
+        def formatValues(values):
+            return '/'.join('--' if value is None else f'{value:.2f}' for value in values[:3])
+
+        lows = [value for value in stats['min'][:3] if value is not None]
+        highs = [value for value in stats['max'][:3] if value is not None]
+        self.windowMain['-TXT-STAT-MEAN-'].update(formatValues(stats['mean']))
+        self.windowMain['-TXT-STAT-RMS-'].update(formatValues(stats['rms']))
+        self.windowMain['-TXT-STAT-RANGE-'].update(f'{min(lows):.2f} / {max(highs):.2f}' if lows else '--')
+        self.windowMain['-TXT-STAT-DUPLICATES-'].update(
+            f'{100 * stats["duplicateSamples"] / stats["samples"]:.0f}% ({stats["duplicateRuns"]})')
+        flags = stats['flags'] + (['rate mismatch'] if any(imu.getTiming()['mismatch']
+                                                           for imu in self.getConnectedImus()) else [])
+        self.windowMain['-TXT-STAT-QUALITY-'].update(', '.join(flags).capitalize() or 'OK',
+                                                     text_color=st.COL_TXT_WARNING if flags else sg.theme_text_color())
+
+    def updateLoggingElements(self):
+        """
+        Update logging details while a log test is underway, at most 4 times a second. If a log writer stopped after an
+        error (e.g. a full disk) logging is stopped, which reports the error.
+        """
         logEnd = time.time()
+        if logEnd - self.loggingUpdateTime < 0.25:
+            return
+        self.loggingUpdateTime = logEnd
+        if self.getStream().getLogError():
+            self.toggleLogging()
+            return
         logElapsed = logEnd - self.logStart
 
         self.windowMain['-TXT-LOG-ELAPSED-'].update(time.strftime('%H:%M:%S', time.localtime(logElapsed)))
         self.windowMain['-TXT-LOG-END-'].update(time.strftime('%H:%M:%S', time.localtime(logEnd)))
-        self.windowMain['-TXT-LINES-LOGGED-'].update(f'{len(self.imu.logData)}')
+        self.windowMain['-TXT-LINES-LOGGED-'].update(f'{self.getStream().getLinesLogged()}')
+        self.windowMain['-TXT-DROPPED-'].update(f'{self.getStream().getDroppedSamples()}')
 
     def toggleLogging(self):
         """
-        Toggle the logging state of the IMU object.
+        Toggle the logging state of the IMU object, or of the merged stream if more than one IMU is connected.
         """
-        if self.imu.isConnected:
-            if not self.imu.enableLogging:
+        stream = self.getStream()
+        if self.isImuActive() or stream.enableLogging:
+            if not stream.enableLogging:
                 logFileName = self.windowMain['-INP-FILE-NAME-'].get()
                 if logFileName == '':
                     dt = datetime.fromtimestamp(time.time_ns() / 1000000000)
                     logFileName = dt.strftime('%d %m %Y %H-%M-%S')
                     self.windowMain['-INP-FILE-NAME-'].update(logFileName)
 
-                if self.doesLogFileExist(logFileName):
+                binary = self.windowMain['-BOX-LOG-BINARY-'].get()
+                extension = LogFormat.BINARY_EXTENSION if binary else LogFormat.TEXT_EXTENSION
+
+                if self.doesLogFileExist(logFileName, extension):
                     print(f'{logFileName} exits, appending time.')
                     logFileName = f'{logFileName}_{int(time.time() * 1000)}'
 
-                self.imu.startLogging(Path(self.loggingPath, logFileName + '.txt'))
+                segmentSeconds = c.LOG_SEGMENT_OPTIONS[self.windowMain['-COMBO-LOG-SEGMENT-'].get()]
+                logPath = Path(self.loggingPath, logFileName + extension)
+                try:
+                    if self.merger:
+                        if self.windowMain['-BOX-LOG-CHANNELS-'].get():
+                            print('Only the accelerations are logged with more than one IMU.')
+                        stream.startLogging(logPath, binary, segmentSeconds)
+                    else:
+                        channels = list(c.IMU_CHANNELS) if self.windowMain['-BOX-LOG-CHANNELS-'].get() else None
+                        stream.startLogging(logPath, binary, segmentSeconds, channels)
+                except (OSError, ValueError) as e:
+                    # E.g. a full disk or a binary header that is too large, logging is not started.
+                    print(f'Error starting the log: {e}')
+                    sg.popup_error(f'Logging could not be started:\n{e}', title='Logging Error')
+                    return
 
                 self.logStart = time.time()
                 self.windowMain['-TXT-LOG-START-'].update(time.strftime('%H:%M:%S'))
+                self.windowMain['-TXT-LINES-LOGGED-'].update(text_color=sg.theme_text_color())
             else:
-                self.imu.stopLogging()
+                error = stream.stopLogging()
                 self.windowMain['-INP-FILE-NAME-'].update('')
-                self.windowMain['-TXT-LINES-LOGGED-'].update(len(self.imu.logData))
+                # Lines logged in the warning colour if the log is incomplete.
+                self.windowMain['-TXT-LINES-LOGGED-'].update(
+                    stream.getLinesLogged(), text_color=st.COL_TXT_WARNING if error else sg.theme_text_color())
+                if error:
+                    sg.popup_error(f'Writing the log failed, logging was stopped:\n{error}', title='Logging Error')
 
             self.windowMain['-BTN-TOGGLE-LOG-'].update(
-                text='Stop Logging' if self.imu.enableLogging else 'Start Logging',
-                button_color=st.COL_BTN_ACTIVE if self.imu.enableLogging else sg.DEFAULT_BUTTON_COLOR)
+                text='Stop Logging' if stream.enableLogging else 'Start Logging',
+                button_color=st.COL_BTN_ACTIVE if stream.enableLogging else sg.DEFAULT_BUTTON_COLOR)
         else:
             print('IMU is not connected.')
 
     def updatePlot(self):
         """
-        Update plot.
+        Update plot. The plot buffer view is passed straight to the plotter, only the relative times are computed. With
+        more than one IMU each IMU's traces of the merged stream are drawn on their own axes.
         """
-        if len(self.imu.plotData) > 0:
-            data = np.array(self.imu.plotData)
-
-            data[:, 0] = (data[:, 0] - data[0, 0])
-
-            if self.windowMain['-BOX-ACC-X-'].get():
-                self.xLine[0].remove()
-                self.xLine = self.ax.plot(data[:, 0], data[:, 1], c='darkturquoise')  # X
-            else:
-                self.xLine[0].remove()
-                self.xLine = self.ax.plot([], [], c='darkturquoise')
-
-            if self.windowMain['-BOX-ACC-Y-'].get():
-                self.yLine[0].remove()
-                self.yLine = self.ax.plot(data[:, 0], data[:, 2], c='red')  # Y
-            else:
-                self.yLine[0].remove()
-                self.yLine = self.ax.plot([], [], c='red')
-
-            if self.windowMain['-BOX-ACC-Z-'].get():
-                self.zLine[0].remove()
-                self.zLine = self.ax.plot(data[:, 0], data[:, 3], c='lime')  # Z
-            else:
-                self.zLine[0].remove()
-                self.zLine = self.ax.plot([], [], c='lime')
+        if self.merger:
+            datasets = self.merger.getPlotDatasets()
+        elif len(self.imu.plotData) > 0:
+            # Ordered view into the plot buffer, must not be modified in place.
+            data = self.imu.plotData.getView()
+            datasets = [(data[:, 0] - data[0, 0], data[:, 1:8])]
+        else:
+            datasets = []
+        start = time.perf_counter_ns()
+        if datasets:
+            self.plotter.update(datasets, self.traceVisibility)
+            self.drawTimer.record(start)
+        self.scheduler.frameDrawn((time.perf_counter_ns() - start) / 1e9)
+
+    def toggleLiveStream(self):
+        """
+        Start or stop publishing the current stream (the merged stream with several IMUs) to other processes on the
+        local machine, see LiveStream.py.
+        """
+        if self.liveServer:
+            self.liveServer.stop()
+            self.liveServer = None
+        else:
+            try:
+                self.liveServer = LiveServer(self.getStream().samples)
+                self.liveServer.start()
+            except OSError as e:
+                print(f'Error starting the live stream: {e}')
+                self.liveServer = None
+        self.updateMenus()
 
-            if self.windowMain['-BOX-ACC-NORM-'].get():
-                self.normLine[0].remove()
-                self.normLine = self.ax.plot(data[:, 0], data[:, 4], c='magenta')  # Norm
-            else:
-                self.normLine[0].remove()
-                self.normLine = self.ax.plot([], [], c='magenta')
+    def openLogViewer(self):
+        """
+        Ask for a log file and show it on the plot in place of the live data. The first time a log is opened it is
+        indexed, which takes a few seconds for a large text log. Logging and the live data continue in the background.
+        """
+        filePath = sg.popup_get_file('Log to view', initial_folder=str(self.loggingPath), no_window=True,
+                                     file_types=(('Log files', f'*{LogFormat.TEXT_EXTENSION} '
+                                                               f'*{LogFormat.BINARY_EXTENSION}'),))
+        if not filePath:
+            return
+        try:
+            logViewer = LogViewer.LogViewer(Path(filePath), self.fig_agg)
+        except (OSError, ValueError) as e:
+            print(f'Error opening log {filePath}: {e}')
+            return
+        if self.logViewer:
+            self.logViewer.close()
+        self.logViewer = logViewer
+        self.plotter.setLabels()
+        self.plotter.setAxesCount(self.logViewer.axesCount)
+        print(f'Viewing {filePath}: {len(self.logViewer.reader)} samples, {self.logViewer.duration:.1f}s.')
+        self.updateMenus()
 
-            self.ax.relim()
-            self.ax.legend([self.xLine[0], self.yLine[0], self.zLine[0], self.normLine[0]],
-                           ['X Acceleration', 'Y Acceleration', 'Z Acceleration', 'Acceleration Norm'],
-                           loc='upper right')
+    def closeLogViewer(self):
+        """
+        Close the log viewer and return to the live plot.
+        """
+        if self.logViewer:
+            self.logViewer.close()
+            self.logViewer = None
+        self.plotter.setAxesCount(len(self.merger.imus) if self.merger else 1)
+        self.plotter.setLabels(*self.imu.getPlotLabels())
+        self.updateMenus()
 
-            self.fig_agg.draw()
-            self.fig_agg.flush_events()
+    def updateLogViewer(self):
+        """
+        Redraw the log viewer's time range if it was panned or zoomed, or the shown traces changed.
+        """
+        if self.logViewer.dirty or self.traceVisibility != self.plotter.visibility:
+            datasets, xLimits = self.logViewer.getDatasets(self.plotter.axes[0].bbox.width)
+            self.plotter.update(datasets, self.traceVisibility, xLimits)
 
     def createPlot(self):
         """
         Instantiate the initial plotting variables.
         """
         fig = Figure(figsize=(10, 5), dpi=100)
-        self.ax = fig.add_subplot(111)
         fig.patch.set_facecolor(sg.DEFAULT_BACKGROUND_COLOR)
-        self.ax.set_facecolor('black')
-        self.ax.set_position((0.1, 0.1, 0.9, 0.9))
-
-        self.ax.set_xlabel('Time [s]')
-        self.ax.set_ylabel('Acceleration [m/s^2]')
-        self.ax.grid()
-
-        self.xLine = self.ax.plot([], [], color='darkturquoise')
-        self.yLine = self.ax.plot([], [], color='red')
-        self.zLine = self.ax.plot([], [], color='lime')
-        self.normLine = self.ax.plot([], [], color='magenta')
+        self.plotter = Plotter.Plotter(fig)
 
         self.fig_agg = self.drawFigure(fig, self.windowMain['-CANVAS-PLOT-'].TKCanvas)
+        self.plotter.setCanvas(self.fig_agg)
 
     def drawFigure(self, figure, canvas):
         """
@@ -214,13 +577,13 @@ class SCGSensor:
         figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
         return figure_canvas_agg
 
-    def doesLogFileExist(self, fileName):
+    def doesLogFileExist(self, fileName, extension=LogFormat.TEXT_EXTENSION):
         """
-        Check if a log file with the given name already exists.
+        Check if a log file, or the manifest of a segmented log, with the given name and extension already exists.
         """
         logFiles = os.listdir(self.loggingPath)
 
-        if fileName + '.txt' in logFiles:
+        if fileName + extension in logFiles or LogFormat.manifestPath(fileName + extension).name in logFiles:
             return True
         return False
 
@@ -233,50 +596,127 @@ class SCGSensor:
         # Set elements
         self.windowImuConnect['-COMBO-COM-PORT-'].update(values=self.availableComPorts)
 
-    def showImuConnectWindow(self):
+    def showDiscoveryResults(self, discovery, imu):
+        """
+        Show the result of a port discovery in windowImuConnect. The ports an IMU responded on are listed first in the
+        COM port drop-down, best first, and the best port and its baud rate are selected for the given IMU.
+
+        Args:
+            discovery (PortDiscovery.PortDiscovery): Finished (or stopped) discovery.
+            imu (IMU.IMU): IMU being connected.
+        """
+        results = discovery.results()
+        self.windowImuConnect['-BTN-COM-FIND-'].update(disabled=False)
+        if not results:
+            self.windowImuConnect['-TXT-CONNECT-STATUS-'].update('No IMU found.')
+            return
+        found = [result['port'] for result in results]
+        self.availableComPorts = found + [port for port in IMU.availableComPorts() if port not in found]
+        imu.comPort = results[0]['port']
+        imu.baudRate = results[0]['baudRate']
+        self.windowImuConnect['-COMBO-COM-PORT-'].update(values=self.availableComPorts, value=imu.comPort)
+        self.windowImuConnect['-COMBO-BAUD-RATE-'].update(value=imu.baudRate)
+        others = f', {len(results) - 1} other{"s" if len(results) > 2 else ""}' if len(results) > 1 else ''
+        self.windowImuConnect['-TXT-CONNECT-STATUS-'].update(f'IMU found on {imu.comPort} at {imu.baudRate}{others}.')
+
+    def showImuConnectWindow(self, imu):
         """
         Show a window for the user to connect to an IMU based on COM port and baud rate selection. The user
         can refresh available COM ports, select a COM port, and select a baud rate from this window. When the CONNECT
         button is clicked an attempt is made to open the requested COM port at the specified baud rate.
 
-        When the COM port and baud rate are changed from the combo boxes, the self.imu variable has its properties
-        modified immediately (self.imu.comPort, self.imu.baudrate). If CONNECT is clicked while the COM port box is
-        empty (post refresh), the currently stored self.imu.comPort will be used.
+        When the COM port and baud rate are changed from the combo boxes, the given IMU has its properties modified
+        immediately (imu.comPort, imu.baudrate). If CONNECT is clicked while the COM port box is empty (post refresh),
+        the currently stored imu.comPort will be used.
 
         The window will close if there is a successful connection to the COM port. There is no test to see if the
         port belongs to an IMU or not, just if the connection is made. The user will need to see if acceleration values
-        are being updated in the main GUI.
+        are being updated in the main GUI. Find IMU probes the free COM ports at every common baud rate in the
+        background (see PortDiscovery.py) and selects the port and baud rate an IMU responded on.
+
+        The port is opened by the IMU's ConnectionManager in the background, so the window and the main window stay
+        responsive while connecting. Closing the window while connecting cancels the connection. Once connected, the
+        manager reconnects the IMU whenever its data stops arriving.
+
+        Args:
+            imu (IMU.IMU): IMU to connect, the primary IMU or an added one.
+
+        Returns:
+            connected (bool): True if the IMU was connected.
         """
         self.windowImuConnect = sg.Window('Connect to IMU',
-                                          self.layout.getImuWindowLayout(self.availableComPorts, self.imu.comPort,
-                                                                         self.imu.baudRate),
+                                          self.layout.getImuWindowLayout(self.availableComPorts, imu.comPort,
+                                                                         imu.baudRate, imu.backend, imu.replayPath),
                                           element_justification='center', modal=True)
 
+        connection = None
+        discovery = None
+        connected = False
         while True:
-            event, values = self.windowImuConnect.read()
+            event, values = self.windowImuConnect.read(timeout=50)
 
             if event in [sg.WIN_CLOSED, 'None']:
-                # On window close.
+                # On window close, a connection that is still being made and a discovery are cancelled.
+                if connection:
+                    connection.disconnect()
+                if discovery:
+                    discovery.stop()
                 break
             elif event == '-BTN-COM-REFRESH-':
                 # On refresh available COM ports clicked.
                 self.refreshComPorts()
+            elif event == '-BTN-COM-FIND-':
+                # On find IMU clicked, the ports of the connected IMUs are not probed.
+                inUse = [other.comPort for other in self.getConnectedImus()]
+                discovery = PortDiscovery.PortDiscovery([port for port in IMU.availableComPorts()
+                                                         if port != 'None' and port not in inUse],
+                                                        lastPort=PortDiscovery.loadLastPort())
+                discovery.start()
+                self.windowImuConnect['-BTN-COM-FIND-'].update(disabled=True)
+                self.windowImuConnect['-TXT-CONNECT-STATUS-'].update(
+                    f'Searching {len(discovery.ports)} ports for an IMU...')
             elif event == '-COMBO-COM-PORT-':
                 # On COM port changed.
-                self.imu.comPort = values['-COMBO-COM-PORT-']
+                imu.comPort = values['-COMBO-COM-PORT-']
             elif event == '-COMBO-BAUD-RATE-':
                 # On baud rate changed.
-                self.imu.baudRate = int(values['-COMBO-BAUD-RATE-'])
+                imu.baudRate = int(values['-COMBO-BAUD-RATE-'])
+            elif event == '-COMBO-BACKEND-':
+                # On backend changed.
+                imu.backend = values['-COMBO-BACKEND-']
+            elif event == '-INP-REPLAY-FILE-':
+                # On replay log file changed.
+                imu.replayPath = values['-INP-REPLAY-FILE-']
             elif event == '-BTN-IMU-CONNECT-':
-                # On connect button clicked.
-                self.imu.connect()
-                if self.imu.isConnected:
-                    break
-
-        self.windowMain['-BTN-TOGGLE-LOG-'].update(disabled=False if self.imu.isConnected else True)
+                # On connect button clicked, a discovery still running is stopped so it frees the ports.
+                if discovery:
+                    discovery.stop()
+                    discovery = None
+                    self.windowImuConnect['-BTN-COM-FIND-'].update(disabled=False)
+                connection = self.connections.setdefault(imu, ConnectionManager(imu))
+                connection.connect()
+                self.windowImuConnect['-BTN-IMU-CONNECT-'].update(disabled=True)
+                self.windowImuConnect['-TXT-CONNECT-STATUS-'].update(f'Connecting to {imu.comPort}...')
+
+            if connection and connection.state == c.CONNECTION_CONNECTED:
+                connected = True
+                break
+            elif connection and connection.state == c.CONNECTION_FAILED:
+                connection = None
+                self.windowImuConnect['-BTN-IMU-CONNECT-'].update(disabled=False)
+                self.windowImuConnect['-TXT-CONNECT-STATUS-'].update('Connection failed.')
+            if discovery and (discovery.done or time.monotonic() - discovery.startTime > c.DISCOVERY_TIMEOUT):
+                # Ports that have not answered by the timeout (e.g. a Bluetooth port whose device is off) are given up.
+                discovery.stop()
+                self.showDiscoveryResults(discovery, imu)
+                discovery = None
+            self.updateLiveElements()
+
+        self.windowMain['-BTN-TOGGLE-LOG-'].update(disabled=not self.isImuActive())
 
         self.updateMenus()
         self.windowImuConnect.close()
+        return connected
 
     def updateMenus(self):
         """
@@ -284,7 +724,8 @@ class SCGSensor:
         """
         # Set elements.
         self.windowMain['-MENU-'].update(
-            menu_definition=self.menu.getMenu(self.imu.isConnected))
+            menu_definition=self.menu.getMenu(self.isImuActive(), self.logViewer is not None,
+                                              self.liveServer is not None, self.overlayShown))
 
     def openLoggingDirectory(self):
         """
@@ -307,11 +748,21 @@ class SCGSensor:
 
     def close(self):
         """
-        Delete references to IMU object for garbage collection.
+        Delete references to IMU objects for garbage collection. An active log is stopped first so it is completed.
         """
-        if self.imu.isConnected:
-            self.imu.disconnect()
-            del self.imu
+        if self.logViewer:
+            self.logViewer.close()
+        if self.liveServer:
+            self.liveServer.stop()
+        if self.merger:
+            self.merger.close()
+        if self.imu.enableLogging:
+            self.imu.stopLogging()
+        for connection in self.connections.values():
+            connection.disconnect()
+        for connection in self.connections.values():
+            connection.join(timeout=2)
+        del self.imu
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+"""
+Recovery of segmented logs. A segmented recording (see LogWriter.py) is a series of complete log files and a manifest
+listing them. Running this file stitches the segments back into a single log, also after a crash, when the manifest
+may not mark the last segment complete and the last segment may end with a partially written chunk or line:
+
+    python SegmentedLog.py "logging/my log.manifest.json" ["logging/my log.txt"]
+
+The path of the log itself ("logging/my log.txt") may be given instead of the manifest. If the manifest is missing or
+unreadable the segment files are found by their names.
+"""
+import json
+import struct
+import sys
+from pathlib import Path
+
+import LogFormat
+
+
+def findSegments(path):
+    """
+    Find the segments of a segmented log.
+
+    Args:
+        path (Path): Manifest of the log, or the path of the log itself.
+
+    Returns:
+        logPath (Path): Path of the log the segments belong to.
+        segmentPaths (list[Path]): Paths of the segments in recording order.
+    """
+    path = Path(path)
+    if path.name.endswith(LogFormat.MANIFEST_SUFFIX):
+        stem = path.name[:-len(LogFormat.MANIFEST_SUFFIX)]
+        manifestPath = path
+    else:
+        stem = path.stem
+        manifestPath = LogFormat.manifestPath(path)
+
+    try:
+        with open(manifestPath, 'r') as file:
+            manifest = json.load(file)
+        logPath = path.with_name(manifest['log'])
+        return logPath, [path.with_name(segment['file']) for segment in manifest['segments']]
+    except (OSError, ValueError, KeyError) as e:
+        print(f'Manifest {manifestPath} can not be read ({e}), looking for segment files.')
+
+    for extension in (LogFormat.BINARY_EXTENSION, LogFormat.TEXT_EXTENSION):
+        logPath = path.with_name(stem + extension)
+        segmentPaths = sorted(path.parent.glob(f'{stem}{LogFormat.SEGMENT_SUFFIX}[0-9]*{extension}'))
+        if segmentPaths:
+            return logPath, segmentPaths
+    raise FileNotFoundError(f'No segments found for {path}.')
+
+
+def stitchSegments(path, outputPath=None) -> Path:
+    """
+    Stitch the segments of a segmented log into one log file of the same format. Segments are copied one chunk (binary)
+    or line (text) at a time, so memory use does not depend on the length of the recording. A partially written chunk
+    or line at the end of a segment is left out, a missing segment is skipped.
+
+    Args:
+        path (Path): Manifest of the log, or the path of the log itself.
+        outputPath (Path, optional): Path of the stitched log. Defaults to the path of the log.
+
+    Returns:
+        outputPath (Path): Path of the stitched log.
+    """
+    logPath, segmentPaths = findSegments(path)
+    outputPath = Path(outputPath) if outputPath else logPath
+    if outputPath.exists():
+        raise FileExistsError(f'{outputPath} already exists.')
+    binary = logPath.suffix == LogFormat.BINARY_EXTENSION
+    print(f'Stitching {len(segmentPaths)} segments into {outputPath}...')
+
+    lines = 0
+    with open(outputPath, 'wb' if binary else 'w') as output:
+        for segmentPath in segmentPaths:
+            if not segmentPath.exists():
+                print(f'Segment {segmentPath} is missing, skipped.')
+                continue
+            if binary:
+                lines += copyBinarySegment(segmentPath, output, writeHeader=output.tell() == 0)
+            else:
+                lines += copyTextSegment(segmentPath, output)
+    print(f'Stitching completed. {lines} lines written to {outputPath}.')
+    return outputPath
+
+
+def copyBinarySegment(segmentPath, output, writeHeader) -> int:
+    """
+    Append the chunks of a binary segment to the stitched log.
+
+    Args:
+        segmentPath (Path): Path of the segment.
+        output (BinaryIO): Stitched log opened in 'wb' mode.
+        writeHeader (bool): Write the header of the segment, without its segment number, first.
+
+    Returns:
+        lines (int): Number of samples copied.
+    """
+    lines = 0
+    with open(segmentPath, 'rb') as file:
+        header = LogFormat.readHeader(file)
+        version = header.pop('version')
+        if version != 2:
+            raise ValueError(f'{segmentPath} is not a version 2 binary log.')
+        if writeHeader:
+            header.pop('segment', None)
+            output.write(LogFormat.encodeHeader(header))
+        for n, body in LogFormat.iterChunkBytes(file, header.get('valueColumns', 3), version):
+            output.write(struct.pack('<I', n) + body)
+            lines += n
+    return lines
+
+
+def copyTextSegment(segmentPath, output) -> int:
+    """
+    Append the lines of a text segment to the stitched log.
+
+    Args:
+        segmentPath (Path): Path of the segment.
+        output (TextIO): Stitched log opened in 'w' mode.
+
+    Returns:
+        lines (int): Number of lines copied.
+    """
+    lines = 0
+    with open(segmentPath, 'r') as file:
+        for line in file:
+            if not line.endswith('\n'):
+                # Partially written last line.
+                break
+            output.write(line)
+            lines += 1
+    return lines
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(f'Usage: python {Path(__file__).name} <manifest or log> [stitched log]')
+        sys.exit(1)
+    stitchSegments(*sys.argv[1:3])
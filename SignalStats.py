@@ -0,0 +1,164 @@
+"""
+Rolling statistics and signal quality indicators of the acceleration stream, so that saturation, a flat-lined sensor
+or repeated samples (bandwidth too low for the return rate, see the README) are seen while recording.
+"""
+from collections import deque
+
+import numpy as np
+
+import WitmotionParser
+
+# Accelerations at or above this magnitude are at the end of the IMU's +-16g range.
+SATURATION = 0.99 * 16 * WitmotionParser.G
+
+
+class SignalStats:
+    """
+    Statistics of the samples of the last window seconds, per channel. Each block of samples passed to update() is
+    reduced to a summary (count, sum, sum of squares, min, max, duplicate and saturated sample counts and time span)
+    with vectorised NumPy operations, so the cost per sample is constant. The window is made up of whole blocks: the
+    summaries of blocks older than the window are dropped, and summary() combines the remaining block summaries.
+
+    Without a window the statistics cover every sample since the start, all blocks are folded into one summary.
+
+    A duplicate is a sample with exactly the same values as the sample before it, a duplicate run is a sequence of
+    such samples. The effective sample rate is measured from the IMU timestamps.
+    """
+
+    def __init__(self, channels=3, window=5.0, flatThreshold=1e-3, duplicateThreshold=0.1):
+        """
+        Args:
+            channels (int, optional): Number of value columns. Defaults to 3 (ax, ay, az).
+            window (float, optional): Length of the window in seconds, None for all samples. Defaults to 5.
+            flatThreshold (float, optional): A channel is flat if its standard deviation is below this value.
+                Defaults to 1e-3 m/s^2.
+            duplicateThreshold (float, optional): Fraction of duplicate samples above which duplicates are flagged.
+                Defaults to 0.1.
+        """
+        self.channels = channels
+        self.window = window
+        self.flatThreshold = flatThreshold
+        self.duplicateThreshold = duplicateThreshold
+        self.blocks = deque()  # Block summaries in the window, oldest first, or the single total without a window.
+        self.lastValues = None  # Values of the last sample, for duplicates at the start of the next block.
+        self.inDuplicateRun = False  # The last sample was a duplicate.
+
+    def clear(self):
+        """
+        Remove all samples from the statistics.
+        """
+        self.blocks.clear()
+        self.lastValues = None
+        self.inDuplicateRun = False
+
+    def update(self, rows):
+        """
+        Add a block of samples.
+
+        Args:
+            rows (np.ndarray): Rows of [timestamp, values...], further columns are ignored. NaN values (e.g. a stale
+                stream of a StreamMerger) are not counted.
+        """
+        if len(rows) == 0:
+            return
+        values = rows[:, 1:1 + self.channels]
+        finite = np.isfinite(values)
+
+        previous = np.vstack((self.lastValues if self.lastValues is not None else np.full(self.channels, np.nan),
+                              values[:-1]))
+        duplicate = np.all(values == previous, axis=1)
+        runStarts = duplicate & ~np.concatenate(([self.inDuplicateRun], duplicate[:-1]))
+        self.lastValues = values[-1].copy()
+        self.inDuplicateRun = bool(duplicate[-1])
+
+        summary = {
+            'start': float(rows[0, 0]),
+            'end': float(rows[-1, 0]),
+            'samples': len(rows),
+            'count': finite.sum(axis=0),
+            'sum': np.where(finite, values, 0).sum(axis=0),
+            'sumSquares': np.where(finite, values * values, 0).sum(axis=0),
+            'min': np.where(finite, values, np.inf).min(axis=0),
+            'max': np.where(finite, values, -np.inf).max(axis=0),
+            'duplicateSamples': int(duplicate.sum()),
+            'duplicateRuns': int(runStarts.sum()),
+            'saturatedSamples': int(np.any(np.abs(np.where(finite, values, 0)) >= SATURATION, axis=1).sum())
+        }
+        if self.window is None:
+            self.blocks.append(combineSummaries(self.blocks.pop(), summary) if self.blocks else summary)
+        else:
+            self.blocks.append(summary)
+            while self.blocks and self.blocks[0]['end'] < summary['end'] - self.window:
+                self.blocks.popleft()
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            stats (dict): JSON serialisable statistics: samples, rate (Hz), per channel lists mean, rms, std, min and
+                max, duplicateSamples, duplicateRuns, saturatedSamples, and flags, a list of the problems found
+                ('saturated', 'flat', 'duplicates'). Empty if there are no samples.
+        """
+        if not self.blocks:
+            return {}
+        total = self.blocks[0]
+        for block in list(self.blocks)[1:]:
+            total = combineSummaries(total, block)
+
+        count = np.maximum(total['count'], 1)
+        mean = total['sum'] / count
+        meanSquare = total['sumSquares'] / count
+        std = np.sqrt(np.maximum(meanSquare - mean * mean, 0))
+        span = total['end'] - total['start']
+        samples = total['samples']
+
+        flags = []
+        if total['saturatedSamples']:
+            flags.append('saturated')
+        if samples > 1 and np.any((std < self.flatThreshold) & (total['count'] > 1)):
+            flags.append('flat')
+        if total['duplicateSamples'] > self.duplicateThreshold * samples:
+            flags.append('duplicates')
+
+        return {
+            'samples': samples,
+            'rate': round((samples - 1) / span, 2) if span > 0 else None,
+            'mean': roundList(mean),
+            'rms': roundList(np.sqrt(meanSquare)),
+            'std': roundList(std),
+            'min': roundList(np.where(total['count'] > 0, total['min'], np.nan)),
+            'max': roundList(np.where(total['count'] > 0, total['max'], np.nan)),
+            'duplicateSamples': total['duplicateSamples'],
+            'duplicateRuns': total['duplicateRuns'],
+            'saturatedSamples': total['saturatedSamples'],
+            'flags': flags
+        }
+
+
+def combineSummaries(first, second) -> dict:
+    """
+    Combine the summaries of two consecutive blocks.
+
+    Returns:
+        summary (dict): Summary of both blocks.
+    """
+    return {
+        'start': first['start'],
+        'end': second['end'],
+        'samples': first['samples'] + second['samples'],
+        'count': first['count'] + second['count'],
+        'sum': first['sum'] + second['sum'],
+        'sumSquares': first['sumSquares'] + second['sumSquares'],
+        'min': np.minimum(first['min'], second['min']),
+        'max': np.maximum(first['max'], second['max']),
+        'duplicateSamples': first['duplicateSamples'] + second['duplicateSamples'],
+        'duplicateRuns': first['duplicateRuns'] + second['duplicateRuns'],
+        'saturatedSamples': first['saturatedSamples'] + second['saturatedSamples']
+    }
+
+
+def roundList(values, decimals=4) -> list:
+    """
+    Returns:
+        values (list): Values rounded for display and the log header, None for NaN (not valid JSON).
+    """
+    return [None if np.isnan(value) else round(float(value), decimals) for value in values]
@@ -0,0 +1,315 @@
+"""
+Simulated IMU backends for testing and benchmarking without hardware.
+
+SyntheticSource and ReplaySource can be used by IMU.IMU in place of a serial connection, they pass decoded channels to
+a callback in the same form as WitmotionReader. FakeSerialDevice emulates the IMU itself on a pseudo-terminal (Linux
+only), so the serial backends can be tested end to end by connecting to FakeSerialDevice.path.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import witmotion as wm
+
+import LogFormat
+import WitmotionParser
+
+# Return rate register values -> rate in Hz.
+RETURN_RATES = {
+    wm.protocol.ReturnRateSelect.rate_0_2hz.value: 0.2,
+    wm.protocol.ReturnRateSelect.rate_0_5hz.value: 0.5,
+    wm.protocol.ReturnRateSelect.rate_1hz.value: 1,
+    wm.protocol.ReturnRateSelect.rate_2hz.value: 2,
+    wm.protocol.ReturnRateSelect.rate_5hz.value: 5,
+    wm.protocol.ReturnRateSelect.rate_10hz.value: 10,
+    wm.protocol.ReturnRateSelect.rate_20hz.value: 20,
+    wm.protocol.ReturnRateSelect.rate_50hz.value: 50,
+    wm.protocol.ReturnRateSelect.rate_100hz.value: 100,
+    wm.protocol.ReturnRateSelect.rate_125hz.value: 125,
+    wm.protocol.ReturnRateSelect.rate_200hz.value: 200
+}
+
+
+def syntheticAcceleration(t, heartRate=70.0, noise=0.01, rng=None) -> np.ndarray:
+    """
+    Generate an SCG-like acceleration signal. Each heartbeat produces a large, short oscillation (aortic opening) and a
+    smaller one (aortic closing) in the z-acceleration, on top of gravity, a slow respiration component and noise.
+
+    Args:
+        t (np.ndarray): Sample times in seconds, shape (n,).
+        heartRate (float, optional): Heart rate in beats per minute. Defaults to 70.
+        noise (float, optional): Standard deviation of the added noise in m/s^2. Defaults to 0.01.
+        rng (np.random.Generator, optional): Random generator for the noise. Defaults to a new generator.
+
+    Returns:
+        acceleration (np.ndarray): Array of shape (n, 3).
+    """
+    rng = rng or np.random.default_rng()
+    phase = np.mod(t, 60.0 / heartRate)
+    opening = 0.3 * np.exp(-((phase - 0.10) / 0.02) ** 2) * np.sin(2 * np.pi * 30 * (phase - 0.10))
+    closing = 0.12 * np.exp(-((phase - 0.40) / 0.02) ** 2) * np.sin(2 * np.pi * 25 * (phase - 0.40))
+    respiration = 0.05 * np.sin(2 * np.pi * 0.25 * t)
+
+    acceleration = rng.normal(0, noise, (len(t), 3))
+    acceleration[:, 0] += 0.2 * (opening + closing) + respiration
+    acceleration[:, 1] += 0.1 * opening
+    acceleration[:, 2] += 9.8 + opening + closing + 0.5 * respiration
+    return acceleration
+
+
+class SimulatedSource:
+    """
+    Base class of the simulated backends. A thread wakes up every block interval and asks the subclass for the samples
+    that are due, which are passed to the callback as {'acceleration': rows}. The interface mirrors WitmotionReader so
+    IMU.IMU can use either.
+    """
+
+    def __init__(self, callback, speed=1.0, blockInterval=0.02):
+        """
+        Start the source thread.
+
+        Args:
+            callback (callable): Called from the source thread with each block of channels.
+            speed (float, optional): Playback speed relative to real time, 0 runs as fast as possible. Defaults to 1.
+            blockInterval (float, optional): Time between blocks in seconds. Defaults to 0.02.
+        """
+        self.ser = None  # No serial port.
+        self.callback = callback
+        self.speed = speed
+        self.blockInterval = blockInterval
+        self.shouldExit = False
+        self.startTime = time.time()
+        self.thread = threading.Thread(target=self.__run, name=type(self).__name__, daemon=True)
+        self.thread.start()
+
+    def nextBlock(self, elapsed):
+        """
+        Return the rows that are due. Implemented by subclasses.
+
+        Args:
+            elapsed (float): Simulated time since the start in seconds, or None when running as fast as possible.
+
+        Returns:
+            rows (np.ndarray): Rows of [timestamp, ax, ay, az], or None when the source is exhausted.
+        """
+        raise NotImplementedError
+
+    def __run(self):
+        """
+        Source thread. Produces blocks until closed or exhausted.
+        """
+        while not self.shouldExit:
+            if self.speed > 0:
+                time.sleep(self.blockInterval)
+                rows = self.nextBlock((time.time() - self.startTime) * self.speed)
+            else:
+                rows = self.nextBlock(None)
+            if rows is None:
+                print(f'{type(self).__name__} finished.')
+                break
+            if len(rows):
+                self.callback({'acceleration': rows})
+
+    def send_config_command(self, cmd):
+        """
+        Configuration commands are ignored by default.
+        """
+        print(f'{type(self).__name__} ignored config command: {cmd}')
+
+    def close(self):
+        """
+        Stop the source thread.
+        """
+        self.shouldExit = True
+        self.thread.join()
+
+
+class SyntheticSource(SimulatedSource):
+    """
+    Generates an SCG-like signal (see syntheticAcceleration()) at a fixed rate. Return rate commands are applied, so
+    the rate can be changed from the IMU menu like a real IMU.
+    """
+
+    def __init__(self, callback, rate=200.0, heartRate=70.0, speed=1.0):
+        """
+        Args:
+            callback (callable): Called from the source thread with each block of channels.
+            rate (float, optional): Sample rate in Hz. Defaults to 200.
+            heartRate (float, optional): Simulated heart rate in beats per minute. Defaults to 70.
+            speed (float, optional): Playback speed relative to real time, 0 runs as fast as possible. Defaults to 1.
+        """
+        self.rate = rate
+        self.heartRate = heartRate
+        self.rng = np.random.default_rng()
+        self.sampleTime = 0.0  # Simulated time of the next sample.
+        self.timeOrigin = time.time()  # Timestamp of simulated time 0.
+        super().__init__(callback, speed)
+
+    def nextBlock(self, elapsed):
+        end = self.sampleTime + 0.1 if elapsed is None else elapsed
+        count = int((end - self.sampleTime) * self.rate)
+        if count <= 0:
+            return np.empty((0, 4))
+        t = self.sampleTime + np.arange(count) / self.rate
+        self.sampleTime += count / self.rate
+        return np.column_stack((self.timeOrigin + t, syntheticAcceleration(t, self.heartRate, rng=self.rng)))
+
+    def send_config_command(self, cmd):
+        if cmd.register == wm.protocol.Register.rate and cmd.data in RETURN_RATES:
+            self.rate = RETURN_RATES[cmd.data]
+            print(f'SyntheticSource rate set to {self.rate}Hz.')
+        else:
+            super().send_config_command(cmd)
+
+
+class ReplaySource(SimulatedSource):
+    """
+    Streams an existing log file (text or binary) with its original timing, or faster. The timestamps of the replayed
+    samples are the ones in the log. For a merged log of several IMUs the first IMU's columns are replayed.
+    """
+
+    def __init__(self, callback, filePath, speed=1.0, loop=False):
+        """
+        Args:
+            callback (callable): Called from the source thread with each block of channels.
+            filePath (Path): Text or binary log to replay.
+            speed (float, optional): Playback speed relative to real time, 0 runs as fast as possible. Defaults to 1.
+            loop (bool, optional): Start again from the beginning at the end of the log. Defaults to False.
+        """
+        filePath = Path(filePath)
+        if filePath.suffix == LogFormat.BINARY_EXTENSION:
+            _, timestamps, acceleration = LogFormat.readBinaryLog(filePath)
+        else:
+            timestamps, acceleration = LogFormat.readTextLog(filePath)
+        if len(timestamps) == 0:
+            raise ValueError(f'{filePath} contains no samples.')
+        self.rows = np.column_stack((timestamps, acceleration[:, :3]))
+        self.relativeTimes = timestamps - timestamps[0]
+        self.duration = self.relativeTimes[-1] + (np.median(np.diff(timestamps)) if len(timestamps) > 1 else 0.0)
+        self.loop = loop
+        self.index = 0  # Next row to emit.
+        self.loopOffset = 0.0  # Time added to the timestamps of the current loop.
+        print(f'Replaying {len(self.rows)} samples from {filePath}.')
+        super().__init__(callback, speed)
+
+    def nextBlock(self, elapsed):
+        if self.index >= len(self.rows):
+            if not self.loop:
+                return None
+            self.index = 0
+            self.loopOffset += self.duration
+        if elapsed is None:
+            end = min(self.index + 1000, len(self.rows))
+        else:
+            end = int(np.searchsorted(self.relativeTimes, elapsed - self.loopOffset, side='right'))
+        rows = self.rows[self.index:end].copy()
+        rows[:, 0] += self.loopOffset
+        self.index = max(end, self.index)
+        return rows
+
+
+class FakeSerialDevice:
+    """
+    Emulates a Witmotion IMU on a pseudo-terminal. Time, acceleration, angle and quaternion frames are written at the
+    given rate, with the synthetic SCG-like acceleration signal. The time frames carry the wall clock time in the IMU's
+    date convention (see WitmotionParser.encodeTimeFrames()), which both serial backends decode to the same
+    timestamps. Connect to self.path with either serial backend. Linux/macOS only.
+    """
+
+    def __init__(self, rate=200.0, heartRate=70.0, blockInterval=0.02):
+        """
+        Create the pseudo-terminal and start writing frames.
+
+        Args:
+            rate (float, optional): Output rate in Hz. Defaults to 200.
+            heartRate (float, optional): Simulated heart rate in beats per minute. Defaults to 70.
+            blockInterval (float, optional): Time between writes in seconds. Defaults to 0.02.
+        """
+        import tty  # Unix only, so only imported when a fake device is created.
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        # Like a real serial port, data is lost rather than blocking the device when nobody is reading.
+        os.set_blocking(self.master, False)
+        self.path = os.ttyname(self.slave)
+        self.rate = rate
+        self.heartRate = heartRate
+        self.blockInterval = blockInterval
+        self.rng = np.random.default_rng()
+        self.framesWritten = 0
+        self.silentUntil = 0.0  # Wall clock time until which no frames are written, see dropOut().
+        self.shouldExit = False
+        self.thread = threading.Thread(target=self.__run, name='FakeSerialDevice', daemon=True)
+        self.thread.start()
+        print(f'Fake Witmotion IMU running on {self.path} at {self.rate}Hz.')
+
+    def __encodeBlock(self, t, timeOrigin) -> bytes:
+        """
+        Encode one block of samples as interleaved time, acceleration, angle and quaternion frames.
+
+        Args:
+            t (np.ndarray): Sample times relative to timeOrigin, shape (n,).
+            timeOrigin (float): Wall clock time of t = 0.
+
+        Returns:
+            data (bytes): Encoded frames.
+        """
+        n = len(t)
+        raw = np.zeros((n, 4))
+        raw[:, :3] = syntheticAcceleration(t, self.heartRate, rng=self.rng) * 32768 / (16 * WitmotionParser.G)
+        raw[:, 3] = 2500  # 25 degrees Celsius.
+        angle = np.zeros((n, 4))
+        quaternion = np.tile([32767, 0, 0, 0], (n, 1))
+
+        frameBlocks = [
+            np.frombuffer(WitmotionParser.encodeTimeFrames(timeOrigin + t), dtype=np.uint8),
+            np.frombuffer(WitmotionParser.encodeFrames(WitmotionParser.ACCELERATION, np.round(raw)), dtype=np.uint8),
+            np.frombuffer(WitmotionParser.encodeFrames(WitmotionParser.ANGLE, angle), dtype=np.uint8),
+            np.frombuffer(WitmotionParser.encodeFrames(WitmotionParser.QUATERNION, quaternion), dtype=np.uint8)
+        ]
+        # Interleave so that every sample's frames are sent together, as the IMU does.
+        return np.hstack([block.reshape(n, WitmotionParser.FRAME_LENGTH) for block in frameBlocks]).tobytes()
+
+    def __run(self):
+        """
+        Writer thread. Writes the frames that are due every block interval until closed.
+        """
+        timeOrigin = time.time()
+        sampleTime = 0.0
+        while not self.shouldExit:
+            time.sleep(self.blockInterval)
+            count = int((time.time() - timeOrigin - sampleTime) * self.rate)
+            if count <= 0:
+                continue
+            t = sampleTime + np.arange(count) / self.rate
+            sampleTime += count / self.rate
+            if time.time() < self.silentUntil:
+                continue
+            try:
+                os.write(self.master, self.__encodeBlock(t, timeOrigin))
+                self.framesWritten += 4 * count
+            except BlockingIOError:
+                pass
+            except OSError:
+                break
+
+    def dropOut(self, seconds):
+        """
+        Stop writing frames for the given time, like a Bluetooth link that dropped out. The samples of that time are
+        lost, the IMU clock keeps running.
+
+        Args:
+            seconds (float): Length of the drop-out in seconds.
+        """
+        self.silentUntil = time.time() + seconds
+
+    def close(self):
+        """
+        Stop writing and close the pseudo-terminal.
+        """
+        self.shouldExit = True
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
@@ -0,0 +1,353 @@
+"""
+Time alignment of several IMUs. Each IMU acquires on its own thread and publishes to its own sample channel, the
+merger combines the streams into one, resampled onto a common timeline, that is logged and plotted like the samples of
+a single IMU.
+"""
+import json
+import threading
+import time
+
+import numpy as np
+
+import constants as c
+import Filters
+import LogFormat
+from Acquisition import SampleChannel
+from BeatDetector import BeatDetector
+from ClockSync import ClockSync
+from Instrumentation import profiler
+from SignalStats import SignalStats
+from LogWriter import LogWriter
+from RingBuffer import RingBuffer
+
+
+class StreamMerger:
+    """
+    Merges the sample streams of several IMUs onto a common time grid. A merger thread wakes up every poll interval
+    and reads the new samples of each IMU from its own subscription, so the acquisition threads are never blocked.
+
+    The IMU timestamps come from independent clocks, so each stream is first mapped onto the host's monotonic clock,
+    which is shared by all IMUs (IMU.samples carries the time.monotonic() each sample arrived at). A ClockSync per
+    stream fits the offset and drift of its IMU clock from the samples that arrived with the least delay. The aligned
+    streams are linearly interpolated at the merged rate and published
+    to self.samples as rows of [timestamp, ax1, ay1, az1, ax2, ay2, az2, ...], with wall clock timestamps like the
+    samples of a single IMU.
+
+    The grid only advances as far as every live stream has data. A stream that has not delivered samples for the stale
+    timeout (e.g. disconnected) no longer holds the others back, its columns are NaN until it delivers again.
+    """
+
+    def __init__(self, imus, rate=200.0, pollInterval=0.05, staleTimeout=1.0):
+        """
+        Initialise a merger of the given IMUs. Samples published after this are merged once start() is called.
+
+        Args:
+            imus (list[IMU.IMU]): IMUs to merge, in column order.
+            rate (float, optional): Rate of the merged stream in Hz. Defaults to 200.
+            pollInterval (float, optional): Time between merges in seconds. Defaults to 0.05.
+            staleTimeout (float, optional): Time without samples after which a stream is no longer waited for, in
+                seconds. Defaults to 1.
+        """
+        self.imus = list(imus)
+        self.rate = rate
+        self.pollInterval = pollInterval
+        self.staleTimeout = staleTimeout
+        self.subscriptions = [imu.samples.subscribe() for imu in self.imus]
+
+        count = len(self.imus)
+        self.clocks = [ClockSync() for _ in range(count)]  # Fit of each IMU clock to the monotonic clock.
+        self.pending = [np.empty((0, 4)) for _ in range(count)]  # Aligned [time, ax, ay, az] not yet merged.
+        self.lastArrival = [None] * count  # Monotonic time samples last arrived from each stream.
+        self.gridStart = None  # Monotonic time of the first merged sample.
+        self.gridIndex = 0  # Index of the next merged sample.
+        self.wallOffset = time.time() - time.monotonic()  # Converts monotonic times to wall clock times.
+        self.startTime = time.monotonic()
+
+        self.samples = SampleChannel(columns=1 + 3 * count)  # Merged samples.
+
+        self.filterOption = c.FILTER_NONE  # One of constants.FILTER_OPTIONS, applied to the plot and log.
+        self.plotFilter = None  # Filters.FilterStage of the plot, None if not filtering.
+        self.beatDetector = BeatDetector(rate=rate)  # Live heart rate from the first IMU, run on the plot samples.
+        self.stats = SignalStats(channels=3 * count)  # Rolling signal statistics of every IMU.
+
+        self.plotWindow = c.PLOT_SECONDS_DEFAULT  # Plotted time in seconds, None for a fixed number of points.
+        self.plotSize = int(self.plotWindow * rate)  # Number of data points to plot.
+        # [timestamp, ax1, ay1, az1, norm1, filtered ax1, filtered ay1, filtered az1, ax2, ...].
+        self.plotData = RingBuffer(self.plotSize, columns=1 + 7 * count)
+        self.plotSubscription = self.samples.subscribe()
+        # Timers of the merge and the plot buffer update, see Instrumentation.py.
+        self.mergeTimer = profiler.stage('merger.merge')
+        self.plotDataTimer = profiler.stage('gui.plotData')
+
+        self.logWriter = None  # Background writer for the current/last merged log.
+        self.enableLogging = False  # Logging flag.
+        self.loggingPath = None  # Path to logging file.
+        self.logStartTime = time.time()  # Start time of log.
+
+        self.shouldExit = False
+        self.thread = threading.Thread(target=self.__run, name='StreamMerger', daemon=True)
+
+    def start(self):
+        """
+        Start the merger thread.
+        """
+        self.thread.start()
+
+    def close(self):
+        """
+        Stop an active log and the merger thread.
+        """
+        if self.enableLogging:
+            self.stopLogging()
+        self.shouldExit = True
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def __run(self):
+        """
+        Merger thread. Merges the available samples every poll interval until closed.
+        """
+        while not self.shouldExit:
+            time.sleep(self.pollInterval)
+            with self.mergeTimer.measure():
+                self.mergeAvailable()
+
+    def __align(self, index, rows):
+        """
+        Map new rows of one stream onto the monotonic clock and add them to its pending samples.
+
+        Args:
+            index (int): Stream index.
+            rows (np.ndarray): Rows of [timestamp, ax, ay, az, hostTime] read from the IMU.
+        """
+        self.clocks[index].update(rows[:, 0], rows[:, 4])
+        aligned = rows[:, :4].copy()
+        aligned[:, 0] = self.clocks[index].hostTimes(rows[:, 0])
+        pending = self.pending[index]
+        if len(pending):
+            # A refit can move the new samples back in time, they must not overlap earlier samples.
+            aligned[0, 0] = max(aligned[0, 0], pending[-1, 0])
+        aligned[:, 0] = np.maximum.accumulate(aligned[:, 0])
+        self.pending[index] = np.concatenate((pending, aligned))
+
+    def mergeAvailable(self) -> int:
+        """
+        Read new samples from every IMU and publish the merged samples that every live stream has data for. Called
+        from the merger thread, or directly when the thread is not started.
+
+        Returns:
+            count (int): Number of merged samples published.
+        """
+        now = time.monotonic()
+        for i, subscription in enumerate(self.subscriptions):
+            rows = subscription.read()
+            if len(rows):
+                self.__align(i, rows)
+                self.lastArrival[i] = now
+
+        live = [i for i, arrival in enumerate(self.lastArrival)
+                if arrival is not None and now - arrival < self.staleTimeout]
+        if not live:
+            return 0
+        if self.gridStart is None:
+            waiting = [i for i, imu in enumerate(self.imus) if imu.isConnected and self.lastArrival[i] is None]
+            if waiting and now - self.startTime < self.staleTimeout:
+                # Give every connected IMU the chance to deliver its first samples.
+                return 0
+            self.gridStart = max(self.pending[i][0, 0] for i in live)
+
+        end = min(self.pending[i][-1, 0] for i in live)
+        first = self.gridIndex
+        last = int(np.floor((end - self.gridStart) * self.rate))
+        if last < first:
+            return 0
+        grid = self.gridStart + np.arange(first, last + 1) / self.rate
+        self.gridIndex = last + 1
+
+        merged = np.empty((len(grid), 1 + 3 * len(self.imus)))
+        merged[:, 0] = grid + self.wallOffset
+        for i, pending in enumerate(self.pending):
+            for j in range(3):
+                if len(pending):
+                    merged[:, 1 + 3 * i + j] = np.interp(grid, pending[:, 0], pending[:, 1 + j], left=np.nan,
+                                                         right=np.nan)
+                else:
+                    merged[:, 1 + 3 * i + j] = np.nan
+            # Keep the last sample before the next grid time for the next interpolation.
+            keep = max(int(np.searchsorted(pending[:, 0], grid[-1], side='right')) - 1, 0)
+            self.pending[i] = pending[keep:]
+        self.samples.publishBlock(merged)
+        return len(merged)
+
+    def updatePlotData(self) -> int:
+        """
+        Move newly merged samples into the plot buffer, adding the acceleration norm and the filtered accelerations
+        (NaN if not filtering) of each IMU. The heart rate is detected from the first IMU. Called from the GUI thread.
+
+        Returns:
+            count (int): Number of new samples.
+        """
+        start = time.perf_counter_ns()
+        rows = self.plotSubscription.read()
+        if len(rows):
+            count = len(self.imus)
+            self.beatDetector.process(rows)
+            self.stats.update(rows)
+            if self.plotFilter:
+                rows = self.plotFilter.process(rows)
+            else:
+                rows = np.column_stack((rows, np.full((len(rows), 3 * count), np.nan)))
+            acceleration = rows[:, 1:1 + 3 * count].reshape(len(rows), count, 3)
+            filtered = rows[:, 1 + 3 * count:].reshape(len(rows), count, 3)
+            norm = np.sqrt(np.einsum('ijk,ijk->ij', acceleration, acceleration))
+            traces = np.concatenate((acceleration, norm[:, :, None], filtered), axis=2).reshape(len(rows), -1)
+            self.plotData.extend(np.column_stack((rows[:, 0], traces)))
+        self.plotDataTimer.record(start)
+        return len(rows)
+
+    def getHeartRate(self):
+        """
+        Returns:
+            bpm (float): Current heart rate from the first IMU in beats per minute, None if no heartbeat is detected.
+        """
+        return self.beatDetector.bpm
+
+    def getSignalStats(self) -> dict:
+        """
+        Returns:
+            stats (dict): Rolling signal statistics of the last seconds, channels of every IMU in column order, see
+                SignalStats.summary().
+        """
+        return self.stats.summary()
+
+    def setFilter(self, option):
+        """
+        Set the filter applied to the plot and to logs started from now on. All IMUs are filtered at once. The plot
+        data is cleared, as the filtered (and possibly decimated) samples do not continue the old ones.
+
+        Args:
+            option (str): One of constants.FILTER_OPTIONS.
+        """
+        self.filterOption = option
+        self.plotFilter = Filters.createFilterStage(option, channels=3 * len(self.imus), rate=self.rate)
+        self.plotData.clear()
+        if self.plotWindow:
+            self.setPlotWindow(self.plotWindow)
+
+    def getPlotDatasets(self) -> list:
+        """
+        Return the plot buffer split per IMU, as used by Plotter.update().
+
+        Returns:
+            datasets (list[tuple[np.ndarray, np.ndarray]]): (relative times, [ax, ay, az, norm, filtered ax,
+                filtered ay, filtered az]) of each IMU, views into the plot buffer.
+        """
+        data = self.plotData.getView()
+        if len(data) == 0:
+            return []
+        t = data[:, 0] - data[0, 0]
+        return [(t, data[:, 1 + 7 * i:8 + 7 * i]) for i in range(len(self.imus))]
+
+    def resetPlotData(self):
+        """
+        Clear plot data.
+        """
+        self.plotData.clear()
+
+    def setPlotSize(self, plotSize):
+        """
+        Set a fixed number of data points to plot, instead of a plot window in seconds. The plot buffer is resized,
+        keeping the most recent points.
+
+        Args:
+            plotSize (int): Number of data points to plot.
+        """
+        self.plotWindow = None
+        self.plotSize = int(plotSize)
+        self.plotData.resize(self.plotSize)
+
+    def setPlotWindow(self, seconds):
+        """
+        Set the plotted time in seconds. The merged rate is fixed, so the plot buffer size only changes with the
+        window and the decimation of the filter.
+
+        Args:
+            seconds (float): Plotted time in seconds.
+        """
+        rate = self.rate / (self.plotFilter.decimation if self.plotFilter else 1)
+        self.plotWindow = seconds
+        self.plotSize = min(max(int(round(seconds * rate)), 10), c.PLOT_POINTS_MAX)
+        self.plotData.resize(self.plotSize)
+
+    def startLogging(self, filePath, binary=False, segmentSeconds=None):
+        """
+        Enable logging of the merged stream. The settings of every IMU are stored in a settings file next to the log
+        (see LogFormat.settingsPath()). If a filter is set the filtered accelerations of every IMU are logged after the
+        raw ones. The heartbeats detected from the first IMU are written to a beats file next to the log.
+
+        Args:
+            filePath (Path): Path to the log file.
+            binary (bool, optional): Use the binary log format. Defaults to False.
+            segmentSeconds (float, optional): Split the log into segments of this length (also closed at
+                constants.LOG_SEGMENT_BYTES). Defaults to None (a single file).
+
+        Raises:
+            OSError: If the log can not be created.
+            ValueError: If the binary log header is too large, nothing is created.
+        """
+        self.loggingPath = filePath
+        print(f'Starting merged logging of {len(self.imus)} IMUs: {self.loggingPath}')
+        self.logStartTime = time.time()
+        # The settings of every IMU would overflow the fixed size binary header, the header only has their ports.
+        header = {
+            'imuCount': len(self.imus),
+            'comPorts': [imu.comPort for imu in self.imus],
+            'mergedRate': self.rate,
+            'filter': self.filterOption
+        }
+        filterStage = Filters.createFilterStage(self.filterOption, channels=3 * len(self.imus), rate=self.rate)
+        self.logWriter = LogWriter(self.samples.subscribe(), self.loggingPath, self.logStartTime, binary=binary,
+                                   header=header, filterStage=filterStage, beatDetector=BeatDetector(rate=self.rate),
+                                   segmentSeconds=segmentSeconds,
+                                   segmentBytes=c.LOG_SEGMENT_BYTES if segmentSeconds else None)
+        self.logWriter.start()
+        with open(LogFormat.settingsPath(filePath), 'w') as file:
+            json.dump({'imus': [imu.getLogHeader() for imu in self.imus]}, file, indent=2)
+        self.enableLogging = True
+
+    def stopLogging(self):
+        """
+        Disable logging. The remaining lines are written in the background, so this returns immediately.
+
+        Returns:
+            error (Exception): Error that stopped a log writer early, None if the log was written without errors.
+        """
+        self.enableLogging = False
+        print('Stopping merged logging.')
+        error = self.getLogError()
+        if error:
+            print(f'The log was incomplete, writing stopped after an error: {error}')
+        self.logWriter.stop()
+        return error
+
+    def getLogError(self) -> Exception:
+        """
+        Returns:
+            error (Exception): Error that stopped the log writer of the current (or last) log, None if there was none.
+        """
+        return self.logWriter.error if self.logWriter else None
+
+    def getLinesLogged(self) -> int:
+        """
+        Returns:
+            linesLogged (int): Number of lines written by the log writer.
+        """
+        return self.logWriter.linesWritten if self.logWriter else 0
+
+    def getDroppedSamples(self) -> int:
+        """
+        Returns:
+            dropped (int): Number of samples lost because the merger, plot or log fell too far behind.
+        """
+        return (sum(subscription.dropped for subscription in self.subscriptions) + self.plotSubscription.dropped +
+                (self.logWriter.droppedLines if self.logWriter else 0))
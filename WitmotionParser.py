@@ -0,0 +1,242 @@
+"""
+Built-in parser for the Witmotion serial protocol. Every frame is 11 bytes: 0x55 header, frame type, 8 byte payload
+(four little-endian int16 values) and a checksum, which is the low byte of the sum of the first 10 bytes. The parser
+decodes a whole chunk of serial data at once with NumPy instead of handling one message at a time.
+"""
+import time
+
+import numpy as np
+
+FRAME_LENGTH = 11
+HEADER = 0x55
+G = 9.8  # Same value of g used by the Witmotion module.
+
+TIME = 0x50
+ACCELERATION = 0x51
+ANGULAR_VELOCITY = 0x52
+ANGLE = 0x53
+MAGNETIC = 0x54
+QUATERNION = 0x59
+
+# Frame type -> (channel name, scale applied to the first three/four payload values, number of values used).
+FRAME_TYPES = {
+    ACCELERATION: ('acceleration', 16 * G / 32768, 3),
+    ANGULAR_VELOCITY: ('angularVelocity', 2000 / 32768, 3),
+    ANGLE: ('angle', 180 / 32768, 3),
+    MAGNETIC: ('magnetic', 1, 3),
+    QUATERNION: ('quaternion', 1 / 32768, 4)
+}
+
+_FRAME_OFFSETS = np.arange(FRAME_LENGTH)
+
+
+class WitmotionParser:
+    """
+    Stateful parser for a stream of Witmotion frames. Bytes are passed in with feed(), which returns every complete
+    frame decoded into NumPy arrays, one array per channel. Bytes of an incomplete frame at the end of a chunk are kept
+    for the next call.
+
+    Each decoded row starts with a timestamp. If the IMU sends time frames, a row is given the time of the latest
+    preceding time frame (in seconds since the epoch, like the Witmotion module). Otherwise the rows of a chunk are
+    spread evenly between the host times of the previous and current chunks.
+    """
+
+    def __init__(self):
+        self.remainder = b''  # Unparsed bytes at the end of the last chunk.
+        self.lastTimestamp = None  # Last time frame decoded, carried over between chunks.
+        self.lastChunkTime = None  # Host time the last chunk was received.
+        self.frameCount = 0  # Valid frames decoded.
+        self.checksumErrors = 0  # Header and type matches rejected by the checksum (includes 0x55 inside payloads).
+
+    def feed(self, data, receiveTime=None) -> dict:
+        """
+        Parse a chunk of serial data.
+
+        Args:
+            data (bytes): Bytes read from the serial port.
+            receiveTime (float, optional): Host time the chunk was read. Defaults to time.time().
+
+        Returns:
+            channels (dict[str, np.ndarray]): Channel name -> array of rows [timestamp, values...], for every channel
+                in FRAME_TYPES that had at least one frame in the chunk.
+        """
+        if receiveTime is None:
+            receiveTime = time.time()
+        buffer = np.frombuffer(self.remainder + data, dtype=np.uint8)
+        positions = self.__findFrames(buffer)
+
+        if len(positions):
+            self.remainder = buffer[max(positions[-1] + FRAME_LENGTH, len(buffer) - FRAME_LENGTH + 1):].tobytes()
+        else:
+            self.remainder = buffer[max(len(buffer) - FRAME_LENGTH + 1, 0):].tobytes()
+
+        channels = {}
+        if len(positions) == 0:
+            self.lastChunkTime = receiveTime
+            return channels
+
+        frames = buffer[positions[:, None] + _FRAME_OFFSETS]
+        types = frames[:, 1]
+        payload = np.ascontiguousarray(frames[:, 2:10]).view('<i2')
+        timestamps = self.__frameTimes(frames, types, receiveTime)
+        self.frameCount += len(positions)
+
+        for frameType, (name, scale, count) in FRAME_TYPES.items():
+            selected = types == frameType
+            if selected.any():
+                rows = np.empty((int(selected.sum()), count + 1))
+                rows[:, 0] = timestamps[selected]
+                rows[:, 1:] = payload[selected, :count] * scale
+                channels[name] = rows
+        return channels
+
+    def __findFrames(self, buffer) -> np.ndarray:
+        """
+        Find the start positions of all complete frames with a valid header, type and checksum.
+
+        Args:
+            buffer (np.ndarray): uint8 array of the bytes to search.
+
+        Returns:
+            positions (np.ndarray): Sorted, non-overlapping start positions.
+        """
+        n = len(buffer)
+        if n < FRAME_LENGTH:
+            return np.empty(0, dtype=np.intp)
+        candidates = np.flatnonzero(buffer[:n - FRAME_LENGTH + 1] == HEADER)
+        types = buffer[candidates + 1]
+        candidates = candidates[(types >= TIME) & (types <= QUATERNION)]
+
+        sums = np.concatenate(([0], np.cumsum(buffer, dtype=np.int64)))
+        checksums = (sums[candidates + FRAME_LENGTH - 1] - sums[candidates]) & 0xFF
+        valid = checksums == buffer[candidates + FRAME_LENGTH - 1]
+        self.checksumErrors += int(len(candidates) - valid.sum())
+        positions = candidates[valid]
+
+        if len(positions) > 1 and np.any(np.diff(positions) < FRAME_LENGTH):
+            # A 0x55 inside a frame produced a second match, keep the first of any overlapping frames.
+            kept = []
+            nextFree = -1
+            for position in positions.tolist():
+                if position >= nextFree:
+                    kept.append(position)
+                    nextFree = position + FRAME_LENGTH
+            positions = np.asarray(kept, dtype=np.intp)
+        return positions
+
+    def __frameTimes(self, frames, types, receiveTime) -> np.ndarray:
+        """
+        Work out the timestamp of every frame in a chunk.
+
+        Args:
+            frames (np.ndarray): uint8 array of shape (n, FRAME_LENGTH).
+            types (np.ndarray): Frame type of each frame.
+            receiveTime (float): Host time the chunk was read.
+
+        Returns:
+            timestamps (np.ndarray): float64 array of shape (n,).
+        """
+        isTime = types == TIME
+        if isTime.any() or self.lastTimestamp is not None:
+            times = np.full(len(frames), np.nan)
+            times[isTime] = decodeTimeFrames(frames[isTime])
+            # Forward fill from the latest preceding time frame.
+            latest = np.where(isTime, np.arange(len(frames)), -1)
+            latest = np.maximum.accumulate(latest)
+            timestamps = np.where(latest >= 0, times[np.maximum(latest, 0)],
+                                  self.lastTimestamp if self.lastTimestamp is not None else receiveTime)
+            if isTime.any():
+                self.lastTimestamp = float(times[isTime][-1])
+        else:
+            start = self.lastChunkTime if self.lastChunkTime is not None else receiveTime
+            timestamps = start + (receiveTime - start) * np.arange(1, len(frames) + 1) / len(frames)
+        self.lastChunkTime = receiveTime
+        return timestamps
+
+
+def decodeTimeFrames(frames) -> np.ndarray:
+    """
+    Decode time frames (YY MM DD hh mm ss ms(uint16)) to seconds since the epoch. The IMU sends the date as the year
+    after 2000 and the month and day counted from 1. This is the only decoding of time frames, IMU.TimeMessage applies
+    it to the Witmotion module too, so the device timestamps do not depend on the backend.
+
+    Args:
+        frames (np.ndarray): uint8 array of time frames, shape (n, FRAME_LENGTH).
+
+    Returns:
+        timestamps (np.ndarray): float64 array of shape (n,).
+    """
+    payload = frames[:, 2:10].astype(np.int64)
+    months = payload[:, 0] * 12 + np.clip(payload[:, 1], 1, 12) - 1
+    days = (np.datetime64('2000-01', 'M') + months).astype('datetime64[D]') + np.clip(payload[:, 2], 1, 31) - 1
+    seconds = days.astype(np.int64) * 86400 + payload[:, 3] * 3600 + payload[:, 4] * 60 + payload[:, 5]
+    return seconds + (payload[:, 6] | (payload[:, 7] << 8)) / 1000
+
+
+def decodeTimePayload(body) -> float:
+    """
+    Decode the payload of a single time frame, see decodeTimeFrames().
+
+    Args:
+        body (bytes): The 8 payload bytes of the frame.
+
+    Returns:
+        timestamp (float): Seconds since the epoch.
+    """
+    frame = np.zeros((1, FRAME_LENGTH), dtype=np.uint8)
+    frame[0, 2:10] = np.frombuffer(body, dtype=np.uint8)
+    return float(decodeTimeFrames(frame)[0])
+
+
+def encodeFrames(frameType, values) -> bytes:
+    """
+    Encode frames of one type, the inverse of the decoding done by WitmotionParser. Used to emulate an IMU.
+
+    Args:
+        frameType (int): Frame type, e.g. ACCELERATION.
+        values (np.ndarray): Raw int16 payload values, shape (n, 4).
+
+    Returns:
+        data (bytes): n encoded frames.
+    """
+    values = np.asarray(values, dtype='<i2').reshape(-1, 4)
+    frames = np.empty((len(values), FRAME_LENGTH), dtype=np.uint8)
+    frames[:, 0] = HEADER
+    frames[:, 1] = frameType
+    frames[:, 2:10] = values.view(np.uint8)
+    frames[:, 10] = frames[:, :10].sum(axis=1, dtype=np.int64) & 0xFF
+    return frames.tobytes()
+
+
+def encodeTimeFrames(timestamps) -> bytes:
+    """
+    Encode timestamps as time frames, the inverse of decodeTimeFrames(), in the IMU's date convention (year after 2000,
+    month and day from 1). Used to emulate an IMU.
+
+    Args:
+        timestamps (np.ndarray): Seconds since the epoch, shape (n,).
+
+    Returns:
+        data (bytes): n encoded time frames.
+    """
+    milliseconds = np.round(np.asarray(timestamps, dtype=np.float64) * 1000).astype(np.int64)
+    seconds = milliseconds // 1000
+    days = (seconds // 86400).astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    monthIndex = months.astype(np.int64) - np.datetime64('2000-01', 'M').astype(np.int64)
+    timeOfDay = seconds % 86400
+    ms = milliseconds % 1000
+
+    frames = np.empty((len(milliseconds), FRAME_LENGTH), dtype=np.uint8)
+    frames[:, 0] = HEADER
+    frames[:, 1] = TIME
+    frames[:, 2] = monthIndex // 12
+    frames[:, 3] = monthIndex % 12 + 1
+    frames[:, 4] = (days - months.astype('datetime64[D]')).astype(np.int64) + 1
+    frames[:, 5] = timeOfDay // 3600
+    frames[:, 6] = timeOfDay // 60 % 60
+    frames[:, 7] = timeOfDay % 60
+    frames[:, 8] = ms & 0xFF
+    frames[:, 9] = ms >> 8
+    frames[:, 10] = frames[:, :10].sum(axis=1, dtype=np.int64) & 0xFF
+    return frames.tobytes()
@@ -0,0 +1,88 @@
+"""
+Serial reader for the built-in Witmotion parser. An alternative to the Witmotion module's receive thread, which reads
+one byte at a time and calls back into Python for every message.
+"""
+import struct
+import threading
+import time
+
+import serial
+
+from Instrumentation import profiler
+from WitmotionParser import WitmotionParser
+
+# Command that unlocks the IMU configuration registers, sent before every configuration command.
+UNLOCK_REGISTER = 0x69
+UNLOCK_DATA = 0xB588
+
+
+class WitmotionReader:
+    """
+    Owns the serial port and a receive thread that reads large chunks of data and decodes them with a
+    WitmotionParser. Every decoded chunk is passed to the callback as a dictionary of channel arrays (see
+    WitmotionParser.feed()).
+
+    The interface mirrors the parts of the Witmotion module's IMU class that are used by IMU.IMU (send_config_command,
+    close and ser), so IMU.IMU can use either.
+    """
+
+    def __init__(self, path, baudrate, callback, chunkSize=4096, readTimeout=0.02):
+        """
+        Open the serial port and start the receive thread.
+
+        Args:
+            path (str): COM port (or device path) of the IMU.
+            baudrate (int): Baud rate of the IMU.
+            callback (callable): Called from the receive thread with each decoded chunk.
+            chunkSize (int, optional): Maximum number of bytes read at once. Defaults to 4096.
+            readTimeout (float, optional): Serial read timeout in seconds. A read returns after this time with whatever
+                has arrived, so it sets how many frames are batched together. Defaults to 0.02.
+        """
+        self.ser = serial.Serial(path, baudrate=baudrate, timeout=readTimeout)
+        self.parser = WitmotionParser()
+        self.callback = callback
+        self.chunkSize = chunkSize
+        self.shouldExit = False
+        self.writeLock = threading.Lock()  # Serialises configuration commands.
+        self.parseTimer = profiler.stage('reader.parse')
+        self.rxThread = threading.Thread(target=self.__rxLoop, name='WitmotionReader', daemon=True)
+        self.rxThread.start()
+
+    def __rxLoop(self):
+        """
+        Receive thread. Reads chunks from the serial port until closed.
+        """
+        while not self.shouldExit:
+            try:
+                data = self.ser.read(self.chunkSize)
+            except serial.SerialException as e:
+                if not self.shouldExit:
+                    print(f'Error reading from {self.ser.port}: {e}')
+                break
+            if data:
+                start = time.perf_counter_ns()
+                channels = self.parser.feed(data, time.time())
+                self.parseTimer.record(start)
+                if channels:
+                    self.callback(channels)
+
+    def send_config_command(self, cmd):
+        """
+        Send a configuration command to the IMU, preceded by the unlock command. Same as the Witmotion module's
+        IMU.send_config_command().
+
+        Args:
+            cmd (witmotion.protocol.ConfigCommand): Command to send. Only cmd.register.value and cmd.data are used.
+        """
+        with self.writeLock:
+            for register, data in ((UNLOCK_REGISTER, UNLOCK_DATA), (cmd.register.value, cmd.data)):
+                self.ser.write(struct.pack('<BBBH', 0xFF, 0xAA, register, data))
+                # The IMU doesn't like receiving commands too quickly.
+                time.sleep(0.1)
+
+    def close(self):
+        """
+        Stop the receive thread. The serial port is closed separately through self.ser, as with the Witmotion module.
+        """
+        self.shouldExit = True
+        self.rxThread.join()
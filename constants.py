@@ -40,8 +40,111 @@ IMU_BANDWIDTH_OPTIONS = [
     "5Hz"
 ]
 
+# Backends the IMU can be connected with. The Witmotion module and the built-in parser read from the COM port, the
+# synthetic signal and log file replay backends simulate an IMU for testing without hardware.
+BACKEND_WITMOTION = 'Witmotion module'
+BACKEND_PARSER = 'Built-in parser'
+BACKEND_SYNTHETIC = 'Synthetic signal'
+BACKEND_REPLAY = 'Replay log file'
+IMU_BACKEND_OPTIONS = [
+    BACKEND_WITMOTION,
+    BACKEND_PARSER,
+    BACKEND_SYNTHETIC,
+    BACKEND_REPLAY
+]
+
 # Available algorithms for the IMU, either 6-axis (without magnetometer) or 9-axis.
 IMU_ALGORITHM_OPTIONS = [
     '6-Axis (without magnetometer)',
     '9-Axis (with magnetometer)'
 ]
+
+# Channels captured besides the acceleration, one stream per message type of the IMU (see Acquisition.ChannelStore).
+# Channel name (as in WitmotionParser.FRAME_TYPES) -> (display name, unit, names of the values).
+IMU_CHANNELS = {
+    'angularVelocity': ('Angular Velocity', 'deg/s', ('X', 'Y', 'Z')),
+    'angle': ('Angle', 'deg', ('Roll', 'Pitch', 'Yaw')),
+    'magnetic': ('Magnetic Field', 'raw', ('X', 'Y', 'Z')),
+    'quaternion': ('Quaternion', '', ('W', 'X', 'Y', 'Z'))
+}
+# Channel plotted for each plot channel option, None for the accelerations (with their norm and filtered values).
+PLOT_CHANNEL_ACCELERATION = 'Acceleration'
+PLOT_CHANNEL_OPTIONS = dict([(PLOT_CHANNEL_ACCELERATION, None)] +
+                            [(display, name) for name, (display, _, _) in IMU_CHANNELS.items()])
+
+# Maximum number of points that can be plotted, 60 seconds of data at 200Hz. The plot is decimated before drawing so a
+# deep plot window does not slow down the frame rate.
+PLOT_POINTS_MAX = 12000
+
+# Plot window in seconds. The plot buffer is sized from the window and the measured return rate of the IMU.
+PLOT_SECONDS_DEFAULT = 5
+PLOT_SECONDS_MAX = 60
+
+# Segmented recording: a long log can be split into files of the given length (see LogWriter.py), so a crash costs at
+# most one segment. Segments are also closed once they reach LOG_SEGMENT_BYTES.
+LOG_SEGMENT_OPTIONS = {
+    'Single file': None,
+    '5 minute segments': 5 * 60,
+    '15 minute segments': 15 * 60,
+    '60 minute segments': 60 * 60
+}
+LOG_SEGMENT_BYTES = 100 * 1024 * 1024
+
+# Filters that can be applied to the acceleration stream, see Filters.py. The filtered accelerations are plotted and
+# logged next to the raw ones.
+FILTER_NONE = 'No filter'
+FILTER_SCG = 'SCG band-pass (1-40Hz)'
+FILTER_SCG_DECIMATED = 'SCG band-pass (1-40Hz), half rate'
+FILTER_GRAVITY = 'Gravity removal (0.5Hz high-pass)'
+FILTER_OPTIONS = [
+    FILTER_NONE,
+    FILTER_SCG,
+    FILTER_SCG_DECIMATED,
+    FILTER_GRAVITY
+]
+# Filter option -> FilterStage arguments.
+FILTER_SETTINGS = {
+    FILTER_SCG: {'highPass': 1.0, 'lowPass': 40.0},
+    FILTER_SCG_DECIMATED: {'highPass': 1.0, 'lowPass': 40.0, 'decimation': 2},
+    FILTER_GRAVITY: {'highPass': 0.5}
+}
+
+# Live stream server (see LiveStream.py): samples are published to local consumers on this TCP port. Each client has a
+# queue of at most LIVE_QUEUE_BATCHES batches, the oldest batch is dropped when a slow client's queue is full.
+LIVE_HOST = '127.0.0.1'
+LIVE_PORT = 5757
+LIVE_QUEUE_BATCHES = 100
+
+# Connection manager (see ConnectionManager.py): a connection is taken to have stalled when no samples arrive for
+# STALL_TIMEOUT seconds (or 5 sample intervals at low rates), it is then reconnected, retrying after a delay that
+# doubles from RECONNECT_BACKOFF_MIN up to RECONNECT_BACKOFF_MAX seconds.
+STALL_TIMEOUT = 2.0
+RECONNECT_BACKOFF_MIN = 0.5
+RECONNECT_BACKOFF_MAX = 30.0
+CONNECTION_DISCONNECTED = 'Disconnected'
+CONNECTION_CONNECTING = 'Connecting'
+CONNECTION_CONNECTED = 'Connected'
+CONNECTION_RECONNECTING = 'Reconnecting'
+CONNECTION_FAILED = 'Connection failed'
+
+# IMU port discovery (see PortDiscovery.py): every port is listened to for DISCOVERY_LISTEN_SECONDS at each baud rate,
+# a port is an IMU if at least DISCOVERY_MIN_FRAMES valid Witmotion frames arrive. Ports that do not answer within
+# DISCOVERY_TIMEOUT seconds (e.g. a Bluetooth port whose device is off) are given up. The last port and baud rate an
+# IMU delivered data on are stored in LAST_PORT_FILE, in the working directory.
+DISCOVERY_LISTEN_SECONDS = 0.3
+DISCOVERY_MIN_FRAMES = 3
+DISCOVERY_TIMEOUT = 15.0
+LAST_PORT_FILE = 'last port.json'
+
+# Instrumentation (see Instrumentation.py): every stage timer and counter keeps its last PROFILER_CAPACITY events, the
+# performance overlay summarises the last PROFILER_WINDOW seconds.
+PROFILER_CAPACITY = 8192
+PROFILER_WINDOW = 2.0
+
+# GUI refresh (see FrameScheduler.py): the plot is redrawn at up to GUI_TARGET_FPS frames per second when new samples
+# arrive, slower if drawing a frame takes more than GUI_RENDER_BUDGET of the frame interval, down to one frame every
+# GUI_MAX_FRAME_INTERVAL seconds. Without a live IMU or log the main window wakes every GUI_IDLE_INTERVAL seconds.
+GUI_TARGET_FPS = 30
+GUI_RENDER_BUDGET = 0.5
+GUI_MAX_FRAME_INTERVAL = 0.25
+GUI_IDLE_INTERVAL = 0.5
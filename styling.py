@@ -16,5 +16,9 @@ FONT_INFO = 'Helvetica 10'
 FONT_BTN = 'Helvetica 14 bold'
 # Font used on smaller buttons.
 FONT_BTN_SMALL = 'Helvetica 10 bold'
+# Font used for the performance overlay, monospaced so its columns line up.
+FONT_MONO = 'Courier 10'
 # Button colour when active
 COL_BTN_ACTIVE = '#cc493f'
+# Text colour of signal quality warnings.
+COL_TXT_WARNING = '#ff6b5e'
@@ -0,0 +1,95 @@
+import sys
+import threading
+import time
+
+import numpy as np
+
+import LogFormat
+from Acquisition import ChannelStore, SampleChannel
+from LogWriter import LogWriter
+
+
+def test_read_returns_rows_in_order_and_counts_overruns():
+    channel = SampleChannel(capacity=8, columns=2)
+    subscription = channel.subscribe()
+    channel.publishBlock(np.column_stack([np.arange(5)] * 2))
+    np.testing.assert_array_equal(subscription.read()[:, 0], np.arange(5))
+    channel.publishBlock(np.column_stack([np.arange(5, 25)] * 2))
+    np.testing.assert_array_equal(subscription.read()[:, 0], np.arange(17, 25))
+    assert subscription.dropped == 12 and subscription.available() == 0
+
+
+def test_producer_and_consumer_threads():
+    """
+    A producer publishes rows holding their own sequence number in every column, in blocks of varying size (some
+    larger than the ring), while a consumer reads on another thread. Every row read must be complete and in sequence,
+    after the rows counted as dropped.
+    """
+    channel = SampleChannel(capacity=16, columns=3)
+    subscription = channel.subscribe()
+    total = 200_000
+    done = threading.Event()
+
+    def produce():
+        rng = np.random.default_rng(0)
+        seq = 0
+        while seq < total:
+            n = int(rng.integers(1, 40))
+            if n == 1:
+                channel.publish((seq, seq, seq))
+            else:
+                channel.publishBlock(np.repeat(np.arange(seq, seq + n, dtype=np.float64)[:, None], 3, axis=1))
+            seq += n
+        done.set()
+
+    # Switch threads as often as possible, so the consumer runs between the steps of a publish.
+    switchInterval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    producer = threading.Thread(target=produce)
+    producer.start()
+    expected = 0
+    errors = []
+    while not done.is_set() or subscription.available():
+        dropped = subscription.dropped
+        rows = subscription.read()
+        expected += subscription.dropped - dropped
+        sequence = np.arange(expected, expected + len(rows))
+        if not (rows == sequence[:, None]).all():
+            errors.append((expected, rows[:, 0][rows[:, 0] != sequence][:5]))
+        expected += len(rows)
+    producer.join()
+    sys.setswitchinterval(switchInterval)
+    assert not errors, errors[:3]
+    assert expected == channel.writeSeq >= total
+
+
+def test_channel_store_publishes_each_channel_with_its_host_time():
+    store = ChannelStore({'angle': 3, 'quaternion': 4}, capacity=16)
+    angles = store['angle'].subscribe()
+    assert store.latest('angle') == () and 'angle' in store and 'time' not in store
+    decoded = {'angle': np.array([[1.0, 10, 20, 30], [2.0, 11, 21, 31]]), 'time': np.ones((1, 2)),
+               'quaternion': np.empty((0, 5))}
+    store.publishBlocks(decoded, hostTime=100.0)
+    store.publish('angle', 3.0, (12, 22, 32), 101.0)
+    np.testing.assert_array_equal(angles.read(), [[1, 10, 20, 30, 100], [2, 11, 21, 31, 100], [3, 12, 22, 32, 101]])
+    assert store.latest('angle') == (12, 22, 32)
+    assert store['quaternion'].writeSeq == 0
+
+
+def test_channel_logs_are_created_only_for_channels_with_samples(tmp_path):
+    store = ChannelStore({'angle': 3, 'magnetic': 3})
+    writers = {name: LogWriter(store[name].subscribe(), LogFormat.channelPath(tmp_path / 'log.txt', name), 0.0,
+                               pollInterval=0.01, columns=4, hostColumn=4, openOnData=True)
+               for name in ('angle', 'magnetic')}
+    for writer in writers.values():
+        writer.start()
+    deviceTimes = np.arange(50) / 10
+    store.publishBlocks({'angle': np.column_stack((deviceTimes, np.ones((50, 3))))}, hostTime=time.monotonic())
+    time.sleep(0.05)
+    for writer in writers.values():
+        writer.stop()
+        writer.join()
+    assert not LogFormat.channelPath(tmp_path / 'log.txt', 'magnetic').exists()
+    timestamps, values = LogFormat.readTextLog(tmp_path / 'log.angle.txt')
+    assert len(timestamps) == 50 and (values == 1).all()
+    assert writers['angle'].error is None and writers['magnetic'].error is None
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import BatchProcess
+import LogFormat
+from ClockSync import toNs
+from Simulation import syntheticAcceleration
+
+RATE = 200
+SECONDS = 30
+
+
+def writeLogs(directory):
+    """
+    Write a 30 second, 70 BPM synthetic recording as a text log and as a binary log of the same name.
+    """
+    t = np.arange(SECONDS * RATE) / RATE
+    hostNs = toNs(1_700_000_000 + t)
+    values = syntheticAcceleration(t, 70.0, rng=np.random.default_rng(0))
+    with open(directory / 'x.txt', 'w') as file:
+        file.write(LogFormat.formatTextLines(hostNs, hostNs, values))
+    with open(directory / 'x.scglog', 'wb') as file:
+        file.write(LogFormat.encodeHeader({'valueColumns': 3}))
+        file.write(LogFormat.encodeChunk(hostNs, hostNs, values))
+
+
+def test_beats_of_a_known_rate_log(tmp_path):
+    writeLogs(tmp_path)
+    summary = BatchProcess.processLog(tmp_path / 'x.txt', [tmp_path / 'x.txt'])
+    assert summary['duration'] == pytest.approx(SECONDS, abs=0.01)
+    # 70 beats per minute for 30 seconds, read in a single block of the default size.
+    assert 33 <= summary['heartRate']['beats'] <= 35
+    assert summary['heartRate']['medianBpm'] == pytest.approx(70, abs=2)
+
+
+def test_text_and_binary_logs_of_the_same_name_keep_their_summaries(tmp_path):
+    writeLogs(tmp_path)
+    summaries = BatchProcess.processDirectory(tmp_path, workers=1)
+    assert set(summaries) == {tmp_path / 'x.txt', tmp_path / 'x.scglog'}
+    assert LogFormat.summaryPath(tmp_path / 'x.txt') != LogFormat.summaryPath(tmp_path / 'x.scglog')
+    for logPath, summary in summaries.items():
+        assert summary['log'] == logPath.name
+        assert BatchProcess.isUpToDate(logPath, [logPath], summary['filter'])
+    assert summaries[tmp_path / 'x.txt']['heartRate'] == summaries[tmp_path / 'x.scglog']['heartRate']
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from BeatDetector import BeatDetector
+from Simulation import syntheticAcceleration
+
+RATE = 200
+
+
+def syntheticRows(seconds, heartRate=70.0):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return np.column_stack((1_700_000_000 + t, syntheticAcceleration(t, heartRate, rng=np.random.default_rng(0))))
+
+
+def detect(rows, blockRows):
+    detector = BeatDetector(rate=RATE)
+    beats = np.vstack([detector.process(rows[i:i + blockRows]) for i in range(0, len(rows), blockRows)])
+    return detector, beats
+
+
+@pytest.mark.parametrize('blockRows', [10, 1000, 6000])
+def test_beats_do_not_depend_on_the_block_size(blockRows):
+    rows = syntheticRows(30)
+    _, reference = detect(rows, len(rows))
+    detector, beats = detect(rows, blockRows)
+    # 70 beats per minute for 30 seconds, the last beat may still be waiting for the envelope to fall.
+    assert 33 <= len(reference) <= 35
+    np.testing.assert_allclose(beats[:, 0], reference[:, 0])
+    assert detector.bpm == pytest.approx(70, abs=2)
+
+
+def test_learning_blocks_are_released_once_learned():
+    detector, _ = detect(syntheticRows(5), 50)
+    assert detector.level is not None and detector.learningBlocks == []
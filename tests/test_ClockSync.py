@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from ClockSync import ClockSync
+
+RATE = 200
+
+
+def arrivals(deviceTimes, offset=1000.0, drift=50e-6, seed=4):
+    """
+    Host arrival times of samples taken at the given IMU times by a clock with the given offset and drift, delayed by
+    a random transmission delay of a few milliseconds.
+    """
+    delays = np.random.default_rng(seed).exponential(0.003, size=len(deviceTimes))
+    return offset + deviceTimes * (1 + drift) + delays
+
+
+def test_recovers_offset_and_drift():
+    deviceTimes = 5.0 + np.arange(60 * RATE) / RATE
+    hostTimes = arrivals(deviceTimes)
+    sync = ClockSync()
+    for start in range(0, len(deviceTimes), 37):
+        sync.update(deviceTimes[start:start + 37], hostTimes[start:start + 37])
+    assert sync.describe()['driftPpm'] == pytest.approx(50, abs=5)
+    later = np.array([65.0, 120.0])
+    np.testing.assert_allclose(sync.hostTimes(later), 1000.0 + later * (1 + 50e-6), atol=0.001)
+
+
+def test_fixed_offset_until_enough_windows():
+    deviceTimes = np.arange(3 * RATE) / RATE
+    hostTimes = arrivals(deviceTimes)
+    sync = ClockSync()
+    sync.update(deviceTimes, hostTimes)
+    assert sync.drift == 0.0
+    assert sync.offset == pytest.approx(np.min(hostTimes - deviceTimes))
+
+
+def test_jump_restarts_the_fit():
+    sync = ClockSync()
+    first = np.arange(20 * RATE) / RATE
+    sync.update(first, arrivals(first))
+    # The IMU was reset, its clock starts again from zero and arrives 100 seconds later.
+    second = np.arange(2 * RATE) / RATE
+    sync.update(second, arrivals(second, offset=1100.0))
+    assert sync.resets == 1
+    assert sync.hostTimes([1.0])[0] == pytest.approx(1101.0, abs=0.001)
@@ -0,0 +1,55 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+import constants as c
+import PortDiscovery
+from ConnectionManager import ConnectionManager
+from IMU import IMU
+from Simulation import FakeSerialDevice
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'openpty'), reason='the fake IMU needs a pseudo-terminal')
+
+
+def waitFor(condition, timeout=10.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, 'timed out'
+        time.sleep(0.02)
+
+
+def test_reconnects_after_a_drop_out(tmp_path, monkeypatch):
+    # The last port is stored in the working directory.
+    monkeypatch.chdir(tmp_path)
+    device = FakeSerialDevice()
+    imu = IMU(device.path, 115200, backend=c.BACKEND_PARSER)
+    manager = ConnectionManager(imu, stallTimeout=0.3, minBackoff=0.1, pollInterval=0.02)
+    try:
+        manager.connect()
+        assert manager.waitForConnection(5)
+        waitFor(lambda: imu.samples.writeSeq > 100)
+        waitFor(lambda: PortDiscovery.loadLastPort() == (device.path, 115200))
+
+        device.dropOut(1.0)
+        waitFor(lambda: manager.gaps == 1)
+        assert manager.state == c.CONNECTION_RECONNECTING
+        waitFor(lambda: manager.reconnects == 1)
+        assert manager.state == c.CONNECTION_CONNECTED and manager.gaps == 1
+        assert 0.5 < manager.summary()['downtime'] < 5
+        # The gap is marked in the samples with a row of NaN values.
+        rows = imu.samples.data[:imu.samples.writeSeq]
+        assert np.isnan(rows[:, 1]).sum() == 1
+    finally:
+        manager.disconnect(wait=True)
+        device.close()
+    assert manager.state == c.CONNECTION_DISCONNECTED and not imu.isConnected
+
+
+def test_first_connection_failure_stops_the_manager(tmp_path):
+    manager = ConnectionManager(IMU(str(tmp_path / 'missing'), 115200, backend=c.BACKEND_PARSER))
+    manager.connect()
+    assert not manager.waitForConnection(5)
+    manager.join(5)
+    assert manager.state == c.CONNECTION_FAILED and not manager.active
@@ -0,0 +1,33 @@
+import numpy as np
+
+from Decimation import minMaxDecimate
+
+
+def test_short_data_is_returned_as_is():
+    t = np.arange(20.0)
+    values = np.ones((20, 2))
+    tOut, valuesOut = minMaxDecimate(t, values, buckets=10)
+    assert tOut is t and valuesOut is values
+
+
+def test_keeps_the_extremes_of_every_bucket_in_time_order():
+    n, buckets = 10_007, 100
+    t = np.arange(n) / 200
+    values = np.random.default_rng(6).normal(size=(n, 3))
+    values[4321, 0] = 40.0
+    values[n - 1, 1] = -40.0
+    tOut, valuesOut = minMaxDecimate(t, values, buckets)
+    assert tOut.shape == valuesOut.shape and len(valuesOut) <= 2 * (buckets + 1)
+    np.testing.assert_array_equal(valuesOut.max(axis=0), values.max(axis=0))
+    np.testing.assert_array_equal(valuesOut.min(axis=0), values.min(axis=0))
+    assert np.all(np.diff(tOut, axis=0) >= 0)
+
+    size = -(-n // buckets)
+    for trace in range(3):
+        # Every kept point is a sample of its trace, and each bucket keeps its own minimum and maximum.
+        np.testing.assert_array_equal(values[np.round(tOut[:, trace] * 200).astype(int), trace], valuesOut[:, trace])
+        for bucket in range(0, n, size):
+            inBucket = (tOut[:, trace] >= t[bucket]) & (tOut[:, trace] < t[bucket] + size / 200)
+            kept = valuesOut[inBucket, trace]
+            assert kept.max() == values[bucket:bucket + size, trace].max()
+            assert kept.min() == values[bucket:bucket + size, trace].min()
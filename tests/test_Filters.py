@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import Filters
+
+RATE = 200
+
+
+def referenceFilter(sections, x):
+    """
+    Direct form II evaluated sample by sample, with the same steady state start as SosFilter.
+    """
+    y = np.array(x, dtype=np.float64)
+    for b0, b1, b2, _, a1, a2 in sections:
+        w1 = w2 = y[0] / (1 + a1 + a2)
+        for k in range(len(y)):
+            w0 = y[k] - a1 * w1 - a2 * w2
+            y[k] = b0 * w0 + b1 * w1 + b2 * w2
+            w2, w1 = w1, w0
+    return y
+
+
+def bandPass():
+    return np.vstack((Filters.butterworthSections('highpass', 4, 1.0, RATE),
+                      Filters.butterworthSections('lowpass', 4, 40.0, RATE)))
+
+
+def signal(n=1000):
+    rng = np.random.default_rng(1)
+    return 9.81 + np.sin(2 * np.pi * 5 * np.arange(n) / RATE)[:, None] + rng.normal(scale=0.1, size=(n, 3))
+
+
+def test_chunked_recursion_matches_sample_by_sample():
+    x = signal()
+    filtered = Filters.SosFilter(bandPass(), channels=3).process(x)
+    for channel in range(3):
+        np.testing.assert_allclose(filtered[:, channel], referenceFilter(bandPass(), x[:, channel]), atol=1e-9)
+
+
+def test_matches_scipy_sosfilt():
+    signalModule = pytest.importorskip('scipy.signal')
+    x = signal()
+    zi = signalModule.sosfilt_zi(bandPass())[:, :, None] * x[0]
+    expected, _ = signalModule.sosfilt(bandPass(), x, axis=0, zi=zi)
+    np.testing.assert_allclose(Filters.SosFilter(bandPass(), channels=3).process(x), expected, atol=1e-9)
+
+
+def test_blocks_match_one_block():
+    x = signal()
+    whole = Filters.SosFilter(bandPass(), channels=3).process(x)
+    pieces = Filters.SosFilter(bandPass(), channels=3)
+    split = np.concatenate([pieces.process(block) for block in np.split(x, [1, 7, 64, 65, 300, 701])])
+    np.testing.assert_allclose(split, whole, atol=1e-9)
+
+
+@pytest.mark.parametrize('kind, passFrequency', [('lowpass', 0.0), ('highpass', RATE / 2)])
+def test_butterworth_gain(kind, passFrequency):
+    sections = Filters.butterworthSections(kind, 4, 20.0, RATE)
+
+    def gain(frequency):
+        z = np.exp(-1j * 2 * np.pi * frequency / RATE * np.arange(3))
+        return np.prod([abs(s[:3] @ z / (s[3:] @ z)) for s in sections])
+
+    assert gain(passFrequency) == pytest.approx(1.0)
+    assert gain(20.0) == pytest.approx(1 / np.sqrt(2))
+
+
+def test_gaps_are_returned_as_nan_and_bridged():
+    x = signal()
+    x[100:110, 0] = np.nan
+    filtered = Filters.SosFilter(bandPass(), channels=3).process(x)
+    assert np.isnan(filtered[100:110, 0]).all()
+    assert np.isfinite(np.delete(filtered, np.s_[100:110], axis=0)).all()
+
+
+def test_decimated_stage_keeps_every_other_row_across_blocks():
+    rows = np.column_stack((np.arange(1001) / RATE, signal(1001)))
+    whole = Filters.FilterStage(highPass=1.0, lowPass=40.0, rate=RATE).process(rows)
+    stage = Filters.FilterStage(highPass=1.0, lowPass=40.0, decimation=2, rate=RATE)
+    decimated = np.concatenate([stage.process(block) for block in np.split(rows, [3, 10, 501])])
+    np.testing.assert_allclose(decimated[:, :4], rows[::2])
+    # The decimated stage low-passes at 40Hz too, as its anti-aliasing cutoff (40Hz) is not lower.
+    np.testing.assert_allclose(decimated, whole[::2], atol=1e-9)
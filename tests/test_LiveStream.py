@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+import pytest
+
+from Acquisition import SampleChannel
+from LiveStream import LiveClient, LiveServer
+
+
+@pytest.fixture
+def server():
+    server = LiveServer(SampleChannel(capacity=65536, columns=4), port=0, pollInterval=0.02, queueBatches=3)
+    server.start()
+    yield server
+    server.stop()
+
+
+def waitFor(condition, timeout=10.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, 'timed out'
+        time.sleep(0.01)
+
+
+def test_rows_round_trip(server):
+    client = LiveClient(port=server.port)
+    try:
+        assert client.columns == 4
+        waitFor(lambda: len(server.clientStats()) == 1)
+        rows = np.arange(40, dtype=np.float64).reshape(10, 4)
+        server.subscription.channel.publishBlock(rows)
+        sequence, received = client.read()
+        assert sequence == 0 and client.dropped == 0
+        np.testing.assert_array_equal(received, rows)
+    finally:
+        client.close()
+
+
+def test_hello_survives_a_full_queue(server):
+    """
+    A client that does not read stalls its sender, its queue overflows, and the channel changes to 7 columns while
+    it is full. Once the client reads again it must get the new HELLO before the rows of the new channel.
+    """
+    client = LiveClient(port=server.port)
+    try:
+        waitFor(lambda: len(server.clientStats()) == 1)
+        old = server.subscription.channel
+        block = np.ones((20000, 4))
+        waitFor(lambda: old.publishBlock(block) or time.sleep(0.03) or server.clientStats()[0]['dropped'] > 0)
+
+        new = SampleChannel(capacity=65536, columns=7)
+        server.setChannel(new)
+        for _ in range(10):
+            new.publishBlock(np.full((100, 7), 2.0))
+            time.sleep(0.03)
+        waitFor(lambda: server.clientStats()[0]['queued'] == 3)
+
+        _, rows = client.read()
+        while client.columns == 4:
+            assert (rows == 1).all()
+            _, rows = client.read()
+        assert rows.shape == (100, 7) and (rows == 2).all()
+        assert client.dropped > 0
+    finally:
+        client.close()
@@ -0,0 +1,44 @@
+import io
+
+import numpy as np
+import pytest
+
+import LogFormat
+
+
+def test_header_round_trip():
+    header = {'comPort': 'COM7', 'returnRate': 200, 'valueColumns': 6, 'filter': 'No filter'}
+    block = LogFormat.encodeHeader(header)
+    assert len(block) == LogFormat.HEADER_SIZE
+    file = io.BytesIO(block + b'rest')
+    assert LogFormat.readHeader(file) == dict(header, version=2)
+    assert file.read() == b'rest'
+
+
+def test_header_too_large_raises():
+    with pytest.raises(ValueError):
+        LogFormat.encodeHeader({'padding': 'x' * LogFormat.HEADER_SIZE})
+
+
+def test_chunk_round_trip():
+    hostNs = np.array([1_700_000_000_000_000_000, 1_700_000_000_005_000_000], dtype=np.int64)
+    deviceNs = hostNs - 123_456
+    values = np.array([[0.5, -1.25, 9.75, 1, 2, 3], [0.25, -1.5, 9.5, 4, 5, 6]])
+    file = io.BytesIO(LogFormat.encodeChunk(hostNs, deviceNs, values) * 2 + b'\x02\x00')
+    chunks = list(LogFormat.iterChunks(file, valueColumns=6))
+    # The partial chunk at the end is ignored.
+    assert len(chunks) == 2
+    timestamps, acceleration, device = chunks[1]
+    # Host times are returned in float64 seconds, exact to well under a microsecond.
+    np.testing.assert_allclose(timestamps, hostNs / 1e9, rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(device, deviceNs)
+    np.testing.assert_array_equal(acceleration, values.astype(np.float32))
+
+
+def test_text_lines_round_trip():
+    hostNs = np.array([1_700_000_000_000_000_000, 1_700_000_001_250_000_000], dtype=np.int64)
+    values = np.array([[0.5, -1.25, 9.75], [0.25, -1.5, 9.5]])
+    timestamps, acceleration = LogFormat.parseTextLines(
+        LogFormat.formatTextLines(hostNs, hostNs, values).splitlines(keepends=True))
+    np.testing.assert_allclose(timestamps, hostNs / 1e9)
+    np.testing.assert_array_equal(acceleration, values)
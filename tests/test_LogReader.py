@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import LogFormat
+import LogReader
+from ClockSync import toNs
+
+RATE = 200
+COUNT = 50_000
+START = 1_700_000_000.0
+
+
+def writeLog(path):
+    """
+    Write COUNT samples of two IMUs (6 value columns) to a text or binary log, the binary log in chunks of 1000
+    samples. One sample of the first column is a spike.
+
+    Returns:
+        times (np.ndarray): Times of the samples in seconds.
+        values (np.ndarray): Values of the samples, as float32 like the binary log stores them.
+    """
+    times = START + np.arange(COUNT) / RATE
+    values = np.random.default_rng(5).normal(size=(COUNT, 6)).astype(np.float32)
+    values[31_234, 0] = 50.0
+    hostNs = toNs(times)
+    if path.suffix == LogFormat.BINARY_EXTENSION:
+        with open(path, 'wb') as file:
+            file.write(LogFormat.encodeHeader({'valueColumns': 6}))
+            for start in range(0, COUNT, 1000):
+                file.write(LogFormat.encodeChunk(hostNs[start:start + 1000], hostNs[start:start + 1000],
+                                                 values[start:start + 1000]))
+    else:
+        with open(path, 'w') as file:
+            file.write(LogFormat.formatTextLines(hostNs, hostNs, values.astype(np.float64)))
+    return times, values
+
+
+@pytest.fixture(params=[LogFormat.TEXT_EXTENSION, LogFormat.BINARY_EXTENSION])
+def log(request, tmp_path):
+    path = tmp_path / f'log{request.param}'
+    times, values = writeLog(path)
+    reader = LogReader.LogReader(path)
+    yield reader, times, values
+    reader.close()
+
+
+def test_read_ranges(log):
+    reader, times, values = log
+    assert len(reader) == COUNT and reader.imus == 2
+    for start, stop in [(0, 10), (1000, 3000), (LogReader.INDEX_STRIDE - 3, LogReader.INDEX_STRIDE + 3),
+                        (COUNT - 5, COUNT + 100)]:
+        timestamps, read = reader.read(start, stop)
+        np.testing.assert_allclose(timestamps, times[start:stop], rtol=0, atol=1e-6)
+        np.testing.assert_allclose(read, values[start:stop], rtol=1e-6)
+    assert reader.indexAt(times[12_345]) == 12_345
+    assert reader.endTime == pytest.approx(times[-1])
+
+
+@pytest.mark.parametrize('buckets', [10, 300, 5000])
+def test_envelope_is_bounded_and_keeps_the_extremes(log, buckets):
+    reader, times, values = log
+    timestamps, envelope = reader.envelope(times[0], times[-1], buckets)
+    assert len(timestamps) == len(envelope) <= LogReader.DIRECT_POINTS * buckets + 4
+    assert envelope.shape[1] == 6 + 2
+    np.testing.assert_allclose(np.nanmax(envelope[:, :6], axis=0), values.max(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(np.nanmin(envelope[:, :6], axis=0), values.min(axis=0), rtol=1e-6)
+    norms = np.linalg.norm(values.astype(np.float64).reshape(COUNT, 2, 3), axis=2)
+    assert np.nanmax(envelope[:, 6:], axis=0) == pytest.approx(norms.max(axis=0), rel=1e-5)
+
+
+def test_index_file_is_reused(log):
+    reader, times, _ = log
+    assert LogFormat.indexPath(reader.filePath).exists()
+    cached = LogReader.LogReader(reader.filePath)
+    try:
+        for expected, actual in zip(reader.envelope(times[100], times[40_000], 200),
+                                    cached.envelope(times[100], times[40_000], 200)):
+            np.testing.assert_array_equal(expected, actual)
+    finally:
+        cached.close()
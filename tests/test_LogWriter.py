@@ -0,0 +1,46 @@
+import json
+import time
+
+import numpy as np
+
+import LogFormat
+from Acquisition import SampleChannel
+from LogWriter import LogWriter
+
+START = 1_700_000_000.0
+RATE = 200
+
+
+def test_an_unexpected_error_still_completes_the_log(tmp_path, monkeypatch):
+    """
+    An error other than OSError while encoding a chunk stops the writer, which still writes the statistics and the
+    final manifest and keeps the error.
+    """
+    path = tmp_path / f'log{LogFormat.TEXT_EXTENSION}'
+    channel = SampleChannel(capacity=4096, columns=4)
+    writer = LogWriter(channel.subscribe(), path, START, pollInterval=0.01, segmentSeconds=60)
+    formatTextLines = LogFormat.formatTextLines
+    calls = []
+
+    def failSecondChunk(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise ValueError('bad chunk')
+        return formatTextLines(*args)
+
+    monkeypatch.setattr(LogFormat, 'formatTextLines', failSecondChunk)
+    writer.start()
+    rows = np.column_stack((START + np.arange(400) / RATE, np.ones((400, 3))))
+    for block in np.array_split(rows, 2):
+        channel.publishBlock(block)
+        time.sleep(0.05)
+    writer.stop()
+    writer.join(5)
+
+    assert not writer.thread.is_alive()
+    assert isinstance(writer.error, ValueError)
+    assert writer.linesWritten == 200
+    manifest = json.loads(LogFormat.manifestPath(path).read_text())
+    assert manifest['complete'] and manifest['error'] == 'bad chunk'
+    assert all(segment['complete'] for segment in manifest['segments'])
+    assert json.loads(LogFormat.statsPath(path).read_text())['samples'] == 400
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+import PortDiscovery
+from Simulation import FakeSerialDevice
+
+
+def test_baud_rate_order():
+    rates = [9600, 19200, 115200, 230400, 921600]
+    assert PortDiscovery.baudRateOrder(rates) == [115200, 9600, 921600, 230400, 19200]
+    assert PortDiscovery.baudRateOrder(rates, first=230400) == [230400, 115200, 9600, 921600, 19200]
+    # A first rate that is not probed is left out.
+    assert PortDiscovery.baudRateOrder([9600, 38400], first=4800) == [9600, 38400]
+
+
+def test_last_port_round_trip(tmp_path):
+    path = tmp_path / 'last port.json'
+    assert PortDiscovery.loadLastPort(path) is None
+    PortDiscovery.saveLastPort('COM7', 230400, path)
+    assert PortDiscovery.loadLastPort(path) == ('COM7', 230400)
+    path.write_text('{"port": "COM7"')
+    assert PortDiscovery.loadLastPort(path) is None
+
+
+@pytest.mark.skipif(not hasattr(os, 'openpty'), reason='the fake IMU needs a pseudo-terminal')
+def test_finds_the_imu_among_silent_and_missing_ports(tmp_path):
+    device = FakeSerialDevice()
+    silentMaster, silentSlave = os.openpty()
+    silent = os.ttyname(silentSlave)
+    missing = str(tmp_path / 'missing')
+    try:
+        discovery = PortDiscovery.PortDiscovery([silent, device.path, missing], baudRates=[9600, 115200, 230400],
+                                                listenTime=0.3, lastPort=(device.path, 230400))
+        discovery.start()
+        assert discovery.wait(10)
+    finally:
+        device.close()
+        os.close(silentMaster)
+        os.close(silentSlave)
+
+    results = discovery.results()
+    assert [result['port'] for result in results] == [device.path]
+    # A pseudo-terminal delivers at any baud rate, so the last port's rate, probed first, is the one found.
+    assert results[0]['baudRate'] == 230400
+    assert results[0]['validFraction'] > 0.9
+    assert {'acceleration', 'angle', 'quaternion'} <= set(results[0]['channels'])
+    assert discovery.status[silent] == 'No IMU'
+    assert discovery.status[missing].startswith('Error')
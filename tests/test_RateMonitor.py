@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from RateMonitor import RateMonitor
+
+
+def timestamps(rate, n, start=0.0, jitter=0.0):
+    return start + np.arange(n) / rate + np.random.default_rng(3).normal(scale=jitter, size=n)
+
+
+def test_rate_and_jitter():
+    t = timestamps(200, 4000, jitter=0.0005)
+    monitor = RateMonitor()
+    for block in np.array_split(t, 40):
+        monitor.update(block)
+    assert monitor.rate == pytest.approx(200, rel=0.01)
+    # The interval between two samples with independent jitter has sqrt(2) times their deviation.
+    assert monitor.jitter == pytest.approx(np.sqrt(2) * 0.0005, rel=0.2)
+    assert monitor.gaps == 0
+
+
+def test_blocks_match_single_samples():
+    t = timestamps(100, 500, jitter=0.001)
+    blocks, single = RateMonitor(), RateMonitor()
+    for block in np.array_split(t, 7):
+        blocks.update(block)
+    for timestamp in t:
+        single.update(timestamp)
+    assert blocks.rate == pytest.approx(single.rate)
+    # The deviations of a block are taken from the mean after the block, so the jitter differs slightly.
+    assert blocks.jitter == pytest.approx(single.jitter, rel=0.02)
+
+
+def test_gaps_are_left_out():
+    t = np.concatenate((timestamps(200, 100), timestamps(200, 100, start=10.0)))
+    monitor = RateMonitor()
+    monitor.update(t)
+    assert monitor.gaps == 1
+    assert monitor.rate == pytest.approx(200)
+    assert monitor.jitter == pytest.approx(0, abs=1e-9)
+
+
+def test_expected_rate_mismatch():
+    monitor = RateMonitor(settleTime=0.5)
+    monitor.update(timestamps(100, 100))
+    monitor.expectRate(200)
+    # Samples at the old rate within the settle time are ignored.
+    monitor.update(timestamps(100, 40, start=1.0))
+    assert monitor.rate is None and not monitor.mismatch
+    monitor.update(timestamps(100, 100, start=1.4))
+    assert monitor.rate == pytest.approx(100) and monitor.mismatch
+    monitor.expectRate(100)
+    monitor.update(timestamps(100, 100, start=2.4))
+    assert not monitor.mismatch
+    assert monitor.summary()['expectedRate'] == 100
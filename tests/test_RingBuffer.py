@@ -0,0 +1,38 @@
+import numpy as np
+
+from RingBuffer import RingBuffer
+
+
+def rows(start, stop, columns=2):
+    return np.column_stack([np.arange(start, stop, dtype=np.float64)] * columns)
+
+
+def test_append_wraps_around_keeping_the_newest_rows():
+    buffer = RingBuffer(capacity=5, columns=2)
+    for i in range(12):
+        buffer.append((i, i))
+        np.testing.assert_array_equal(buffer.getView(), rows(max(i - 4, 0), i + 1))
+    assert len(buffer) == 5
+
+
+def test_extend_across_the_end_of_the_ring():
+    buffer = RingBuffer(capacity=8, columns=2)
+    buffer.extend(rows(0, 6))
+    buffer.extend(rows(6, 11))
+    np.testing.assert_array_equal(buffer.getView(), rows(3, 11))
+    # A block longer than the capacity keeps only its last rows.
+    buffer.extend(rows(11, 30))
+    np.testing.assert_array_equal(buffer.getView(), rows(22, 30))
+    assert buffer.getView().base is buffer.data
+
+
+def test_resize_keeps_the_newest_rows():
+    buffer = RingBuffer(capacity=6, columns=2)
+    buffer.extend(rows(0, 9))
+    buffer.resize(4)
+    np.testing.assert_array_equal(buffer.getView(), rows(5, 9))
+    buffer.resize(10)
+    buffer.append((9, 9))
+    np.testing.assert_array_equal(buffer.getView(), rows(5, 10))
+    buffer.clear()
+    assert len(buffer) == 0 and len(buffer.getView()) == 0
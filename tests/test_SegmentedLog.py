@@ -0,0 +1,77 @@
+import time
+
+import numpy as np
+import pytest
+
+import LogFormat
+import SegmentedLog
+from Acquisition import SampleChannel
+from LogWriter import LogWriter
+
+START = 1_700_000_000.0
+RATE = 200
+
+
+def writeSegmentedLog(path, binary, count=3000):
+    """
+    Log count samples to path in segments of about 20kB, the rows are published a block at a time.
+
+    Returns:
+        rows (np.ndarray): The rows logged, [timestamp, ax, ay, az].
+    """
+    channel = SampleChannel(capacity=4 * count, columns=4)
+    writer = LogWriter(channel.subscribe(), path, START, binary=binary, pollInterval=0.01, segmentBytes=20_000)
+    writer.start()
+    rows = np.column_stack((START + np.arange(count) / RATE, np.random.default_rng(0).normal(size=(count, 3))))
+    for block in np.array_split(rows, 30):
+        channel.publishBlock(block)
+        time.sleep(0.005)
+    writer.stop()
+    writer.join()
+    assert len(writer.segments) > 1
+    return rows
+
+
+def readLog(path):
+    if path.suffix == LogFormat.BINARY_EXTENSION:
+        _, timestamps, acceleration = LogFormat.readBinaryLog(path)
+        return timestamps, acceleration
+    return LogFormat.readTextLog(path)
+
+
+@pytest.mark.parametrize('extension', [LogFormat.TEXT_EXTENSION, LogFormat.BINARY_EXTENSION])
+def test_stitched_log_has_every_sample_in_order(tmp_path, extension):
+    path = tmp_path / f'log{extension}'
+    rows = writeSegmentedLog(path, binary=extension == LogFormat.BINARY_EXTENSION)
+    assert not path.exists()
+    assert SegmentedLog.stitchSegments(LogFormat.manifestPath(path)) == path
+
+    timestamps, acceleration = readLog(path)
+    np.testing.assert_allclose(timestamps, rows[:, 0], rtol=0, atol=1e-6)
+    np.testing.assert_allclose(acceleration, rows[:, 1:], rtol=1e-6)
+    if extension == LogFormat.BINARY_EXTENSION:
+        assert 'segment' not in LogFormat.readBinaryLog(path)[0]
+
+
+@pytest.mark.parametrize('extension', [LogFormat.TEXT_EXTENSION, LogFormat.BINARY_EXTENSION])
+def test_stitching_after_a_crash(tmp_path, extension):
+    path = tmp_path / f'log{extension}'
+    rows = writeSegmentedLog(path, binary=extension == LogFormat.BINARY_EXTENSION)
+    # A crash leaves no manifest and a partly written end of the last segment.
+    LogFormat.manifestPath(path).unlink()
+    logPath, segments = SegmentedLog.findSegments(path)
+    assert logPath == path
+    with open(segments[-1], 'ab') as file:
+        file.write(b'\x05\x00\x00\x00\x01\x02' if extension == LogFormat.BINARY_EXTENSION else b'01 01 2024 00:0')
+
+    timestamps, acceleration = readLog(SegmentedLog.stitchSegments(path, tmp_path / f'stitched{extension}'))
+    np.testing.assert_allclose(timestamps, rows[:, 0], rtol=0, atol=1e-6)
+    np.testing.assert_allclose(acceleration, rows[:, 1:], rtol=1e-6)
+
+
+def test_stitching_does_not_overwrite(tmp_path):
+    path = tmp_path / 'log.txt'
+    writeSegmentedLog(path, binary=False, count=1000)
+    path.write_text('')
+    with pytest.raises(FileExistsError):
+        SegmentedLog.stitchSegments(path)
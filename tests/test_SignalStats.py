@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from SignalStats import SATURATION, SignalStats
+
+RATE = 200
+
+
+def samples(n=2000):
+    rng = np.random.default_rng(2)
+    return np.column_stack((np.arange(n) / RATE, rng.normal(loc=[0, 0, 9.81], scale=[1, 2, 0.5], size=(n, 3))))
+
+
+def test_blocks_match_numpy_statistics():
+    rows = samples()
+    stats = SignalStats(window=None)
+    for block in np.array_split(rows, 17):
+        stats.update(block)
+    summary = stats.summary()
+    values = rows[:, 1:]
+    assert summary['samples'] == len(rows)
+    assert summary['rate'] == pytest.approx(RATE)
+    np.testing.assert_allclose(summary['mean'], values.mean(axis=0), atol=1e-4)
+    np.testing.assert_allclose(summary['std'], values.std(axis=0), atol=1e-4)
+    np.testing.assert_allclose(summary['rms'], np.sqrt((values ** 2).mean(axis=0)), atol=1e-4)
+    np.testing.assert_allclose(summary['min'], values.min(axis=0), atol=1e-4)
+    np.testing.assert_allclose(summary['max'], values.max(axis=0), atol=1e-4)
+    assert summary['flags'] == []
+
+
+def test_window_keeps_only_recent_blocks():
+    rows = samples()
+    stats = SignalStats(window=2.0)
+    for block in np.array_split(rows, 20):
+        stats.update(block)
+    # Blocks of 0.5s, the window covers the blocks ending in the last 2 seconds.
+    assert stats.summary()['samples'] == 500
+
+
+def test_duplicates_flat_and_saturation_are_flagged():
+    rows = samples(100)
+    rows[10:30, 1:] = rows[9, 1:]
+    rows[50, 3] = SATURATION
+    rows[:, 2] = 1.0
+    stats = SignalStats(window=None)
+    stats.update(rows[:20])
+    stats.update(rows[20:])
+    summary = stats.summary()
+    # The duplicate run crosses the block boundary, it is counted once.
+    assert summary['duplicateSamples'] == 20 and summary['duplicateRuns'] == 1
+    assert summary['saturatedSamples'] == 1
+    assert summary['flags'] == ['saturated', 'flat', 'duplicates']
+
+
+def test_missing_values_are_not_counted():
+    rows = samples(100)
+    rows[:40, 1] = np.nan
+    stats = SignalStats(window=None)
+    stats.update(rows)
+    summary = stats.summary()
+    assert summary['samples'] == 100
+    assert summary['mean'][0] == pytest.approx(rows[40:, 1].mean(), abs=1e-4)
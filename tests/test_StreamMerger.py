@@ -0,0 +1,67 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+import LogFormat
+from IMU import IMU
+from StreamMerger import StreamMerger
+
+
+def test_merged_header_of_four_imus_fits(tmp_path):
+    imus = [IMU(comPort=f'COM{i}') for i in range(1, 5)]
+    # The settings of all four IMUs do not fit in the header, so they are written next to the log.
+    with pytest.raises(ValueError):
+        LogFormat.encodeHeader({'imus': [imu.getLogHeader() for imu in imus] * 2, 'valueColumns': 24})
+    merger = StreamMerger(imus)
+    logPath = tmp_path / 'merged.scglog'
+    merger.startLogging(logPath, binary=True)
+    merger.stopLogging()
+    merger.logWriter.join()
+
+    header, timestamps, acceleration = LogFormat.readBinaryLog(logPath)
+    assert header['imuCount'] == 4
+    assert header['comPorts'] == ['COM1', 'COM2', 'COM3', 'COM4']
+    assert LogFormat.countImus(logPath, header, header['valueColumns']) == 4
+    assert len(timestamps) == 0 and acceleration.shape[1] == header['valueColumns']
+    with open(LogFormat.settingsPath(logPath), 'r') as file:
+        assert [imu['comPort'] for imu in json.load(file)['imus']] == header['comPorts']
+
+
+def publish(imu, hostTimes, deviceOffset, base):
+    """
+    Publish samples of an IMU whose clock is deviceOffset ahead of the host clock, arriving without delay. The X
+    acceleration is the host time since base, so aligned streams have equal values.
+    """
+    n = len(hostTimes)
+    imu.samples.publishBlock(np.column_stack((hostTimes + deviceOffset, hostTimes - base, np.ones(n), np.zeros(n),
+                                              hostTimes)))
+
+
+def test_streams_of_offset_clocks_are_aligned():
+    imus = [IMU(comPort='COM1'), IMU(comPort='COM2')]
+    merger = StreamMerger(imus, rate=200.0, staleTimeout=0.2)
+    base = time.monotonic()
+    publish(imus[0], base - 2 + np.arange(400) / 200, 10.0, base)
+    # The second IMU samples at other times, at a slightly different rate.
+    publish(imus[1], base - 2.013 + np.arange(399) / 199.5, 500.0, base)
+    count = merger.mergeAvailable()
+    assert 380 <= count <= 400
+
+    merged = merger.samples.subscribe()
+    merged.cursor = 0
+    rows = merged.read()
+    grid = rows[:, 0] - merger.wallOffset
+    # Wall clock timestamps resolve about 0.2us.
+    np.testing.assert_allclose(np.diff(grid), 1 / 200, atol=1e-6)
+    np.testing.assert_allclose(rows[:, 1], grid - base, atol=1e-6)
+    np.testing.assert_allclose(rows[:, 4], grid - base, atol=1e-6)
+
+    # The second IMU stops delivering, once it is stale the first one is merged on its own.
+    time.sleep(0.3)
+    publish(imus[0], base + np.arange(100) / 200, 10.0, base)
+    assert merger.mergeAvailable() > 0
+    rows = merged.read()
+    np.testing.assert_allclose(rows[:, 1], rows[:, 0] - merger.wallOffset - base, atol=1e-6)
+    assert np.isnan(rows[-1, 4:7]).all()
@@ -0,0 +1,54 @@
+import calendar
+
+import numpy as np
+import pytest
+import witmotion as wm
+
+import IMU  # Installs IMU.TimeMessage in the Witmotion module.
+import WitmotionParser
+
+# Dates the Witmotion module's own time message parser got wrong or failed on.
+TIMESTAMPS = np.array([
+    calendar.timegm((2024, 12, 31, 23, 59, 58)) + 0.25,
+    calendar.timegm((2024, 2, 29, 12, 0, 0)) + 0.5,
+    calendar.timegm((2025, 1, 1, 0, 0, 0)),
+    calendar.timegm((2023, 10, 31, 8, 30, 15)) + 0.999
+])
+
+
+def frameRows(data):
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, WitmotionParser.FRAME_LENGTH)
+
+
+def test_time_frames_use_the_device_date_convention():
+    frame = frameRows(WitmotionParser.encodeTimeFrames(TIMESTAMPS[:1]))[0]
+    # 2024-12-31 23:59:58.250 as the IMU sends it: 20YY, month and day from 1.
+    assert frame[2:8].tolist() == [24, 12, 31, 23, 59, 58]
+    assert int(frame[8]) | int(frame[9]) << 8 == 250
+
+
+def test_time_frames_round_trip_through_the_builtin_parser():
+    frames = frameRows(WitmotionParser.encodeTimeFrames(TIMESTAMPS))
+    np.testing.assert_allclose(WitmotionParser.decodeTimeFrames(frames), TIMESTAMPS, atol=1e-6)
+
+
+def test_time_frames_round_trip_through_the_witmotion_module():
+    assert wm.protocol.receive_messages[wm.protocol.TimeMessage.code] is IMU.TimeMessage
+    for frame, timestamp in zip(frameRows(WitmotionParser.encodeTimeFrames(TIMESTAMPS)), TIMESTAMPS):
+        message = wm.protocol.receive_messages[frame[1]].parse(frame[2:10].tobytes())
+        assert isinstance(message, wm.protocol.TimeMessage)
+        assert message.timestamp == pytest.approx(timestamp, abs=1e-6)
+
+
+def test_feed_stamps_rows_with_the_preceding_time_frame():
+    raw = np.array([[1000, -2000, 2048, 2500], [0, 0, 0, 0]])
+    data = b''.join(WitmotionParser.encodeTimeFrames([t]) + WitmotionParser.encodeFrames(
+        WitmotionParser.ACCELERATION, row) for t, row in zip(TIMESTAMPS[:2], raw))
+    parser = WitmotionParser.WitmotionParser()
+    # Split inside a frame, the remainder is kept for the next chunk.
+    channels = parser.feed(data[:15], receiveTime=0.0)
+    rest = parser.feed(data[15:], receiveTime=0.0)
+    rows = np.vstack([c['acceleration'] for c in (channels, rest) if 'acceleration' in c])
+    np.testing.assert_allclose(rows[:, 0], TIMESTAMPS[:2])
+    np.testing.assert_allclose(rows[:, 1:], raw[:, :3] * 16 * WitmotionParser.G / 32768)
+    assert parser.frameCount == 4